@@ -0,0 +1,154 @@
+/*
+ * This file is part of the MicroPython project, http://micropython.org/
+ *
+ * The MIT License (MIT)
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ */
+
+#include <string.h>
+
+#include "py/runtime.h"
+#include "py/mphal.h"
+#include "modesp32.h"
+
+#if MICROPY_PY_ESP32_BOOTTRACE
+
+#include "esp_attr.h"
+
+// This file implements a small boot-time tracer.  Each boot script, each module
+// loaded by the import machinery, and any user-defined stage is recorded as an
+// entry (start time, duration, kind, name) in a fixed-size ring buffer.  The ring
+// lives in uninitialised RTC memory, so the enabled flag is retained across soft
+// resets, machine.reset() and deep sleep.  While tracing is enabled the ring is
+// cleared at the start of every boot, so it holds the trace of the current boot;
+// while it is disabled the trace of the last traced boot is kept.
+
+#define BOOTTRACE_MAGIC (0x42547231)
+#define BOOTTRACE_NAME_LEN (23)
+#define BOOTTRACE_IN_PROGRESS (0xffffffff)
+
+typedef struct _boottrace_entry_t {
+    uint32_t ticks_us;
+    uint32_t duration_us;
+    uint8_t kind;
+    char name[BOOTTRACE_NAME_LEN];
+} boottrace_entry_t;
+
+typedef struct _boottrace_t {
+    uint32_t magic;
+    uint32_t enabled;
+    uint32_t head;
+    uint32_t count;
+    boottrace_entry_t entries[MICROPY_PY_ESP32_BOOTTRACE_ENTRIES];
+} boottrace_t;
+
+static RTC_NOINIT_ATTR boottrace_t boottrace;
+
+// Called at the start of each (soft) boot, before any boot script runs.
+void esp32_boottrace_init(void) {
+    if (boottrace.magic != BOOTTRACE_MAGIC) {
+        // RTC memory content is undefined after power-on, start enabled.
+        boottrace.magic = BOOTTRACE_MAGIC;
+        boottrace.enabled = 1;
+    }
+    if (boottrace.enabled) {
+        boottrace.head = 0;
+        boottrace.count = 0;
+    }
+}
+
+void esp32_boottrace_begin(unsigned int kind, const char *name) {
+    if (boottrace.magic != BOOTTRACE_MAGIC || !boottrace.enabled) {
+        return;
+    }
+    boottrace_entry_t *e = &boottrace.entries[boottrace.head];
+    boottrace.head = (boottrace.head + 1) % MICROPY_PY_ESP32_BOOTTRACE_ENTRIES;
+    if (boottrace.count < MICROPY_PY_ESP32_BOOTTRACE_ENTRIES) {
+        ++boottrace.count;
+    }
+    e->ticks_us = mp_hal_ticks_us();
+    e->duration_us = BOOTTRACE_IN_PROGRESS;
+    e->kind = kind;
+    strncpy(e->name, name, BOOTTRACE_NAME_LEN - 1);
+    e->name[BOOTTRACE_NAME_LEN - 1] = '\0';
+}
+
+void esp32_boottrace_end(const char *name) {
+    if (boottrace.magic != BOOTTRACE_MAGIC || !boottrace.enabled) {
+        return;
+    }
+    uint32_t now = mp_hal_ticks_us();
+    // Close the most recent unfinished entry with this name (entries nest).
+    for (uint32_t i = 1; i <= boottrace.count; ++i) {
+        boottrace_entry_t *e = &boottrace.entries[(boottrace.head + MICROPY_PY_ESP32_BOOTTRACE_ENTRIES - i) % MICROPY_PY_ESP32_BOOTTRACE_ENTRIES];
+        if (e->duration_us == BOOTTRACE_IN_PROGRESS && strncmp(e->name, name, BOOTTRACE_NAME_LEN - 1) == 0) {
+            e->duration_us = now - e->ticks_us;
+            return;
+        }
+    }
+}
+
+static mp_obj_t esp32_boottrace(size_t n_args, const mp_obj_t *args) {
+    if (boottrace.magic != BOOTTRACE_MAGIC) {
+        esp32_boottrace_init();
+    }
+    if (n_args == 0) {
+        return mp_obj_new_bool(boottrace.enabled);
+    }
+    boottrace.enabled = mp_obj_is_true(args[0]);
+    return mp_const_none;
+}
+MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(esp32_boottrace_obj, 0, 1, esp32_boottrace);
+
+static mp_obj_t esp32_boottrace_begin_(mp_obj_t name_in) {
+    esp32_boottrace_begin(ESP32_BOOTTRACE_KIND_STAGE, mp_obj_str_get_str(name_in));
+    return mp_const_none;
+}
+MP_DEFINE_CONST_FUN_OBJ_1(esp32_boottrace_begin_obj, esp32_boottrace_begin_);
+
+static mp_obj_t esp32_boottrace_end_(mp_obj_t name_in) {
+    esp32_boottrace_end(mp_obj_str_get_str(name_in));
+    return mp_const_none;
+}
+MP_DEFINE_CONST_FUN_OBJ_1(esp32_boottrace_end_obj, esp32_boottrace_end_);
+
+static mp_obj_t esp32_boottrace_read(void) {
+    static const qstr kind_names[] = { MP_QSTR_stage, MP_QSTR_script, MP_QSTR_import };
+    mp_obj_t list = mp_obj_new_list(0, NULL);
+    if (boottrace.magic != BOOTTRACE_MAGIC) {
+        return list;
+    }
+    // Return entries oldest first.
+    uint32_t first = (boottrace.head + MICROPY_PY_ESP32_BOOTTRACE_ENTRIES - boottrace.count) % MICROPY_PY_ESP32_BOOTTRACE_ENTRIES;
+    for (uint32_t i = 0; i < boottrace.count; ++i) {
+        boottrace_entry_t *e = &boottrace.entries[(first + i) % MICROPY_PY_ESP32_BOOTTRACE_ENTRIES];
+        mp_obj_t tuple[4] = {
+            mp_obj_new_int_from_uint(e->ticks_us),
+            e->duration_us == BOOTTRACE_IN_PROGRESS ? mp_const_none : mp_obj_new_int_from_uint(e->duration_us),
+            MP_OBJ_NEW_QSTR(kind_names[e->kind < MP_ARRAY_SIZE(kind_names) ? e->kind : 0]),
+            mp_obj_new_str(e->name, strlen(e->name)),
+        };
+        mp_obj_list_append(list, mp_obj_new_tuple(4, tuple));
+    }
+    return list;
+}
+MP_DEFINE_CONST_FUN_OBJ_0(esp32_boottrace_read_obj, esp32_boottrace_read);
+
+#endif // MICROPY_PY_ESP32_BOOTTRACE
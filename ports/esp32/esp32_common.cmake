@@ -117,6 +117,7 @@ list(APPEND MICROPY_SOURCE_PORT
     modsocket.c
     lwip_patch.c
     modesp.c
+    esp32_boottrace.c
     esp32_nvs.c
     esp32_partition.c
     esp32_rmt.c
@@ -61,6 +61,7 @@
 #include "usb_serial_jtag.h"
 #include "modmachine.h"
 #include "modnetwork.h"
+#include "modesp32.h"
 
 #if MICROPY_BLUETOOTH_NIMBLE
 #include "extmod/modbluetooth.h"
@@ -126,6 +127,10 @@ void mp_task(void *pvParameter) {
     }
 
 soft_reset:
+    #if MICROPY_PY_ESP32_BOOTTRACE
+    esp32_boottrace_init();
+    #endif
+
     // initialise the stack pointer for the main thread
     mp_cstack_init_with_top((void *)sp, MICROPY_TASK_STACK_SIZE);
     gc_init(mp_task_heap, mp_task_heap + MICROPY_GC_INITIAL_HEAP_SIZE);
@@ -140,13 +145,19 @@ soft_reset:
     #endif
 
     // run boot-up scripts
+    ESP32_BOOTTRACE_BEGIN(ESP32_BOOTTRACE_KIND_SCRIPT, "_boot.py");
     pyexec_frozen_module("_boot.py", false);
+    ESP32_BOOTTRACE_END("_boot.py");
+    ESP32_BOOTTRACE_BEGIN(ESP32_BOOTTRACE_KIND_SCRIPT, "boot.py");
     int ret = pyexec_file_if_exists("boot.py");
+    ESP32_BOOTTRACE_END("boot.py");
     if (ret & PYEXEC_FORCED_EXIT) {
         goto soft_reset_exit;
     }
     if (pyexec_mode_kind == PYEXEC_MODE_FRIENDLY_REPL && ret != 0) {
+        ESP32_BOOTTRACE_BEGIN(ESP32_BOOTTRACE_KIND_SCRIPT, "main.py");
         int ret = pyexec_file_if_exists("main.py");
+        ESP32_BOOTTRACE_END("main.py");
         if (ret & PYEXEC_FORCED_EXIT) {
             goto soft_reset_exit;
         }
@@ -228,6 +228,12 @@ static const mp_rom_map_elem_t esp32_module_globals_table[] = {
     { MP_ROM_QSTR(MP_QSTR_mcu_temperature), MP_ROM_PTR(&esp32_mcu_temperature_obj) },
     #endif
     { MP_ROM_QSTR(MP_QSTR_idf_heap_info), MP_ROM_PTR(&esp32_idf_heap_info_obj) },
+    #if MICROPY_PY_ESP32_BOOTTRACE
+    { MP_ROM_QSTR(MP_QSTR_boottrace), MP_ROM_PTR(&esp32_boottrace_obj) },
+    { MP_ROM_QSTR(MP_QSTR_boottrace_begin), MP_ROM_PTR(&esp32_boottrace_begin_obj) },
+    { MP_ROM_QSTR(MP_QSTR_boottrace_end), MP_ROM_PTR(&esp32_boottrace_end_obj) },
+    { MP_ROM_QSTR(MP_QSTR_boottrace_read), MP_ROM_PTR(&esp32_boottrace_read_obj) },
+    #endif
 
     { MP_ROM_QSTR(MP_QSTR_NVS), MP_ROM_PTR(&esp32_nvs_type) },
     { MP_ROM_QSTR(MP_QSTR_Partition), MP_ROM_PTR(&esp32_partition_type) },
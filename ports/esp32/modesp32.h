@@ -66,6 +66,18 @@ extern const mp_obj_type_t esp32_partition_type;
 extern const mp_obj_type_t esp32_rmt_type;
 extern const mp_obj_type_t esp32_ulp_type;
 
+#if MICROPY_PY_ESP32_BOOTTRACE
+MP_DECLARE_CONST_FUN_OBJ_VAR_BETWEEN(esp32_boottrace_obj);
+MP_DECLARE_CONST_FUN_OBJ_1(esp32_boottrace_begin_obj);
+MP_DECLARE_CONST_FUN_OBJ_1(esp32_boottrace_end_obj);
+MP_DECLARE_CONST_FUN_OBJ_0(esp32_boottrace_read_obj);
+#define ESP32_BOOTTRACE_BEGIN(kind, name) esp32_boottrace_begin(kind, name)
+#define ESP32_BOOTTRACE_END(name) esp32_boottrace_end(name)
+#else
+#define ESP32_BOOTTRACE_BEGIN(kind, name)
+#define ESP32_BOOTTRACE_END(name)
+#endif
+
 esp_err_t rmt_driver_install_core1(uint8_t channel_id);
 
 #endif // MICROPY_INCLUDED_ESP32_MODESP32_H
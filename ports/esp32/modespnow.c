@@ -85,6 +85,18 @@ typedef struct {
     uint8_t msg[0];             // Message is up to 250 bytes
 } __attribute__((packed)) espnow_pkt_t;
 
+// Record format used by ESPNow.recvinto_many() to return a batch of messages
+// in a caller-provided buffer. Records are packed back-to-back and all fields
+// are little-endian. The padding keeps the record length a multiple of 4.
+typedef struct {
+    uint8_t peer[6];            // Peer address
+    int8_t rssi;                // RSSI value (dBm) (0 if not tracked)
+    uint8_t msg_len;            // Length of the message
+    uint32_t time_ms;           // Timestamp (ms) when packet is received
+    uint8_t msg[ESP_NOW_MAX_DATA_LEN];
+    uint8_t pad[2];
+} __attribute__((packed)) espnow_record_t;
+
 // The maximum length of an espnow packet (bytes)
 static const size_t MAX_PACKET_LEN = (
     (sizeof(espnow_pkt_t) + ESP_NOW_MAX_DATA_LEN));
@@ -457,6 +469,69 @@ static mp_obj_t espnow_recvinto(size_t n_args, const mp_obj_t *args) {
 }
 static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(espnow_recvinto_obj, 2, 3, espnow_recvinto);
 
+// ESPNow.recvinto_many(buffer[, max_msgs[, timeout_ms]]):
+// Waits for an espnow message, then copies it and any further messages already
+// in the receive buffer into buffer as an array of RECORD_LEN byte records
+// (see espnow_record_t), without allocating any memory on the heap (except to
+// add new peers to the peers_table).
+// Arguments:
+//      buffer: A writable buffer, at least RECORD_LEN bytes long.
+//      max_msgs: (Optional) maximum number of messages to return (or None).
+//      timeout_ms: (Optional) timeout in milliseconds (or None).
+// Only the first message is waited for, the call returns as soon as the
+// receive buffer is empty, max_msgs is reached or buffer is full.
+// Return the number of records written (0 on timeout).
+static mp_obj_t espnow_recvinto_many(size_t n_args, const mp_obj_t *args) {
+    esp_espnow_obj_t *self = _get_singleton_initialised();
+
+    mp_buffer_info_t bufinfo;
+    mp_get_buffer_raise(args[1], &bufinfo, MP_BUFFER_WRITE);
+    size_t max_msgs = bufinfo.len / sizeof(espnow_record_t);
+    if (n_args > 2 && args[2] != mp_const_none) {
+        mp_int_t n = mp_obj_get_int(args[2]);
+        if (n < 0) {
+            mp_raise_ValueError(MP_ERROR_TEXT("ESPNow.recvinto_many(): Invalid argument"));
+        }
+        max_msgs = MIN(max_msgs, (size_t)n);
+    }
+    if (max_msgs == 0) {
+        mp_raise_ValueError(MP_ERROR_TEXT("invalid buffer length"));
+    }
+    mp_int_t timeout_ms = ((n_args > 3 && args[3] != mp_const_none)
+            ? mp_obj_get_int(args[3]) : self->recv_timeout_ms);
+
+    espnow_record_t *rec = bufinfo.buf;
+    size_t n = 0;
+    while (n < max_msgs) {
+        // Wait for the first message only, then drain what is already buffered.
+        espnow_hdr_t hdr;
+        if (ringbuf_get_bytes_wait(self->recv_buffer, (uint8_t *)&hdr, sizeof(hdr),
+            n == 0 ? timeout_ms : 0) < 0) {
+            break;
+        }
+        if (hdr.magic != ESPNOW_MAGIC
+            || hdr.msg_len > ESP_NOW_MAX_DATA_LEN
+            || ringbuf_get_bytes(self->recv_buffer, rec->peer, ESP_NOW_ETH_ALEN) < 0
+            || ringbuf_get_bytes(self->recv_buffer, rec->msg, hdr.msg_len) < 0) {
+            mp_raise_ValueError(MP_ERROR_TEXT("ESPNow.recv(): buffer error"));
+        }
+        rec->msg_len = hdr.msg_len;
+        #if MICROPY_PY_ESPNOW_RSSI
+        rec->rssi = hdr.rssi;
+        rec->time_ms = hdr.time_ms;
+        _update_rssi(rec->peer, hdr.rssi, hdr.time_ms);
+        #else
+        rec->rssi = 0;
+        rec->time_ms = 0;
+        #endif // MICROPY_PY_ESPNOW_RSSI
+        ++rec;
+        ++n;
+    }
+
+    return MP_OBJ_NEW_SMALL_INT(n);
+}
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(espnow_recvinto_many_obj, 2, 4, espnow_recvinto_many);
+
 // Test if data is available to read from the buffers
 static mp_obj_t espnow_any(const mp_obj_t _) {
     esp_espnow_obj_t *self = _get_singleton_initialised();
@@ -771,6 +846,7 @@ static const mp_rom_map_elem_t esp_espnow_locals_dict_table[] = {
 
     // Send and receive messages
     { MP_ROM_QSTR(MP_QSTR_recvinto), MP_ROM_PTR(&espnow_recvinto_obj) },
+    { MP_ROM_QSTR(MP_QSTR_recvinto_many), MP_ROM_PTR(&espnow_recvinto_many_obj) },
     { MP_ROM_QSTR(MP_QSTR_send), MP_ROM_PTR(&espnow_send_obj) },
     { MP_ROM_QSTR(MP_QSTR_any), MP_ROM_PTR(&espnow_any_obj) },
 
@@ -792,6 +868,7 @@ static const mp_rom_map_elem_t espnow_globals_dict_table[] = {
     { MP_ROM_QSTR(MP_QSTR_ESPNowBase), MP_ROM_PTR(&esp_espnow_type) },
     { MP_ROM_QSTR(MP_QSTR_MAX_DATA_LEN), MP_ROM_INT(ESP_NOW_MAX_DATA_LEN)},
     { MP_ROM_QSTR(MP_QSTR_ADDR_LEN), MP_ROM_INT(ESP_NOW_ETH_ALEN)},
+    { MP_ROM_QSTR(MP_QSTR_RECORD_LEN), MP_ROM_INT(sizeof(espnow_record_t))},
     { MP_ROM_QSTR(MP_QSTR_KEY_LEN), MP_ROM_INT(ESP_NOW_KEY_LEN)},
     { MP_ROM_QSTR(MP_QSTR_MAX_TOTAL_PEER_NUM), MP_ROM_INT(ESP_NOW_MAX_TOTAL_PEER_NUM)},
     { MP_ROM_QSTR(MP_QSTR_MAX_ENCRYPT_PEER_NUM), MP_ROM_INT(ESP_NOW_MAX_ENCRYPT_PEER_NUM)},
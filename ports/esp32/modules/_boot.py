@@ -2,6 +2,12 @@ import gc
 import vfs
 from flashbdev import bdev
 
+try:
+    from esp32 import boottrace_begin, boottrace_end
+except ImportError:
+    boottrace_begin = boottrace_end = lambda stage: None
+
+boottrace_begin("vfs")
 try:
     if bdev:
         vfs.mount(bdev, "/")
@@ -9,5 +15,7 @@ except OSError:
     import inisetup
 
     inisetup.setup()
+boottrace_end("vfs")
 
+del boottrace_begin, boottrace_end
 gc.collect()
@@ -20,6 +20,21 @@ class ESPNow(ESPNowBase):
         n = self.recvinto(self._data, timeout_ms)
         return [bytes(x) for x in self._data] if n else self._none_tuple
 
+    def irecv_many(self, buf, timeout_ms=None):
+        # Yield (peer, msg) memoryviews into buf for a batch of messages
+        # received with recvinto_many(), without copying the message data.
+        n = self.recvinto_many(buf, None, timeout_ms)
+        mv = memoryview(buf)
+        for i in range(0, n * RECORD_LEN, RECORD_LEN):
+            yield mv[i : i + ADDR_LEN], mv[i + 12 : i + 12 + mv[i + 7]]
+
+    async def arecvinto_many(self, buf, max_msgs=None):
+        # Asyncio support for recvinto_many(): wait for at least one message.
+        import asyncio
+
+        yield asyncio.core._io_queue.queue_read(self)
+        return self.recvinto_many(buf, max_msgs, 0)
+
     def irq(self, callback):
         super().irq(callback, self)
 
@@ -415,6 +415,26 @@ void boardctrl_startup(void);
 #endif
 #endif
 
+// Boot-time tracer, records the timing of boot scripts, module imports and user
+// stages into RTC memory so they survive until read back via esp32.boottrace_read().
+#ifndef MICROPY_PY_ESP32_BOOTTRACE
+#define MICROPY_PY_ESP32_BOOTTRACE          (0)
+#endif
+
+#if MICROPY_PY_ESP32_BOOTTRACE
+#ifndef MICROPY_PY_ESP32_BOOTTRACE_ENTRIES
+#define MICROPY_PY_ESP32_BOOTTRACE_ENTRIES  (32)
+#endif
+#define ESP32_BOOTTRACE_KIND_STAGE          (0)
+#define ESP32_BOOTTRACE_KIND_SCRIPT         (1)
+#define ESP32_BOOTTRACE_KIND_IMPORT         (2)
+#define MICROPY_IMPORT_HOOK_LOAD_BEGIN(name) esp32_boottrace_begin(ESP32_BOOTTRACE_KIND_IMPORT, qstr_str(name))
+#define MICROPY_IMPORT_HOOK_LOAD_END(name)  esp32_boottrace_end(qstr_str(name))
+void esp32_boottrace_init(void);
+void esp32_boottrace_begin(unsigned int kind, const char *name);
+void esp32_boottrace_end(const char *name);
+#endif
+
 // The minimum string length threshold for string printing to stdout operations to be GIL-aware.
 #ifndef MICROPY_PY_STRING_TX_GIL_THRESHOLD
 #define MICROPY_PY_STRING_TX_GIL_THRESHOLD  (20)
@@ -487,6 +487,8 @@ static mp_obj_t process_import_at_level(qstr full_mod_name, qstr level_mod_name,
     }
     #endif // MICROPY_MODULE_OVERRIDE_MAIN_IMPORT
 
+    MICROPY_IMPORT_HOOK_LOAD_BEGIN(full_mod_name);
+
     if (stat == MP_IMPORT_STAT_DIR) {
         // Directory (i.e. a package).
         DEBUG_printf("%.*s is dir\n", (int)vstr_len(&path), vstr_str(&path));
@@ -517,6 +519,8 @@ static mp_obj_t process_import_at_level(qstr full_mod_name, qstr level_mod_name,
         // a __path__ attribute, and not attempt to stat it.
     }
 
+    MICROPY_IMPORT_HOOK_LOAD_END(full_mod_name);
+
     if (outer_module_obj != MP_OBJ_NULL) {
         // If it's a sub-module then make it available on the parent module.
         mp_store_attr(outer_module_obj, level_mod_name, module_obj);
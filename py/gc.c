@@ -225,6 +225,13 @@ void gc_init(void *start, void *end) {
     MP_STATE_MEM(gc_alloc_amount) = 0;
     #endif
 
+    #if MICROPY_GC_STATS
+    MP_STATE_MEM(gc_stats_collections) = 0;
+    MP_STATE_MEM(gc_stats_alloc_blocks) = 0;
+    MP_STATE_MEM(gc_stats_used_blocks) = 0;
+    MP_STATE_MEM(gc_stats_peak_blocks) = 0;
+    #endif
+
     GC_MUTEX_INIT();
 }
 
@@ -396,6 +403,9 @@ void gc_collect_start(void) {
     #if MICROPY_GC_ALLOC_THRESHOLD
     MP_STATE_MEM(gc_alloc_amount) = 0;
     #endif
+    #if MICROPY_GC_STATS
+    MP_STATE_MEM(gc_stats_collections)++;
+    #endif
 
     // Trace root pointers.  This relies on the root pointers being organised
     // correctly in the mp_state_ctx structure.  We scan nlr_top, dict_locals,
@@ -615,6 +625,9 @@ static void gc_sweep_free_blocks(void) {
     MP_STATE_MEM(gc_collected) = 0;
     #endif
     int free_tail = 0;
+    #if MICROPY_GC_STATS
+    size_t n_freed = 0;
+    #endif
     #if MICROPY_GC_SPLIT_HEAP_AUTO
     mp_state_mem_area_t *prev_area = NULL;
     #endif
@@ -638,6 +651,9 @@ static void gc_sweep_free_blocks(void) {
                 case AT_TAIL:
                     if (free_tail) {
                         ATB_ANY_TO_FREE(area, block);
+                        #if MICROPY_GC_STATS
+                        n_freed++;
+                        #endif
                         #if CLEAR_ON_SWEEP
                         memset((void *)PTR_FROM_BLOCK(area, block), 0, BYTES_PER_BLOCK);
                         #endif
@@ -667,6 +683,15 @@ static void gc_sweep_free_blocks(void) {
         prev_area = area;
         #endif
     }
+
+    #if MICROPY_GC_STATS
+    // Only the blocks left after a sweep are known to be live, so the peak is
+    // measured here rather than as blocks are allocated.
+    MP_STATE_MEM(gc_stats_used_blocks) -= n_freed;
+    if (MP_STATE_MEM(gc_stats_used_blocks) > MP_STATE_MEM(gc_stats_peak_blocks)) {
+        MP_STATE_MEM(gc_stats_peak_blocks) = MP_STATE_MEM(gc_stats_used_blocks);
+    }
+    #endif
 }
 
 // Address sanitizer needs to know that the access to ptrs[i] must always be
@@ -757,6 +782,27 @@ void gc_info(gc_info_t *info) {
     GC_EXIT();
 }
 
+#if MICROPY_GC_STATS
+// Must be called with the GC entered.
+static inline void gc_stats_add_blocks(size_t n_blocks) {
+    MP_STATE_MEM(gc_stats_alloc_blocks) += n_blocks;
+    MP_STATE_MEM(gc_stats_used_blocks) += n_blocks;
+}
+
+void gc_stats(gc_stats_t *stats, bool reset) {
+    GC_ENTER();
+    stats->collections = MP_STATE_MEM(gc_stats_collections);
+    stats->alloc_bytes = MP_STATE_MEM(gc_stats_alloc_blocks) * BYTES_PER_BLOCK;
+    stats->peak_bytes = MP_STATE_MEM(gc_stats_peak_blocks) * BYTES_PER_BLOCK;
+    if (reset) {
+        MP_STATE_MEM(gc_stats_collections) = 0;
+        MP_STATE_MEM(gc_stats_alloc_blocks) = 0;
+        MP_STATE_MEM(gc_stats_peak_blocks) = MP_STATE_MEM(gc_stats_used_blocks);
+    }
+    GC_EXIT();
+}
+#endif
+
 void *gc_alloc(size_t n_bytes, unsigned int alloc_flags) {
     bool has_finaliser = alloc_flags & GC_ALLOC_FLAG_HAS_FINALISER;
     size_t n_blocks = ((n_bytes + BYTES_PER_BLOCK - 1) & (~(BYTES_PER_BLOCK - 1))) / BYTES_PER_BLOCK;
@@ -880,6 +926,10 @@ found:
     MP_STATE_MEM(gc_alloc_amount) += n_blocks;
     #endif
 
+    #if MICROPY_GC_STATS
+    gc_stats_add_blocks(n_blocks);
+    #endif
+
     GC_EXIT();
 
     #if MICROPY_GC_CONSERVATIVE_CLEAR
@@ -976,10 +1026,16 @@ void gc_free(void *ptr) {
     }
 
     // free head and all of its tail blocks
+    #if MICROPY_GC_STATS
+    size_t start_block = block;
+    #endif
     do {
         ATB_ANY_TO_FREE(area, block);
         block += 1;
     } while (ATB_GET_KIND(area, block) == AT_TAIL);
+    #if MICROPY_GC_STATS
+    MP_STATE_MEM(gc_stats_used_blocks) -= block - start_block;
+    #endif
 
     GC_EXIT();
 
@@ -1094,6 +1150,10 @@ void *gc_realloc(void *ptr_in, size_t n_bytes, bool allow_move) {
             ATB_ANY_TO_FREE(area, bl);
         }
 
+        #if MICROPY_GC_STATS
+        MP_STATE_MEM(gc_stats_used_blocks) -= n_blocks - new_blocks;
+        #endif
+
         #if MICROPY_GC_SPLIT_HEAP
         if (MP_STATE_MEM(gc_last_free_area) != area) {
             // See comment in gc_free.
@@ -1126,6 +1186,10 @@ void *gc_realloc(void *ptr_in, size_t n_bytes, bool allow_move) {
 
         area->gc_last_used_block = MAX(area->gc_last_used_block, end_block);
 
+        #if MICROPY_GC_STATS
+        gc_stats_add_blocks(new_blocks - n_blocks);
+        #endif
+
         GC_EXIT();
 
         #if MICROPY_GC_CONSERVATIVE_CLEAR
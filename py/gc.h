@@ -81,6 +81,17 @@ typedef struct _gc_info_t {
 } gc_info_t;
 
 void gc_info(gc_info_t *info);
+
+#if MICROPY_GC_STATS
+typedef struct _gc_stats_t {
+    size_t collections; // number of collections
+    size_t alloc_bytes; // total bytes allocated
+    size_t peak_bytes; // peak bytes in use after a collection
+} gc_stats_t;
+
+// Get the statistics and, if reset is true, start counting again from now.
+void gc_stats(gc_stats_t *stats, bool reset);
+#endif
 void gc_dump_info(const mp_print_t *print);
 void gc_dump_alloc_table(const mp_print_t *print);
 
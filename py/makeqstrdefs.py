@@ -12,6 +12,7 @@ import os
 import re
 import subprocess
 import sys
+import time
 import multiprocessing, multiprocessing.dummy
 
 
@@ -41,6 +42,7 @@ def is_cxx_source(fname):
 
 
 def preprocess():
+    start = time.time()
     if any(src in args.dependencies for src in args.changed_sources):
         sources = args.sources
     elif any(args.changed_sources):
@@ -82,54 +84,91 @@ def preprocess():
             chunks = [sources[i : i + batch_size] for i in range(0, len(sources), batch_size or 1)]
             for output in p.imap(pp(flags), chunks):
                 out_file.write(output)
+    print(
+        "Preprocessed %d of %d files in %.2fs"
+        % (len(csources) + len(cxxsources), len(args.sources), time.time() - start)
+    )
 
 
 def write_out(fname, output):
+    for m, r in [("/", "__"), ("\\", "__"), (":", "@"), ("..", "@@")]:
+        fname = fname.replace(m, r)
+    fname = args.output_dir + "/" + fname + "." + args.mode
     if output:
-        for m, r in [("/", "__"), ("\\", "__"), (":", "@"), ("..", "@@")]:
-            fname = fname.replace(m, r)
-        with open(args.output_dir + "/" + fname + "." + args.mode, "w") as f:
+        with open(fname, "w") as f:
             f.write("\n".join(output) + "\n")
+    elif os.path.exists(fname):
+        # The file no longer has anything of this mode.
+        os.remove(fname)
+
+
+def match_pattern(mode):
+    if mode == _MODE_QSTR:
+        return re.compile(r"MP_QSTR_[_a-zA-Z0-9]+")
+    elif mode == _MODE_COMPRESS:
+        return re.compile(r'MP_COMPRESSED_ROM_TEXT\("([^"\n]*)"\)')
+    elif mode == _MODE_MODULE:
+        return re.compile(
+            r"(?:MP_REGISTER_MODULE|MP_REGISTER_EXTENSIBLE_MODULE|MP_REGISTER_MODULE_DELEGATION)\(.*?,\s*.*?\);"
+        )
+    elif mode == _MODE_ROOT_POINTER:
+        return re.compile(r"MP_REGISTER_ROOT_POINTER\(.*?\);")
+
+
+def scan(mode, text):
+    output = []
+    for match in match_pattern(mode).findall(text):
+        if mode == _MODE_QSTR:
+            name = match.replace("MP_QSTR_", "")
+            output.append("Q(" + name + ")")
+        elif mode in (_MODE_COMPRESS, _MODE_MODULE, _MODE_ROOT_POINTER):
+            output.append(match)
+    # A file that is included more than once (eg extmod/vfs_lfsx.c) is only
+    # registered once.
+    seen = set()
+    return [x for x in output if not (x in seen or seen.add(x))]
 
 
 def process_file(f):
+    start = time.time()
+
+    # Split the preprocessor output into the source files it came from (the
+    # content of headers belongs to the source file that included them).
     # match gcc-like output (# n "file") and msvc-like output (#line n "file")
-    re_line = re.compile(r"^#(?:line)?\s+\d+\s\"([^\"]+)\"")
-    if args.mode == _MODE_QSTR:
-        re_match = re.compile(r"MP_QSTR_[_a-zA-Z0-9]+")
-    elif args.mode == _MODE_COMPRESS:
-        re_match = re.compile(r'MP_COMPRESSED_ROM_TEXT\("([^"]*)"\)')
-    elif args.mode == _MODE_MODULE:
-        re_match = re.compile(
-            r"(?:MP_REGISTER_MODULE|MP_REGISTER_EXTENSIBLE_MODULE|MP_REGISTER_MODULE_DELEGATION)\(.*?,\s*.*?\);"
-        )
-    elif args.mode == _MODE_ROOT_POINTER:
-        re_match = re.compile(r"MP_REGISTER_ROOT_POINTER\(.*?\);")
-    output = []
+    re_line = re.compile(r"^#(?:line)?\s+\d+\s\"([^\"]+)\"", re.MULTILINE)
+    text = f.read()
+    units = {}
     last_fname = None
-    for line in f:
-        if line.isspace():
-            continue
-        m = re_line.match(line)
-        if m:
-            fname = m.group(1)
-            if not is_c_source(fname) and not is_cxx_source(fname):
-                continue
-            if fname != last_fname:
-                write_out(last_fname, output)
-                output = []
-                last_fname = fname
+    last_end = 0
+    for m in re_line.finditer(text):
+        fname = m.group(1)
+        if not is_c_source(fname) and not is_cxx_source(fname):
             continue
-        for match in re_match.findall(line):
-            if args.mode == _MODE_QSTR:
-                name = match.replace("MP_QSTR_", "")
-                output.append("Q(" + name + ")")
-            elif args.mode in (_MODE_COMPRESS, _MODE_MODULE, _MODE_ROOT_POINTER):
-                output.append(match)
-
+        if last_fname:
+            units[last_fname].append(text[last_end : m.start()])
+        units.setdefault(fname, [])
+        last_fname = fname
+        last_end = m.end()
     if last_fname:
-        write_out(last_fname, output)
-    return ""
+        units[last_fname].append(text[last_end:])
+    for fname in units:
+        units[fname] = "".join(units[fname])
+
+    for fname in sorted(units):
+        write_out(fname, scan(args.mode, units[fname]))
+
+    print("%s scanned %d files in %.2fs" % (mode_full_name(), len(units), time.time() - start))
+
+
+def mode_full_name():
+    mode_full = "QSTR"
+    if args.mode == _MODE_COMPRESS:
+        mode_full = "Compressed data"
+    elif args.mode == _MODE_MODULE:
+        mode_full = "Module registrations"
+    elif args.mode == _MODE_ROOT_POINTER:
+        mode_full = "Root pointer registrations"
+    return mode_full
 
 
 def cat_together():
@@ -153,13 +192,7 @@ def cat_together():
             old_hash = f.read()
     except IOError:
         pass
-    mode_full = "QSTR"
-    if args.mode == _MODE_COMPRESS:
-        mode_full = "Compressed data"
-    elif args.mode == _MODE_MODULE:
-        mode_full = "Module registrations"
-    elif args.mode == _MODE_ROOT_POINTER:
-        mode_full = "Root pointer registrations"
+    mode_full = mode_full_name()
     if old_hash != new_hash or not os.path.exists(args.output_file):
         print(mode_full, "updated")
 
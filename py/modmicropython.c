@@ -142,6 +142,23 @@ static mp_obj_t mp_micropython_heap_locked(void) {
 }
 static MP_DEFINE_CONST_FUN_OBJ_0(mp_micropython_heap_locked_obj, mp_micropython_heap_locked);
 #endif
+
+#if MICROPY_GC_STATS
+static mp_obj_t mp_micropython_heap_stats(size_t n_args, const mp_obj_t *args) {
+    gc_stats_t stats;
+    gc_stats(&stats, n_args == 1 && mp_obj_is_true(args[0]));
+    gc_info_t info;
+    gc_info(&info);
+    mp_obj_t items[] = {
+        mp_obj_new_int_from_uint(stats.collections),
+        mp_obj_new_int_from_uint(stats.alloc_bytes),
+        mp_obj_new_int_from_uint(stats.peak_bytes),
+        mp_obj_new_int_from_uint(info.max_free * MICROPY_BYTES_PER_GC_BLOCK),
+    };
+    return mp_obj_new_tuple(MP_ARRAY_SIZE(items), items);
+}
+static MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(mp_micropython_heap_stats_obj, 0, 1, mp_micropython_heap_stats);
+#endif
 #endif
 
 #if MICROPY_ENABLE_EMERGENCY_EXCEPTION_BUF && (MICROPY_EMERGENCY_EXCEPTION_BUF_SIZE == 0)
@@ -196,6 +213,9 @@ static const mp_rom_map_elem_t mp_module_micropython_globals_table[] = {
     #if MICROPY_PY_MICROPYTHON_HEAP_LOCKED
     { MP_ROM_QSTR(MP_QSTR_heap_locked), MP_ROM_PTR(&mp_micropython_heap_locked_obj) },
     #endif
+    #if MICROPY_GC_STATS
+    { MP_ROM_QSTR(MP_QSTR_heap_stats), MP_ROM_PTR(&mp_micropython_heap_stats_obj) },
+    #endif
     #endif
     #if MICROPY_KBD_EXCEPTION
     { MP_ROM_QSTR(MP_QSTR_kbd_intr), MP_ROM_PTR(&mp_micropython_kbd_intr_obj) },
@@ -200,6 +200,12 @@
 #define MICROPY_GC_ALLOC_THRESHOLD (MICROPY_CONFIG_ROM_LEVEL_AT_LEAST_CORE_FEATURES)
 #endif
 
+// Keep count of collections, bytes allocated and the peak heap usage,
+// available via micropython.heap_stats().
+#ifndef MICROPY_GC_STATS
+#define MICROPY_GC_STATS (MICROPY_ENABLE_GC && MICROPY_CONFIG_ROM_LEVEL_AT_LEAST_EXTRA_FEATURES)
+#endif
+
 // Number of bytes to allocate initially when creating new chunks to store
 // interned string data.  Smaller numbers lead to more chunks being needed
 // and more wastage at the end of the chunk.  Larger numbers lead to wasted
@@ -634,6 +640,18 @@
 #define MICROPY_VM_HOOK_RETURN
 #endif
 
+// Hooks called by the import machinery just before a module is loaded from the
+// filesystem or frozen code, and once it has finished loading (the end hook is
+// not called if loading raises an exception).  *name* is the qstr of the fully
+// qualified module name.
+#ifndef MICROPY_IMPORT_HOOK_LOAD_BEGIN
+#define MICROPY_IMPORT_HOOK_LOAD_BEGIN(name)
+#endif
+
+#ifndef MICROPY_IMPORT_HOOK_LOAD_END
+#define MICROPY_IMPORT_HOOK_LOAD_END(name)
+#endif
+
 // Hook for mp_sched_schedule when a function gets scheduled on sched_queue
 // (this macro executes within an atomic section)
 #ifndef MICROPY_SCHED_HOOK_SCHEDULED
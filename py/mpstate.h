@@ -143,6 +143,14 @@ typedef struct _mp_state_mem_t {
     size_t gc_collected;
     #endif
 
+    #if MICROPY_GC_STATS
+    // Heap statistics, counted in blocks (except for the collections).
+    size_t gc_stats_collections;
+    size_t gc_stats_alloc_blocks;
+    size_t gc_stats_used_blocks;
+    size_t gc_stats_peak_blocks;
+    #endif
+
     #if MICROPY_PY_THREAD && !MICROPY_PY_THREAD_GIL
     // This is a global mutex used to make the GC thread-safe.
     mp_thread_recursive_mutex_t gc_mutex;
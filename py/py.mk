@@ -219,6 +219,11 @@ PY_O += $(PY_CORE_O)
 # object file for frozen code specified via a manifest
 ifneq ($(FROZEN_MANIFEST),)
 PY_O += $(BUILD)/frozen_content.o
+# object files for the frozen modules that were split into their own C file by
+# a previous build (which lists them in frozen_mpy_c/modules), so that changing
+# one module only rebuilds that module
+FROZEN_MPY_C = $(addprefix $(BUILD)/frozen_mpy_c/,$(shell cat $(BUILD)/frozen_mpy_c/modules 2>/dev/null))
+PY_O += $(FROZEN_MPY_C:.c=.o)
 endif
 
 # Sources that may contain qstrings
@@ -0,0 +1,27 @@
+# Print information identifying the firmware build of the target.
+# run-tests.py uses this to key its cache of test results.
+
+import sys
+
+print(sys.implementation)
+try:
+    import os
+
+    print(os.uname())
+except (ImportError, AttributeError):
+    pass
+
+# The version information is the same for any build of a given commit, so
+# where possible also print a hash of the firmware image itself.
+try:
+    import esp32, hashlib, binascii
+
+    part = esp32.Partition(esp32.Partition.RUNNING)
+    h = hashlib.sha256()
+    buf = bytearray(part.ioctl(5, 0))
+    for block in range(part.ioctl(4, 0)):
+        part.readblocks(block, buf)
+        h.update(buf)
+    print(binascii.hexlify(h.digest()))
+except (ImportError, AttributeError):
+    pass
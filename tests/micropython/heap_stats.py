@@ -0,0 +1,35 @@
+# test micropython.heap_stats()
+
+import gc
+import micropython
+
+if not hasattr(micropython, "heap_stats"):
+    print("SKIP")
+    raise SystemExit
+
+gc.collect()
+micropython.heap_stats(True)
+
+# allocating memory counts towards the total
+l = bytearray(10000)
+collections, alloc, peak, max_free = micropython.heap_stats()
+print(collections, alloc >= 10000, max_free > 0)
+
+# the peak counts memory still in use when a collection runs
+gc.collect()
+collections, alloc, peak, max_free = micropython.heap_stats()
+print(collections, peak >= 10000)
+
+# the peak stays after the memory is freed, until reset
+l = None
+gc.collect()
+collections, alloc, peak, max_free = micropython.heap_stats(True)
+print(collections, peak >= 10000)
+collections, alloc, peak, max_free = micropython.heap_stats()
+print(collections, alloc < 10000, peak < 10000)
+
+# garbage doesn't count towards the peak
+bytearray(10000)
+gc.collect()
+collections, alloc, peak, max_free = micropython.heap_stats()
+print(collections, alloc >= 10000, peak < 10000)
@@ -0,0 +1,126 @@
+# Test the ESP32 batched receive extensions on instance1.
+# Will SKIP test if instance1 is not an ESP32.
+# Instance0 may be an ESP32 or ESP8266.
+
+try:
+    import time
+    import struct
+    import network
+    import random
+    import espnow
+except ImportError:
+    print("SKIP")
+    raise SystemExit
+
+# Set read timeout to 5 seconds
+timeout_ms = 5000
+default_pmk = b"MicroPyth0nRules"
+sync = True
+num_msgs = 4
+
+
+def echo_server(e):
+    peers = []
+    while True:
+        peer, msg = e.irecv(timeout_ms)
+        if peer is None:
+            return
+        if peer not in peers:
+            peers.append(peer)
+            e.add_peer(peer)
+
+        #  Echo the MAC and message back to the sender
+        if not e.send(peer, msg, sync):
+            print("ERROR: send() failed to", peer)
+            return
+
+        if msg == b"!done":
+            return
+
+
+def client_send(e, peer, msg, sync):
+    try:
+        if not e.send(peer, msg, sync):
+            print("ERROR: Send failed.")
+            return
+    except OSError as exc:
+        # Don't print exc as it is differs for esp32 and esp8266
+        print("ERROR: OSError:")
+        return
+
+
+def send_batch(e, peer):
+    msgs = [bytes([random.getrandbits(8) for _ in range(12)]) for _ in range(num_msgs)]
+    for msg in msgs:
+        client_send(e, peer, msg, True)
+    # Give the echoes time to arrive in the receive buffer.
+    time.sleep_ms(200)
+    return msgs
+
+
+def init(sta_active=True, ap_active=False):
+    wlans = [network.WLAN(i) for i in [network.WLAN.IF_STA, network.WLAN.IF_AP]]
+    e = espnow.ESPNow()
+    e.active(True)
+    e.set_pmk(default_pmk)
+    wlans[0].active(sta_active)
+    wlans[1].active(ap_active)
+    return e
+
+
+# Server
+def instance0():
+    e = init(True, False)
+    multitest.globals(PEERS=[network.WLAN(i).config("mac") for i in (0, 1)])
+    multitest.next()
+    print("Server Start")
+    echo_server(e)
+    print("Server Done")
+    e.active(False)
+
+
+# Client
+def instance1():
+    # Instance 1 (the client)
+    e = init(True, False)
+    if not hasattr(e, "recvinto_many"):
+        e.active(False)
+        print("SKIP")
+        raise SystemExit
+
+    e.config(timeout_ms=timeout_ms, rxbuf=1024)
+    multitest.next()
+    peer = PEERS[0]
+    e.add_peer(peer)
+
+    print("RECVINTO_MANY() test...")
+    buf = bytearray(8 * espnow.RECORD_LEN)
+    msgs = send_batch(e, peer)
+    n = e.recvinto_many(buf)
+    print("count", n)
+    for i, msg in enumerate(msgs):
+        rec = i * espnow.RECORD_LEN
+        rssi, msg_len = struct.unpack_from("<bB", buf, rec + 6)
+        ok = (
+            buf[rec : rec + espnow.ADDR_LEN] == peer
+            and buf[rec + 12 : rec + 12 + msg_len] == msg
+            and -127 < rssi < 0
+        )
+        print("OK" if ok else "ERROR: Received != Sent")
+
+    print("IRECV_MANY() test...")
+    msgs = send_batch(e, peer)
+    received = [bytes(msg) for mac, msg in e.irecv_many(buf)]
+    print("OK" if received == msgs else "ERROR: Received != Sent")
+
+    print("TIMEOUT test...")
+    print("count", e.recvinto_many(buf, None, 0))
+
+    # Tell the server to stop
+    print("DONE")
+    msg = b"!done"
+    client_send(e, peer, msg, True)
+    p2, msg2 = e.irecv()
+    print("OK" if msg2 == msg else "ERROR: Received != Sent")
+
+    e.active(False)
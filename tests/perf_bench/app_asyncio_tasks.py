@@ -0,0 +1,63 @@
+# Test performance of asyncio with many tasks: a set of tasks sleeping for a
+# long time (as tasks waiting for rare events do) stay in the queue while
+# short-lived tasks are created, switch a few times and finish.
+
+try:
+    import asyncio
+except ImportError:
+    print("SKIP")
+    raise SystemExit
+
+
+async def sleeper():
+    await asyncio.sleep(1000)
+
+
+async def worker(counts, i):
+    for _ in range(3):
+        await asyncio.sleep(0)
+    counts[i % len(counts)] += 1
+
+
+async def main(nsleepers, nworkers):
+    sleepers = [asyncio.create_task(sleeper()) for _ in range(nsleepers)]
+    counts = [0] * 4
+    for _ in range(nworkers // 8):
+        await asyncio.gather(*(worker(counts, i) for i in range(8)))
+    for t in sleepers:
+        t.cancel()
+    await asyncio.sleep(0)
+    return counts
+
+
+def test(nloop, nsleepers, nworkers):
+    for _ in range(nloop):
+        counts = asyncio.run(main(nsleepers, nworkers))
+    return counts
+
+
+###########################################################################
+# Benchmark interface
+
+bm_params = {
+    (32, 10): (1, 32, 64),
+    (50, 10): (2, 32, 64),
+    (100, 10): (4, 32, 64),
+    (500, 10): (20, 32, 64),
+    (1000, 10): (40, 32, 64),
+    (5000, 10): (200, 32, 64),
+}
+
+
+def bm_setup(params):
+    nloop, nsleepers, nworkers = params
+    state = None
+
+    def run():
+        nonlocal state
+        state = test(nloop, nsleepers, nworkers)
+
+    def result():
+        return nloop * nworkers, state
+
+    return run, result
@@ -0,0 +1,86 @@
+# Test performance of encoding and decoding CAN frames, as done by a CAN bus
+# driver or gateway.  Frames are packed with struct into a buffer laid out like
+# SocketCAN frames, and their payloads decoded with uctypes.
+
+try:
+    import struct, uctypes
+except ImportError:
+    print("SKIP")
+    raise SystemExit
+
+# A frame is a 32-bit id (with flags in the top bits), the data length, three
+# bytes of padding and eight bytes of data.
+FRAME_FMT = "<IB3x8s"
+FRAME_SIZE = 16
+CAN_EFF_FLAG = 0x80000000
+
+# Layout of the data of a (made up) sensor frame.
+SENSOR = {
+    "temp": uctypes.INT16 | 0,
+    "pressure": uctypes.UINT16 | 2,
+    "status": uctypes.UINT8 | 4,
+    "seq": uctypes.UINT8 | 5,
+    "check": uctypes.UINT16 | 6,
+}
+
+
+def encode(buf, nframes):
+    data = bytearray(8)
+    for i in range(nframes):
+        temp = (i * 37) % 2000 - 1000
+        pressure = (i * 113) & 0xFFFF
+        struct.pack_into("<hHBB", data, 0, temp, pressure, i & 0x3F, i & 0xFF)
+        struct.pack_into("<H", data, 6, (temp ^ pressure) & 0xFFFF)
+        can_id = 0x100 + (i & 0x7FF) if i & 1 else CAN_EFF_FLAG | (0x18FF0000 + i)
+        struct.pack_into(FRAME_FMT, buf, i * FRAME_SIZE, can_id, 8, data)
+
+
+def decode(buf, nframes):
+    addr = uctypes.addressof(buf)
+    total = 0
+    for i in range(nframes):
+        can_id, dlc, _ = struct.unpack_from(FRAME_FMT, buf, i * FRAME_SIZE)
+        if can_id & CAN_EFF_FLAG:
+            can_id &= 0x1FFFFFFF
+        s = uctypes.struct(addr + i * FRAME_SIZE + 8, SENSOR, uctypes.LITTLE_ENDIAN)
+        if (s.temp ^ s.pressure) & 0xFFFF != s.check:
+            return -1
+        total = (
+            total + (can_id & 0xFFFF) + dlc + s.temp + s.pressure + s.status + s.seq
+        ) & 0xFFFFFF
+    return total
+
+
+def test(nloop, nframes):
+    buf = bytearray(nframes * FRAME_SIZE)
+    for _ in range(nloop):
+        encode(buf, nframes)
+        total = decode(buf, nframes)
+    return total
+
+
+###########################################################################
+# Benchmark interface
+
+bm_params = {
+    (32, 10): (2, 64),
+    (50, 10): (4, 64),
+    (100, 10): (8, 64),
+    (500, 10): (40, 64),
+    (1000, 10): (80, 64),
+    (5000, 10): (400, 64),
+}
+
+
+def bm_setup(params):
+    nloop, nframes = params
+    state = None
+
+    def run():
+        nonlocal state
+        state = test(nloop, nframes)
+
+    def result():
+        return nloop * nframes, state
+
+    return run, result
@@ -0,0 +1,54 @@
+# Test performance of hashing a file a chunk at a time into a preallocated
+# buffer, as done when verifying a firmware image or a downloaded file.  The
+# file is held in memory, so the test doesn't depend on a filesystem.
+
+try:
+    import hashlib, io
+
+    hashlib.sha256
+except (ImportError, AttributeError):
+    print("SKIP")
+    raise SystemExit
+
+
+def test(nloop, size, chunk_size):
+    f = io.BytesIO(bytes((i * 31) & 0xFF for i in range(size)))
+    buf = bytearray(chunk_size)
+    mv = memoryview(buf)
+    for _ in range(nloop):
+        f.seek(0)
+        h = hashlib.sha256()
+        while True:
+            n = f.readinto(buf)
+            if n == 0:
+                break
+            h.update(mv[:n])
+        digest = h.digest()
+    return digest[:8]
+
+
+###########################################################################
+# Benchmark interface
+
+bm_params = {
+    (32, 10): (4, 2048, 256),
+    (50, 10): (8, 2048, 256),
+    (100, 10): (16, 2048, 256),
+    (500, 10): (80, 2048, 256),
+    (1000, 10): (160, 2048, 256),
+    (5000, 10): (800, 2048, 256),
+}
+
+
+def bm_setup(params):
+    nloop, size, chunk_size = params
+    state = None
+
+    def run():
+        nonlocal state
+        state = test(nloop, size, chunk_size)
+
+    def result():
+        return nloop * size // 1024, state
+
+    return run, result
@@ -0,0 +1,57 @@
+# Test performance of encoding telemetry records as JSON, as a device
+# reporting its sensor readings over MQTT or HTTP does.
+
+try:
+    import json
+except ImportError:
+    print("SKIP")
+    raise SystemExit
+
+
+def reading(i):
+    return {
+        "id": "sensor-%d" % (i & 7),
+        "seq": i,
+        "ok": i % 5 != 0,
+        "temp": 200 + (i * 13) % 150,
+        "humidity": 30 + (i * 7) % 60,
+        "flags": [i & 1, i & 2, i & 4],
+        "error": None if i % 5 else "timeout",
+    }
+
+
+def test(nloop, nrecords):
+    readings = [reading(i) for i in range(nrecords)]
+    for _ in range(nloop):
+        size = 0
+        for r in readings:
+            size += len(json.dumps(r))
+        size += len(json.dumps({"device": "node-1", "readings": readings}))
+    return size
+
+
+###########################################################################
+# Benchmark interface
+
+bm_params = {
+    (32, 10): (1, 16),
+    (50, 10): (2, 16),
+    (100, 10): (4, 16),
+    (500, 10): (20, 16),
+    (1000, 10): (40, 16),
+    (5000, 10): (200, 16),
+}
+
+
+def bm_setup(params):
+    nloop, nrecords = params
+    state = None
+
+    def run():
+        nonlocal state
+        state = test(nloop, nrecords)
+
+    def result():
+        return nloop * nrecords, state
+
+    return run, result
@@ -0,0 +1,86 @@
+# Test performance of a ring buffer of bytes, with a producer writing chunks of
+# varying size (as a UART IRQ handler would) and a consumer reading fixed-size
+# records out of it.
+
+
+class RingBuffer:
+    def __init__(self, size):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.size = size
+        self.head = 0
+        self.tail = 0
+
+    def available(self):
+        return (self.head - self.tail) % self.size
+
+    def free(self):
+        return self.size - 1 - self.available()
+
+    def write(self, data):
+        n = min(len(data), self.free())
+        head = self.head
+        first = min(n, self.size - head)
+        self.mv[head : head + first] = data[:first]
+        if first < n:
+            self.mv[: n - first] = data[first:n]
+        self.head = (head + n) % self.size
+        return n
+
+    def readinto(self, out):
+        n = min(len(out), self.available())
+        tail = self.tail
+        first = min(n, self.size - tail)
+        out[:first] = self.mv[tail : tail + first]
+        if first < n:
+            out[first:n] = self.mv[: n - first]
+        self.tail = (tail + n) % self.size
+        return n
+
+
+def test(nloop, nbytes):
+    rb = RingBuffer(256)
+    src = memoryview(bytes(i & 0xFF for i in range(64)))
+    record = bytearray(24)
+    for _ in range(nloop):
+        total = 0
+        produced = 0
+        consumed = 0
+        i = 0
+        while consumed < nbytes:
+            if produced < nbytes:
+                chunk = 1 + (i * 7) % 63
+                produced += rb.write(src[: min(chunk, nbytes - produced)])
+                i += 1
+            while rb.available() >= len(record) or (produced == nbytes and rb.available()):
+                n = rb.readinto(record)
+                consumed += n
+                total = (total + sum(record[:n])) & 0xFFFFFF
+    return total
+
+
+###########################################################################
+# Benchmark interface
+
+bm_params = {
+    (32, 10): (2, 4096),
+    (50, 10): (3, 4096),
+    (100, 10): (6, 4096),
+    (500, 10): (30, 4096),
+    (1000, 10): (60, 4096),
+    (5000, 10): (300, 4096),
+}
+
+
+def bm_setup(params):
+    nloop, nbytes = params
+    state = None
+
+    def run():
+        nonlocal state
+        state = test(nloop, nbytes)
+
+    def result():
+        return nloop * nbytes // 64, state
+
+    return run, result
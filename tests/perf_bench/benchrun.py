@@ -18,10 +18,27 @@ def bm_run(N, M):
         print(-1, -1, "SKIP: no matching params")
         return
 
+    # Measure use of the heap if the target supports it
+    try:
+        from micropython import heap_stats
+        from gc import collect
+    except ImportError:
+        heap_stats = None
+
     # Run and time benchmark
     run, result = bm_setup(param)
+    if heap_stats:
+        collect()
+        heap_stats(True)
     t0 = ticks_us()
     run()
     t1 = ticks_us()
+    if heap_stats:
+        mem = list(heap_stats())
+        # The peak is measured by collections, so include the heap in use now.
+        collect()
+        mem[2] = heap_stats()[2]
     norm, out = result()
+    if heap_stats:
+        print("mem", *mem)
     print(ticks_diff(t1, t0), norm, out)
@@ -8,6 +8,10 @@ import os
 import subprocess
 import sys
 import argparse
+import hashlib
+import json
+import math
+import time
 from glob import glob
 
 sys.path.append("../tools")
@@ -29,6 +33,22 @@ PYTHON_TRUTH = CPYTHON3
 
 BENCH_SCRIPT_DIR = "perf_bench/"
 
+# Significance level for comparing runs in the results store.
+SIGNIFICANCE = 0.05
+
+# What is measured for each benchmark, in the order it's output: the key in the
+# results store, a description, and whether higher values are better.  Heap use
+# is only measured on targets that have micropython.heap_stats().
+METRICS = {
+    "time": ("times", "microsecond times", False),
+    "score": ("scores", "scores", True),
+    "peak": ("heap_peak", "peak heap use in bytes", False),
+    "alloc": ("heap_alloc", "bytes allocated", False),
+    "gc": ("gc_collections", "garbage collections", False),
+    "maxfree": ("heap_max_free", "largest free block in bytes", True),
+}
+MEM_METRICS = ("gc", "alloc", "peak", "maxfree")  # order output by benchrun.py
+
 
 def compute_stats(lst):
     avg = 0
@@ -41,6 +61,64 @@ def compute_stats(lst):
     return avg, var**0.5
 
 
+def percent(x, total):
+    if not total:
+        return math.copysign(math.inf, x) if x else 0.0
+    return 100 * x / total
+
+
+def describe_metric(metric):
+    _, desc, higher_better = METRICS[metric]
+    return "{} ({} is better)".format(desc, "higher" if higher_better else "lower")
+
+
+def betainc(a, b, x):
+    # Regularised incomplete beta function I_x(a, b), evaluated with its
+    # continued fraction (using Lentz's method).
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    if x > (a + 1) / (a + b + 2):
+        # The continued fraction converges quickly only for x below this.
+        return 1 - betainc(b, a, 1 - x)
+    lbeta = math.lgamma(a) + math.lgamma(b) - math.lgamma(a + b)
+    front = math.exp(a * math.log(x) + b * math.log(1 - x) - lbeta) / a
+    f, c, d = 1.0, 1.0, 0.0
+    for i in range(200):
+        m = i // 2
+        if i == 0:
+            num = 1.0
+        elif i % 2 == 0:
+            num = m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m))
+        else:
+            num = -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))
+        d = 1 + num * d
+        d = 1 / (d if abs(d) > 1e-30 else 1e-30)
+        c = 1 + num / c
+        c = c if abs(c) > 1e-30 else 1e-30
+        f *= c * d
+        if abs(1 - c * d) < 1e-10:
+            break
+    return front * (f - 1)
+
+
+def welch_t_test(lst1, lst2):
+    # Return the p-value of Welch's t-test for the means of the two samples
+    # being different, which doesn't assume they have the same variance.
+    n1, n2 = len(lst1), len(lst2)
+    if n1 < 2 or n2 < 2:
+        return 1.0
+    av1, av2 = sum(lst1) / n1, sum(lst2) / n2
+    var1 = sum((x - av1) ** 2 for x in lst1) / (n1 - 1) / n1
+    var2 = sum((x - av2) ** 2 for x in lst2) / (n2 - 1) / n2
+    if var1 + var2 == 0:
+        return 1.0 if av1 == av2 else 0.0
+    t = (av2 - av1) / (var1 + var2) ** 0.5
+    df = (var1 + var2) ** 2 / (var1**2 / (n1 - 1) + var2**2 / (n2 - 1))
+    return betainc(df / 2, 0.5, df / (df + t * t))
+
+
 def run_script_on_target(target, script):
     output = b""
     err = None
@@ -76,20 +154,25 @@ def run_feature_test(target, test):
 
 
 def run_benchmark_on_target(target, script):
+    # Returns time, norm, result and, if measured, a dict of heap use.
     output, err = run_script_on_target(target, script)
     if err is None:
         if output == "SKIP":
-            return -1, -1, "SKIP"
-        time, norm, result = output.split(None, 2)
+            return -1, -1, "SKIP", None
         try:
-            return int(time), int(norm), result
+            mem = None
+            if output.startswith("mem "):
+                mem, output = output.split("\n", 1)
+                mem = dict(zip(MEM_METRICS, (int(v) for v in mem.split()[1:])))
+            time, norm, result = output.strip().split(None, 2)
+            return int(time), int(norm), result, mem
         except ValueError:
-            return -1, -1, "CRASH: %r" % output
+            return -1, -1, "CRASH: %r" % output, None
     else:
-        return -1, -1, "CRASH: %r" % err
+        return -1, -1, "CRASH: %r" % err, None
 
 
-def run_benchmarks(args, target, param_n, param_m, n_average, test_list):
+def run_benchmarks(args, target, param_n, param_m, n_average, test_list, samples):
     skip_complex = run_feature_test(target, "complex") != "complex"
     skip_native = run_feature_test(target, "native_check") != "native"
     target_had_error = False
@@ -131,12 +214,11 @@ def run_benchmarks(args, target, param_n, param_m, n_average, test_list):
             test_script_target = test_script
 
         # Run MicroPython a given number of times
-        times = []
-        scores = []
+        values = {metric: [] for metric in METRICS}
         error = None
         result_out = None
         for _ in range(n_average):
-            time, norm, result = run_benchmark_on_target(target, test_script_target)
+            time, norm, result, mem = run_benchmark_on_target(target, test_script_target)
             if time < 0 or norm < 0:
                 error = result
                 break
@@ -145,8 +227,11 @@ def run_benchmarks(args, target, param_n, param_m, n_average, test_list):
             elif result != result_out:
                 error = "FAIL self"
                 break
-            times.append(time)
-            scores.append(1e6 * norm / time)
+            values["time"].append(time)
+            values["score"].append(1e6 * norm / time)
+            for metric in MEM_METRICS:
+                if mem is not None:
+                    values[metric].append(mem[metric])
 
         # Check result against truth if needed
         if error is None and result_out != "None":
@@ -157,7 +242,7 @@ def run_benchmarks(args, target, param_n, param_m, n_average, test_list):
                     result_exp = f.read().strip()
             else:
                 # Run CPython to work out the expected result
-                _, _, result_exp = run_benchmark_on_target(PYTHON_TRUTH, test_script)
+                _, _, result_exp, _ = run_benchmark_on_target(PYTHON_TRUTH, test_script)
             if result_out != result_exp:
                 error = "FAIL truth"
 
@@ -166,16 +251,19 @@ def run_benchmarks(args, target, param_n, param_m, n_average, test_list):
                 target_had_error = True
             print(error)
         else:
-            t_avg, t_sd = compute_stats(times)
-            s_avg, s_sd = compute_stats(scores)
-            print(
-                "{:.2f} {:.4f} {:.2f} {:.4f}".format(
-                    t_avg, 100 * t_sd / t_avg, s_avg, 100 * s_sd / s_avg
-                )
-            )
+            # Print the average and percent standard deviation of each metric
+            # that was measured (heap use is left off if it wasn't).
+            samples[test_file] = {}
+            stats = []
+            for metric, (key, _, _) in METRICS.items():
+                if len(values[metric]) == n_average:
+                    samples[test_file][key] = values[metric]
+                    avg, sd = compute_stats(values[metric])
+                    stats.append("{:.2f} {:.4f}".format(avg, percent(sd, avg)))
+            print(" ".join(stats))
             if 0:
-                print("  times: ", times)
-                print("  scores:", scores)
+                print("  times: ", values["time"])
+                print("  scores:", values["score"])
 
         sys.stdout.flush()
 
@@ -197,16 +285,14 @@ def parse_output(filename):
     return n, m, data
 
 
-def compute_diff(file1, file2, diff_score):
+def compute_diff(file1, file2, metric):
     # Parse output data from previous runs
     n1, m1, d1 = parse_output(file1)
     n2, m2, d2 = parse_output(file2)
+    index = 1 + 2 * list(METRICS).index(metric)
 
     # Print header
-    if diff_score:
-        print("diff of scores (higher is better)")
-    else:
-        print("diff of microsecond times (lower is better)")
+    print("diff of " + describe_metric(metric))
     if n1 == n2 and m1 == m2:
         hdr = "N={} M={}".format(n1, m1)
     else:
@@ -224,17 +310,18 @@ def compute_diff(file1, file2, diff_score):
             entry1 = d1.pop(0)
             entry2 = d2.pop(0)
             name = entry1[0].rsplit("/")[-1]
-            av1, sd1 = entry1[1 + 2 * diff_score], entry1[2 + 2 * diff_score]
-            av2, sd2 = entry2[1 + 2 * diff_score], entry2[2 + 2 * diff_score]
+            if len(entry1) <= index or len(entry2) <= index:
+                # This metric wasn't measured in one of the runs
+                continue
+            av1, sd1 = entry1[index], entry1[index + 1]
+            av2, sd2 = entry2[index], entry2[index + 1]
             sd1 *= av1 / 100  # convert from percent sd to absolute sd
             sd2 *= av2 / 100  # convert from percent sd to absolute sd
             av_diff = av2 - av1
             sd_diff = (sd1**2 + sd2**2) ** 0.5
-            percent = 100 * av_diff / av1
-            percent_sd = 100 * sd_diff / av1
             print(
                 "{:26} {:10.2f} -> {:10.2f} : {:+10.2f} = {:+7.3f}% (+/-{:.2f}%)".format(
-                    name, av1, av2, av_diff, percent, percent_sd
+                    name, av1, av2, av_diff, percent(av_diff, av1), percent(sd_diff, av1)
                 )
             )
         elif d1[0][0] < d2[0][0]:
@@ -243,6 +330,134 @@ def compute_diff(file1, file2, diff_score):
             d2.pop(0)
 
 
+def make_store_record(args, target, param_n, param_m, n_average, samples):
+    # Identify the code that was benchmarked: the commit of this repository,
+    # and a hash of the firmware (or the executable) it was built into.
+    try:
+        commit = subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    if isinstance(target, pyboard.Pyboard):
+        board = args.device
+        firmware = run_feature_test(target, "build_info").encode()
+    else:
+        board = "host"
+        with open(target[0], "rb") as f:
+            firmware = f.read()
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": commit,
+        "board": board,
+        "platform": run_feature_test(target, "target_info"),
+        "firmware": hashlib.sha256(firmware).hexdigest()[:16],
+        "N": param_n,
+        "M": param_m,
+        "n_average": n_average,
+        "tests": samples,
+    }
+
+
+def load_store(filename):
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def select_run(runs, selector):
+    # A run is selected by its index in the store (negative counts back from
+    # the latest run), or by (a prefix of) the commit it was made at.  A
+    # selector that is a number but not a valid index, such as a commit hash
+    # made of digits only, is tried as a commit.
+    try:
+        return runs[int(selector)]
+    except (ValueError, IndexError):
+        pass
+    for run in reversed(runs):
+        commit = run["commit"] or ""
+        # The commit is as given by "git describe", e.g. v1.24.0-12-g1234567.
+        if commit.startswith(selector) or commit.rpartition("-g")[2].startswith(selector):
+            return run
+    print("no run {} in the results store".format(selector))
+    sys.exit(1)
+
+
+def describe_run(run):
+    return "{} {} {}".format(run["commit"] or "?", run["date"], run["board"])
+
+
+def compare_runs(run1, run2, metric):
+    # Compare the metric for each test, flagging those that changed significantly.
+    key, _, higher_better = METRICS[metric]
+    if metric in ("time", "score"):
+        verdicts = ("FASTER", "SLOWER")
+    else:
+        verdicts = ("BETTER", "WORSE")
+    print("diff of {}, significant at p < {}".format(describe_metric(metric), SIGNIFICANCE))
+    print("  1: {}".format(describe_run(run1)))
+    print("  2: {}".format(describe_run(run2)))
+    if (run1["N"], run1["M"]) != (run2["N"], run2["M"]):
+        print("warning: runs have different N, M")
+    print("{:26} {:>10} -> {:>10}   {:>8} {:>7}".format("", "1", "2", "diff%", "p"))
+    for name in sorted(set(run1["tests"]) & set(run2["tests"])):
+        values1 = run1["tests"][name].get(key)
+        values2 = run2["tests"][name].get(key)
+        if not values1 or not values2:
+            continue
+        av1, _ = compute_stats(values1)
+        av2, _ = compute_stats(values2)
+        p = welch_t_test(values1, values2)
+        if p >= SIGNIFICANCE:
+            verdict = ""
+        elif (av2 > av1) == higher_better:
+            verdict = verdicts[0]
+        else:
+            verdict = verdicts[1]
+        print(
+            "{:26} {:10.2f} -> {:10.2f} : {:+7.2f}% {:7.4f} {}".format(
+                name.rsplit("/")[-1], av1, av2, percent(av2 - av1, av1), p, verdict
+            )
+        )
+
+
+def print_trend(runs, metric):
+    # Show how the metric for each test changed over the given runs, relative
+    # to the first one, marking changes from one run to the next that are
+    # significant with a "*".
+    key = METRICS[metric][0]
+    print(
+        "trend of {}, relative to the first run, "
+        "* marks a significant change from the previous run".format(describe_metric(metric))
+    )
+    for i, run in enumerate(runs):
+        print("  {}: {}".format(i + 1, describe_run(run)))
+    print("{:26}".format("") + "".join("{:>11}".format(i + 1) for i in range(len(runs))))
+    names = sorted(set(name for run in runs for name in run["tests"]))
+    for name in names:
+        line = "{:26}".format(name.rsplit("/")[-1])
+        first = None
+        prev = None
+        for run in runs:
+            values = run["tests"].get(name, {}).get(key)
+            if not values:
+                line += "{:>11}".format("-")
+                continue
+            av, _ = compute_stats(values)
+            mark = " "
+            if prev is not None and welch_t_test(prev, values) < SIGNIFICANCE:
+                mark = "*"
+            if first is None:
+                first = av
+                line += "{:10.2f}{}".format(av, mark)
+            else:
+                line += "{:+9.2f}%{}".format(percent(av - first, first), mark)
+            prev = values
+        print(line)
+
+
 def main():
     cmd_parser = argparse.ArgumentParser(description="Run benchmarks for MicroPython")
     cmd_parser.add_argument(
@@ -251,6 +466,12 @@ def main():
     cmd_parser.add_argument(
         "-s", "--diff-score", action="store_true", help="diff score outputs from a previous run"
     )
+    cmd_parser.add_argument(
+        "-m",
+        "--diff-mem",
+        choices=MEM_METRICS,
+        help="diff heap use outputs from a previous run",
+    )
     cmd_parser.add_argument(
         "-p", "--pyboard", action="store_true", help="run tests via pyboard.py"
     )
@@ -265,21 +486,52 @@ def main():
     cmd_parser.add_argument("--via-mpy", action="store_true", help="compile code to .mpy first")
     cmd_parser.add_argument("--mpy-cross-flags", default="", help="flags to pass to mpy-cross")
     cmd_parser.add_argument(
-        "N", nargs=1, help="N parameter (approximate target CPU frequency in MHz)"
+        "--store", metavar="FILE", help="results store to add this run to (a JSON line per run)"
+    )
+    cmd_parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar="RUN",
+        help="compare two runs in the results store, by index (eg -1 for the latest) or commit",
+    )
+    cmd_parser.add_argument(
+        "--trend", type=int, metavar="COUNT", help="show the trend over the last runs in the store"
+    )
+    cmd_parser.add_argument(
+        "--metric",
+        choices=METRICS,
+        default="time",
+        help="what to show with --compare and --trend (default time)",
+    )
+    cmd_parser.add_argument(
+        "N", nargs="?", help="N parameter (approximate target CPU frequency in MHz)"
     )
-    cmd_parser.add_argument("M", nargs=1, help="M parameter (approximate target heap in kbytes)")
+    cmd_parser.add_argument("M", nargs="?", help="M parameter (approximate target heap in kbytes)")
     cmd_parser.add_argument("files", nargs="*", help="input test files")
     args = cmd_parser.parse_args()
 
-    if args.diff_time or args.diff_score:
-        compute_diff(args.N[0], args.M[0], args.diff_score)
+    if args.diff_time or args.diff_score or args.diff_mem:
+        compute_diff(args.N, args.M, args.diff_mem or ("score" if args.diff_score else "time"))
         sys.exit(0)
 
+    if args.compare or args.trend:
+        if not args.store:
+            cmd_parser.error("--compare and --trend need --store")
+        runs = load_store(args.store)
+        if args.compare:
+            compare_runs(*(select_run(runs, sel) for sel in args.compare), args.metric)
+        else:
+            print_trend(runs[-args.trend :], args.metric)
+        sys.exit(0)
+
+    if args.N is None or args.M is None:
+        cmd_parser.error("N and M are required to run benchmarks")
+
     # N, M = 50, 25 # esp8266
     # N, M = 100, 100 # pyboard, esp32
     # N, M = 1000, 1000 # PC
-    N = int(args.N[0])
-    M = int(args.M[0])
+    N = int(args.N)
+    M = int(args.M)
     n_average = int(args.average)
 
     if args.pyboard:
@@ -307,7 +559,12 @@ def main():
 
     print("N={} M={} n_average={}".format(N, M, n_average))
 
-    target_had_error = run_benchmarks(args, target, N, M, n_average, tests)
+    samples = {}
+    target_had_error = run_benchmarks(args, target, N, M, n_average, tests, samples)
+
+    if args.store:
+        with open(args.store, "a") as f:
+            f.write(json.dumps(make_store_record(args, target, N, M, n_average, samples)) + "\n")
 
     if isinstance(target, pyboard.Pyboard):
         target.exit_raw_repl()
@@ -6,6 +6,8 @@ import sys
 import sysconfig
 import platform
 import argparse
+import collections
+import hashlib
 import inspect
 import json
 import re
@@ -52,6 +54,9 @@ CPYTHON3_CMD = [CPYTHON3, "-BS"]
 # File with the test results.
 RESULTS_FILE = "_results.json"
 
+# File with the tests that passed, used by --cache to skip them next time.
+CACHE_FILE = "_cache.json"
+
 # For diff'ing test output
 DIFF = os.getenv("MICROPY_DIFF", "diff -u")
 
@@ -322,6 +327,9 @@ def run_script_on_remote_target(pyb, args, test_file, is_special):
         pyb.enter_raw_repl()
         output_mupy = pyb.exec_(script)
     except pyboard.PyboardError as e:
+        if e.args[0] != "exception" and getattr(pyb, "raise_transport_errors", False):
+            # The board itself failed (e.g. a timeout), not the test.
+            raise
         had_crash = True
         if not is_special and e.args[0] == "exception":
             output_mupy = e.args[1] + e.args[2] + b"CRASH"
@@ -529,6 +537,60 @@ def run_feature_check(pyb, args, test_file):
     return run_micropython(pyb, args, test_file_path, test_file_path, is_special=True)
 
 
+def get_instance_hash(pyb, args):
+    # Return a hash identifying the MicroPython build being tested and how the
+    # tests are run on it, to key the cache of test results.
+    h = hashlib.sha256()
+    files = []
+    if pyb is None:
+        files.append(MICROPYTHON)
+    elif isinstance(pyb, PyboardNodeRunner):
+        files.append(pyb.micropython_mjs)
+    else:
+        h.update(run_feature_check(pyb, args, "build_info.py"))
+    if args.via_mpy:
+        files.append(MPYCROSS)
+    for filename in files:
+        with open(filename, "rb") as f:
+            h.update(f.read())
+    # The expected output of tests without a .exp file comes from CPython, so
+    # its version is part of the key too.
+    try:
+        h.update(
+            subprocess.check_output(
+                CPYTHON3_CMD + ["-c", "import sys; print(sys.version)"], stderr=subprocess.DEVNULL
+            )
+        )
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    h.update(
+        repr(
+            (
+                args.platform,
+                args.arch,
+                args.emit,
+                args.via_mpy,
+                args.mpy_cross_flags,
+                args.heapsize,
+                CPYTHON3_CMD,
+            )
+        ).encode()
+    )
+    return h.hexdigest()
+
+
+def get_test_hash(instance_hash, test_file):
+    # Combine the instance hash with the test and its expected output.
+    h = hashlib.sha256(instance_hash.encode())
+    for filename in (test_file, test_file + ".exp"):
+        if os.path.isfile(filename):
+            with open(filename, "rb") as f:
+                h.update(hashlib.sha256(f.read()).digest())
+        else:
+            h.update(bytes(32))
+    return h.hexdigest()
+
+
 class TestError(Exception):
     pass
 
@@ -598,7 +660,70 @@ class PyboardNodeRunner:
         return had_crash, output_mupy
 
 
-def run_tests(pyb, tests, args, result_dir, num_threads=1):
+def run_tests_on_instances(pybs, names, tests, run_one_test):
+    # Share the tests between several test instances.  Each instance takes the
+    # next test from a common queue as soon as it's free, so faster instances
+    # (or ones given quicker tests) run more of them.  An instance that stops
+    # responding is dropped, and the test it was running is handed to another
+    # one.  Returns the tests that could not be run on any instance.
+    queue = collections.deque(tests)
+    cond = threading.Condition()
+    busy = [0]
+    retried = set()
+    not_run = []
+    errors = []
+
+    # Let errors talking to a board reach the worker (rather than being
+    # reported as the test crashing), so that the board can be dropped.  A
+    # read timeout makes a board that has gone silent raise such an error
+    # instead of blocking its worker forever.
+    for pyb in pybs:
+        pyb.raise_transport_errors = True
+        pyb.serial.timeout = TEST_TIMEOUT
+
+    def worker(pyb, name):
+        while True:
+            with cond:
+                # With the queue empty, wait until the other instances are done
+                # in case one of them fails and hands its test back.
+                while not queue and busy[0] and not errors:
+                    cond.wait()
+                if not queue or errors:
+                    return
+                test = queue.popleft()
+                busy[0] += 1
+            try:
+                run_one_test(test, pyb)
+            except TestError as er:
+                with cond:
+                    errors.append(er)
+                return
+            except (OSError, pyboard.PyboardError) as er:
+                print("error: test instance {} failed running {}: {}".format(name, test, er))
+                with cond:
+                    if test in retried:
+                        # It failed on two instances, so it's probably the test at fault.
+                        not_run.append(test)
+                    else:
+                        retried.add(test)
+                        queue.append(test)
+                return
+            finally:
+                with cond:
+                    busy[0] -= 1
+                    cond.notify_all()
+
+    threads = [threading.Thread(target=worker, args=(pyb, name)) for pyb, name in zip(pybs, names)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return not_run + list(queue)
+
+
+def run_tests(pyb, tests, args, result_dir, num_threads=1, other_pybs=()):
     test_count = ThreadSafeCounter()
     testcase_count = ThreadSafeCounter()
     passed_count = ThreadSafeCounter()
@@ -843,7 +968,18 @@ def run_tests(pyb, tests, args, result_dir, num_threads=1):
         skip_tests.add("micropython/schedule.py")  # native code doesn't check pending events
         skip_tests.add("stress/bytecode_limit.py")  # bytecode specific test
 
-    def run_one_test(test_file):
+    # Load the cache of tests that passed, which maps each test to the hash it
+    # had and the number of testcases it ran.
+    cache = {}
+    if args.cache:
+        instance_hash = get_instance_hash(pyb, args)
+        try:
+            with open(os.path.join(result_dir, CACHE_FILE)) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def run_one_test(test_file, pyb=pyb):
         test_file = test_file.replace("\\", "/")
         test_file_abspath = os.path.abspath(test_file).replace("\\", "/")
 
@@ -893,6 +1029,17 @@ def run_tests(pyb, tests, args, result_dir, num_threads=1):
             skipped_tests.append(test_name)
             return
 
+        # Don't run the test again if it passed before and nothing has changed.
+        if args.cache:
+            test_hash = get_test_hash(instance_hash, test_file)
+            if cache.get(test_file, (None,))[0] == test_hash:
+                print("pass ", test_file, "(cached)")
+                passed_count.increment()
+                testcase_count.add(cache[test_file][1])
+                test_count.increment()
+                return
+            cache.pop(test_file, None)
+
         # Run the test on the MicroPython target.
         output_mupy = run_micropython(pyb, args, test_file, test_file_abspath)
 
@@ -979,7 +1126,8 @@ def run_tests(pyb, tests, args, result_dir, num_threads=1):
             extra_info = "(" + extra_info + ")"
             testcase_count.add(num_test_cases)
         else:
-            testcase_count.add(len(output_expected.splitlines()))
+            num_test_cases = len(output_expected.splitlines())
+            testcase_count.add(num_test_cases)
             test_passed = output_expected == output_mupy
 
         filename_expected = os.path.join(result_dir, test_basename + ".exp")
@@ -991,6 +1139,8 @@ def run_tests(pyb, tests, args, result_dir, num_threads=1):
             passed_count.increment()
             rm_f(filename_expected)
             rm_f(filename_mupy)
+            if args.cache:
+                cache[test_file] = (test_hash, num_test_cases)
         else:
             print("FAIL ", test_file, extra_info)
             if output_expected is not None:
@@ -1018,7 +1168,15 @@ def run_tests(pyb, tests, args, result_dir, num_threads=1):
         num_threads = 1
 
     try:
-        if num_threads > 1:
+        if other_pybs:
+            for test_file in run_tests_on_instances(
+                [pyb] + list(other_pybs), args.test_instance, tests, run_one_test
+            ):
+                print("FAIL ", test_file, "(no test instance could run it)")
+                test_name = os.path.splitext(os.path.basename(test_file))[0]
+                failed_tests.append((test_name, test_file))
+                test_count.increment()
+        elif num_threads > 1:
             pool = ThreadPool(num_threads)
             pool.map(run_one_test, tests)
         else:
@@ -1054,6 +1212,10 @@ def run_tests(pyb, tests, args, result_dir, num_threads=1):
             default=to_json,
         )
 
+    if args.cache:
+        with open(os.path.join(result_dir, CACHE_FILE), "w") as f:
+            json.dump(cache, f)
+
     if len(failed_tests) > 0:
         print(
             "{} tests failed: {}".format(
@@ -1117,6 +1279,11 @@ The -t option accepts the following for the test instance:
 - <a>.<b>.<c>.<d> - connect to the given IPv4 address
 - anything else specifies a serial port
 
+The -t option can be given more than once, with boards of the same kind, to run
+the tests on all of them at the same time.  Each board takes the next test as soon
+as it's done with the previous one, and a board that stops responding is dropped
+(its test is run again on another board).
+
 Options -i and -e can be multiple and processed in the order given. Regex
 "search" (vs "match") operation is used. An action (include/exclude) of
 the last matching regex is used:
@@ -1126,7 +1293,10 @@ the last matching regex is used:
 """,
     )
     cmd_parser.add_argument(
-        "-t", "--test-instance", default="unix", help="the MicroPython instance to test"
+        "-t",
+        "--test-instance",
+        action="append",
+        help="the MicroPython instance to test (may be given more than once)",
     )
     cmd_parser.add_argument(
         "-b", "--baudrate", default=115200, help="the baud rate of the serial device"
@@ -1190,6 +1360,11 @@ the last matching regex is used:
         action="store_true",
         help="re-run only the failed tests",
     )
+    cmd_parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="skip tests that passed before, unless they or the build under test changed",
+    )
     args = cmd_parser.parse_args()
 
     if args.print_failures:
@@ -1217,11 +1392,24 @@ the last matching regex is used:
 
         sys.exit(0)
 
-    # Get the test instance to run on.
-    pyb = get_test_instance(args.test_instance, args.baudrate, args.user, args.password)
-
-    # Automatically detect the platform.
+    # Get the test instance(s) to run on.
+    if args.test_instance is None:
+        args.test_instance = ["unix"]
+    if len(args.test_instance) > 1 and any(
+        t in ("unix", "webassembly") for t in args.test_instance
+    ):
+        raise ValueError("only boards can be given to -t more than once")
+    pybs = []
+    for test_instance in args.test_instance:
+        pybs.append(get_test_instance(test_instance, args.baudrate, args.user, args.password))
+    pyb = pybs[0]
+
+    # Automatically detect the platform, which must be the same for all instances.
     detect_test_platform(pyb, args)
+    for other_pyb in pybs[1:]:
+        output = run_feature_check(other_pyb, args, "target_info.py")
+        if output.split()[:1] != [args.platform.encode()]:
+            raise ValueError("test instances are different platforms: {}".format(output))
 
     if args.run_failures and (any(args.files) or args.test_dirs is not None):
         raise ValueError(
@@ -1310,10 +1498,11 @@ the last matching regex is used:
 
     try:
         os.makedirs(args.result_dir, exist_ok=True)
-        res = run_tests(pyb, tests, args, args.result_dir, args.jobs)
+        res = run_tests(pyb, tests, args, args.result_dir, args.jobs, pybs[1:])
     finally:
-        if pyb:
-            pyb.close()
+        for pyb in pybs:
+            if pyb:
+                pyb.close()
 
     if not res:
         sys.exit(1)
@@ -27,7 +27,11 @@
 from __future__ import print_function
 import sys
 import os
+import hashlib
+import shutil
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 # Always use the mpy-cross from this repo.
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../mpy-cross"))
@@ -66,6 +70,58 @@ def mkdir(filename):
         os.makedirs(path)
 
 
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# Compile a module to outfile with mpy-cross, unless the cache already has the
+# .mpy file for it.  The cache is keyed by a hash of everything that goes into
+# the .mpy file: the source (including any __version__ added to it), the path
+# embedded in it, the optimisation level and flags (which select the
+# architecture), and the mpy-cross binary itself.  This lets builds of
+# different boards, or in different build directories, share compiled modules.
+# Returns True if outfile came from the cache.
+def compile_mpy(result, outfile, mpy_cross_path, mpy_cross_hash, flags, cache_dir):
+    with manifestfile.tagged_py_file(result.full_path, result.metadata) as tagged_path:
+        cache_path = None
+        if cache_dir:
+            h = hashlib.sha256()
+            for item in (mpy_cross_hash, result.target_path, repr(result.opt), repr(flags)):
+                h.update(item.encode() + b"\0")
+            with open(tagged_path, "rb") as f:
+                h.update(f.read())
+            key = h.hexdigest()
+            cache_path = os.path.join(cache_dir, key[:2], key + ".mpy")
+            if os.path.exists(cache_path):
+                shutil.copyfile(cache_path, outfile)
+                return True
+        mpy_cross.compile(
+            tagged_path,
+            dest=outfile,
+            src_path=result.target_path,
+            opt=result.opt,
+            mpy_cross=mpy_cross_path,
+            extra_args=flags,
+        )
+
+    if cache_path:
+        # Write the cache entry atomically, because other builds may be using
+        # the cache at the same time.  Failing to do so isn't an error.
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+            os.close(fd)
+            shutil.copyfile(outfile, tmp_path)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+    return False
+
+
 # Formerly make-frozen.py.
 # This generates:
 # - MP_FROZEN_STR_NAMES macro
@@ -137,6 +193,30 @@ def main():
     )
     cmd_parser.add_argument("-v", "--var", action="append", help="variables to substitute")
     cmd_parser.add_argument("--mpy-tool-flags", default="", help="flags to pass to mpy-tool")
+    cmd_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of modules to compile at the same time",
+    )
+    cmd_parser.add_argument(
+        "--mpy-cache",
+        help="directory to cache compiled modules in (empty to disable, "
+        "default $MICROPY_MPYCROSS_CACHE or mpy-cross/build/cache)",
+    )
+    cmd_parser.add_argument(
+        "--split",
+        action="store_true",
+        help="write each frozen .mpy module to its own C file in BUILD_DIR/frozen_mpy_c",
+    )
+    cmd_parser.add_argument(
+        "--split-compiled",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="a module C file that the build compiles separately (with --split)",
+    )
     cmd_parser.add_argument("files", nargs="+", help="input manifest list")
     args = cmd_parser.parse_args()
 
@@ -157,6 +237,10 @@ def main():
         MPY_CROSS += ".exe"
     MPY_CROSS = os.getenv("MICROPY_MPYCROSS", MPY_CROSS)
     MPY_TOOL = VARS["MPY_DIR"] + "/tools/mpy-tool.py"
+    if args.mpy_cache is None:
+        args.mpy_cache = os.getenv(
+            "MICROPY_MPYCROSS_CACHE", VARS["MPY_DIR"] + "/mpy-cross/build/cache"
+        )
 
     # Ensure mpy-cross is built
     if not os.path.exists(MPY_CROSS):
@@ -176,6 +260,7 @@ def main():
     # Process the manifest
     str_paths = []
     mpy_files = []
+    to_compile = []
     ts_newest = 0
     for result in manifest.files():
         if result.kind == manifestfile.KIND_FREEZE_AS_STR:
@@ -190,24 +275,8 @@ def main():
             outfile = "{}/frozen_mpy/{}.mpy".format(args.build_dir, result.target_path[:-3])
             ts_outfile = get_timestamp(outfile, 0)
             if result.timestamp >= ts_outfile:
-                print("MPY", result.target_path)
                 mkdir(outfile)
-                # Add __version__ to the end of the file before compiling.
-                with manifestfile.tagged_py_file(result.full_path, result.metadata) as tagged_path:
-                    try:
-                        mpy_cross.compile(
-                            tagged_path,
-                            dest=outfile,
-                            src_path=result.target_path,
-                            opt=result.opt,
-                            mpy_cross=MPY_CROSS,
-                            extra_args=args.mpy_cross_flags.split(),
-                        )
-                    except mpy_cross.CrossCompileError as ex:
-                        print("error compiling {}:".format(result.target_path))
-                        print(ex.args[0])
-                        raise SystemExit(1)
-                ts_outfile = get_timestamp(outfile)
+                to_compile.append((result, outfile))
             mpy_files.append(outfile)
         else:
             assert result.kind == manifestfile.KIND_FREEZE_MPY
@@ -215,8 +284,46 @@ def main():
             ts_outfile = result.timestamp
         ts_newest = max(ts_newest, ts_outfile)
 
+    # Compile the modules that changed, in parallel (mpy-cross runs as a
+    # separate process, so threads are enough to keep several running).
+    if to_compile:
+        mpy_cross_hash = hash_file(MPY_CROSS) if args.mpy_cache else None
+        flags = args.mpy_cross_flags.split()
+        with ThreadPoolExecutor(max(1, args.jobs)) as pool:
+            futures = [
+                pool.submit(
+                    compile_mpy, result, outfile, MPY_CROSS, mpy_cross_hash, flags, args.mpy_cache
+                )
+                for result, outfile in to_compile
+            ]
+            for (result, outfile), future in zip(to_compile, futures):
+                try:
+                    cached = future.result()
+                except mpy_cross.CrossCompileError as ex:
+                    print("error compiling {}:".format(result.target_path))
+                    print(ex.args[0])
+                    for f in futures:
+                        f.cancel()
+                    raise SystemExit(1)
+                print("MPY {}{}".format(result.target_path, " (cached)" if cached else ""))
+                ts_newest = max(ts_newest, get_timestamp(outfile))
+
+    # When split, the output must also be regenerated if the module files that
+    # the build compiles separately changed, as the output includes the others.
+    split_dir = args.build_dir + "/frozen_mpy_c"
+    split_compiled = "".join(
+        sorted(os.path.basename(f) + "\n" for f in args.split_compiled if f.endswith(".c"))
+    )
+    split_compiled_changed = False
+    if args.split:
+        try:
+            with open(split_dir + "/compiled") as f:
+                split_compiled_changed = f.read() != split_compiled
+        except OSError:
+            split_compiled_changed = True
+
     # Check if output file needs generating
-    if ts_newest < get_timestamp(args.output, 0):
+    if ts_newest < get_timestamp(args.output, 0) and not split_compiled_changed:
         # No files are newer than output file so it does not need updating
         return
 
@@ -224,6 +331,12 @@ def main():
     output_str = generate_frozen_str_content(str_paths)
 
     # Freeze .mpy files
+    if args.split:
+        split_flags = ["--split-dir", split_dir]
+        for f in args.split_compiled:
+            split_flags += ["--split-compiled", os.path.basename(f)]
+    else:
+        split_flags = []
     if mpy_files:
         res, output_mpy = system(
             [
@@ -233,6 +346,7 @@ def main():
                 "-q",
                 args.build_dir + "/genhdr/qstrdefs.preprocessed.h",
             ]
+            + split_flags
             + args.mpy_tool_flags.split()
             + mpy_files
         )
@@ -256,13 +370,27 @@ def main():
         )
 
     # Generate output
+    output = b"//\n// Content for MICROPY_MODULE_FROZEN_STR\n//\n"
+    output += output_str
+    output += b"//\n// Content for MICROPY_MODULE_FROZEN_MPY\n//\n"
+    output += output_mpy
+    if args.split:
+        # Only write the output if it changed, so the build doesn't compile it
+        # again when just the module files changed.
+        try:
+            with open(args.output, "rb") as f:
+                unchanged = f.read() == output
+        except OSError:
+            unchanged = False
+        mkdir(split_dir + "/compiled")
+        with open(split_dir + "/compiled", "w") as f:
+            f.write(split_compiled)
+        if unchanged:
+            return
     print("GEN", args.output)
     mkdir(args.output)
     with open(args.output, "wb") as f:
-        f.write(b"//\n// Content for MICROPY_MODULE_FROZEN_STR\n//\n")
-        f.write(output_str)
-        f.write(b"//\n// Content for MICROPY_MODULE_FROZEN_MPY\n//\n")
-        f.write(output_mpy)
+        f.write(output)
 
 
 if __name__ == "__main__":
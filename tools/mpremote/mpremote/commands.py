@@ -1,11 +1,22 @@
+import calendar
+import fnmatch
+import glob
 import hashlib
+import json
 import os
+import re
+import shutil
+import socket
+import subprocess
 import sys
 import tempfile
+import threading
+import time
 
 import serial.tools.list_ports
 
-from .transport import TransportError, stdout_write_bytes
+from .transport import TransportError, TransportExecError, stdout_write_bytes
+from .transport_daemon import DaemonTransport, serve, socket_path
 from .transport_serial import SerialTransport
 
 
@@ -13,6 +24,18 @@ class CommandError(Exception):
     pass
 
 
+def _connect(state, dev):
+    # Use the daemon holding a connection to this device, if there is one.  It
+    # keeps the device in the raw REPL, so there is no need for a soft reset.
+    try:
+        state.transport = DaemonTransport(dev)
+        state._auto_soft_reset = False
+        return
+    except TransportError:
+        pass
+    state.transport = SerialTransport(dev, baudrate=115200)
+
+
 def do_connect(state, args=None):
     dev = args.device[0] if args else "auto"
     do_disconnect(state)
@@ -38,7 +61,7 @@ def do_connect(state, args=None):
             for p in sorted(serial.tools.list_ports.comports()):
                 if p.vid is not None and p.pid is not None:
                     try:
-                        state.transport = SerialTransport(p.device, baudrate=115200)
+                        _connect(state, p.device)
                         return
                     except TransportError as er:
                         if not er.args[0].startswith("failed to access"):
@@ -50,14 +73,14 @@ def do_connect(state, args=None):
             dev = None
             for p in serial.tools.list_ports.comports():
                 if p.serial_number == serial_number:
-                    state.transport = SerialTransport(p.device, baudrate=115200)
+                    _connect(state, p.device)
                     return
             raise TransportError("no device with serial number {}".format(serial_number))
         else:
             # Connect to the given device.
             if dev.startswith("port:"):
                 dev = dev[len("port:") :]
-            state.transport = SerialTransport(dev, baudrate=115200)
+            _connect(state, dev)
             return
     except TransportError as er:
         msg = er.args[0]
@@ -87,6 +110,86 @@ def do_disconnect(state, _args=None):
     state._auto_soft_reset = True
 
 
+def expand_device_set(dev):
+    # Return the devices given by a device set, either "list:<dev>,<dev>,..."
+    # or a glob pattern of ports, or None if dev is a single device.
+    if dev.startswith("list:"):
+        return [d for d in dev[len("list:") :].split(",") if d]
+    if any(c in dev for c in "*?["):
+        devices = set(glob.glob(dev))
+        devices.update(
+            p.device for p in serial.tools.list_ports.comports() if fnmatch.fnmatch(p.device, dev)
+        )
+        if not devices:
+            raise CommandError("connect: no devices match {}".format(dev))
+        return sorted(devices)
+    return None
+
+
+def _mpremote_env():
+    # Environment to run this mpremote as "python -m mpremote" in a subprocess.
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+        + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+    return env
+
+
+def run_on_devices(devices, args):
+    # Run the commands in args on all devices at once, each in its own mpremote
+    # process.  Output is prefixed by the device name, and a summary is printed
+    # at the end.  Returns the exit code.
+    if not args:
+        raise CommandError("connect: no commands to run on the devices")
+
+    env = _mpremote_env()
+    width = max(len(dev) for dev in devices)
+    lock = threading.Lock()
+    results = {}
+
+    def run(dev):
+        t0 = time.monotonic()
+        try:
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "mpremote", "connect", dev] + args,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                env=env,
+            )
+        except OSError as er:
+            results[dev] = (str(er), time.monotonic() - t0)
+            return
+        for line in proc.stdout:
+            line = line.decode(errors="replace").rstrip()
+            with lock:
+                print("{:{}} | {}".format(dev, width, line), flush=True)
+        proc.wait()
+        results[dev] = (
+            "ok" if proc.returncode == 0 else "exit {}".format(proc.returncode),
+            time.monotonic() - t0,
+        )
+
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=run, args=(dev,)) for dev in devices]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print()
+    print("{:{}}  {:10} {:>8}".format("device", width, "result", "time (s)"))
+    for dev in devices:
+        result, elapsed = results[dev]
+        print("{:{}}  {:10} {:8.2f}".format(dev, width, result, elapsed))
+    failed = sum(1 for result, _ in results.values() if result != "ok")
+    print(
+        "{} devices, {} failed, {:.2f}s total".format(len(devices), failed, time.monotonic() - t0)
+    )
+    return 1 if failed else 0
+
+
 def show_progress_bar(size, total_size, op="copying"):
     if not sys.stdout.isatty():
         return
@@ -127,7 +230,17 @@ def _remote_path_basename(a):
     return a.rsplit("/", 1)[-1]
 
 
-def do_filesystem_cp(state, src, dest, multiple, check_hash=False):
+def _local_file_chunks(path, offset=0, chunk_size=4096):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def do_filesystem_cp(state, src, dest, multiple, check_hash=False, resume=False):
     if dest.startswith(":"):
         dest_no_slash = dest.rstrip("/" + os.path.sep + (os.path.altsep or ""))
         dest_exists = state.transport.fs_exists(dest_no_slash[1:])
@@ -148,50 +261,84 @@ def do_filesystem_cp(state, src, dest, multiple, check_hash=False):
         if not dest_isdir:
             raise CommandError("cp: destination is not a directory")
 
-    # Download the contents of source.
-    try:
-        if src.startswith(":"):
-            data = state.transport.fs_readfile(src[1:], progress_callback=show_progress_bar)
-            filename = _remote_path_basename(src[1:])
-        else:
-            with open(src, "rb") as f:
-                data = f.read()
-            filename = os.path.basename(src)
-    except IsADirectoryError:
+    # Find the size of the source.  The data itself is streamed from source to
+    # destination a chunk at a time, so it's never all held in memory.
+    if src.startswith(":"):
+        src_isdir = state.transport.fs_isdir(src[1:])
+        src_size = src_isdir or state.transport.fs_stat(src[1:]).st_size
+        filename = _remote_path_basename(src[1:])
+    else:
+        src_isdir = os.path.isdir(src)
+        src_size = src_isdir or os.path.getsize(src)
+        filename = os.path.basename(src)
+    if src_isdir:
         raise CommandError("cp: -r not specified; omitting directory")
 
-    # Write back to dest.
+    # If the destination path is just the directory, then add the source filename.
     if dest.startswith(":"):
-        # If the destination path is just the directory, then add the source filename.
         if dest_isdir:
             dest = ":" + _remote_path_join(dest[1:], filename)
+    elif dest_isdir:
+        dest = os.path.join(dest, filename)
 
-        # Skip copy if the destination file is identical.
-        if check_hash:
-            try:
-                remote_hash = state.transport.fs_hashfile(dest[1:], "sha256")
-                source_hash = hashlib.sha256(data).digest()
-                # remote_hash will be None if the device doesn't support
-                # hashlib.sha256 (and therefore won't match).
-                if remote_hash == source_hash:
-                    print("Up to date:", dest[1:])
-                    return
-            except OSError:
-                pass
+    # Skip copy if the destination file is identical.
+    if check_hash and dest.startswith(":"):
+        try:
+            remote_hash = state.transport.fs_hashfile(dest[1:], "sha256")
+            if src.startswith(":"):
+                source_hash = state.transport.fs_hashfile(src[1:], "sha256")
+            else:
+                source_hash = hashlib.sha256()
+                for chunk in _local_file_chunks(src):
+                    source_hash.update(chunk)
+                source_hash = source_hash.digest()
+            # remote_hash will be None if the device doesn't support
+            # hashlib.sha256 (and therefore won't match).
+            if remote_hash == source_hash:
+                print("Up to date:", dest[1:])
+                return
+        except OSError:
+            pass
 
-        # Write to remote.
-        state.transport.fs_writefile(dest[1:], data, progress_callback=show_progress_bar)
+    # To resume an interrupted copy, keep the data that is already at the
+    # destination and continue from there.
+    offset = 0
+    if resume:
+        try:
+            if dest.startswith(":"):
+                offset = state.transport.fs_stat(dest[1:]).st_size
+            else:
+                offset = os.path.getsize(dest)
+        except OSError:
+            pass
+        if offset > src_size:
+            offset = 0
+
+    # Read from source.
+    if src.startswith(":"):
+        chunks = state.transport.fs_readfile_iter(
+            src[1:], offset=offset, progress_callback=show_progress_bar
+        )
+        if dest.startswith(":"):
+            # The device can't send and receive a file at the same time.
+            chunks = [b"".join(chunks)]
     else:
-        # If the destination path is just the directory, then add the source filename.
-        if dest_isdir:
-            dest = os.path.join(dest, filename)
+        chunks = _local_file_chunks(src, offset)
 
-        # Write to local file.
-        with open(dest, "wb") as f:
-            f.write(data)
+    # Write to dest.
+    if dest.startswith(":"):
+        state.transport.fs_writefile_iter(
+            dest[1:], chunks, src_size, offset=offset, progress_callback=show_progress_bar
+        )
+    else:
+        with open(dest, "r+b" if offset else "wb") as f:
+            f.seek(offset)
+            for chunk in chunks:
+                f.write(chunk)
+            f.truncate()
 
 
-def do_filesystem_recursive_cp(state, src, dest, multiple, check_hash):
+def do_filesystem_recursive_cp(state, src, dest, multiple, check_hash, resume=False):
     # Ignore trailing / on both src and dest. (Unix cp ignores them too)
     src = src.rstrip("/" + os.path.sep + (os.path.altsep if os.path.altsep else ""))
     dest = dest.rstrip("/" + os.path.sep + (os.path.altsep if os.path.altsep else ""))
@@ -264,24 +411,19 @@ def do_filesystem_recursive_cp(state, src, dest, multiple, check_hash):
 
     # If no directories were encountered then we must have just had a file.
     if not dirs:
-        return do_filesystem_cp(state, src, dest, multiple, check_hash)
+        return do_filesystem_cp(state, src, dest, multiple, check_hash, resume)
 
-    def _mkdir(a, *b):
-        try:
-            if a.startswith(":"):
-                state.transport.fs_mkdir(_remote_path_join(a[1:], *b))
-            else:
-                os.mkdir(os.path.join(a, *b))
-        except FileExistsError:
-            pass
-
-    # Create the destination if necessary.
-    if not dest_exists:
-        _mkdir(dest)
-
-    # Create all sub-directories relative to the destination.
-    for d in dirs:
-        _mkdir(dest, *d)
+    # Create the destination if necessary, and all sub-directories relative to
+    # it (for a remote destination, all in one go).
+    if dest.startswith(":"):
+        new_dirs = [] if dest_exists else [dest[1:]]
+        new_dirs += [_remote_path_join(dest[1:], *d) for d in dirs]
+        state.transport.fs_mkdirs(new_dirs, exist_ok=True)
+    else:
+        if not dest_exists:
+            os.makedirs(dest, exist_ok=True)
+        for d in dirs:
+            os.makedirs(os.path.join(dest, *d), exist_ok=True)
 
     # Copy all files, in sorted order to help it be deterministic.
     files.sort()
@@ -294,7 +436,24 @@ def do_filesystem_recursive_cp(state, src, dest, multiple, check_hash):
         else:
             dest_path_joined = os.path.join(dest, *dest_path_split)
 
-        do_filesystem_cp(state, src_path_joined, dest_path_joined, False, check_hash)
+        do_filesystem_cp(state, src_path_joined, dest_path_joined, False, check_hash, resume)
+
+
+def _print_long_listing(state, path):
+    # Device timestamps count from the device's epoch (1970 or 2000), and are
+    # shown as they are, without conversion from UTC.
+    state.transport.exec("import time")
+    epoch = calendar.timegm((state.transport.eval("time.gmtime(0)[0]"), 1, 1, 0, 0, 0))
+    for name, mode, size, mtime in state.transport.fs_statdir(path):
+        print(
+            "{} {:12} {} {}{}".format(
+                "d" if mode & 0x4000 else "-",
+                size,
+                time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(epoch + mtime)),
+                name,
+                "/" if mode & 0x4000 else "",
+            )
+        )
 
 
 def do_filesystem(state, args):
@@ -328,7 +487,23 @@ def do_filesystem(state, args):
     if command == "ls" and not paths:
         paths = [""]
 
+    if command == "cp" and args.compress:
+        state.transport.fs_compress = True
+        fs_bytes = list(state.transport.fs_bytes)
+        t0 = time.monotonic()
+
     try:
+        if command in ("rm", "mkdir"):
+            # Handle all paths at once, in a single exec on the device.
+            if verbose:
+                for path in paths:
+                    print("{} :{}".format(command, path))
+            if command == "rm":
+                state.transport.fs_remove(paths, args.recursive)
+            else:
+                state.transport.fs_mkdirs(paths, args.parents)
+            paths = []
+
         # Handle each path sequentially.
         for path in paths:
             if verbose:
@@ -339,6 +514,8 @@ def do_filesystem(state, args):
 
             if command == "cat":
                 state.transport.fs_printfile(path)
+            elif command == "ls" and args.long:
+                _print_long_listing(state, path)
             elif command == "ls":
                 for result in state.transport.fs_listdir(path):
                     print(
@@ -346,10 +523,6 @@ def do_filesystem(state, args):
                             result.st_size, result.name, "/" if result.st_mode & 0x4000 else ""
                         )
                     )
-            elif command == "mkdir":
-                state.transport.fs_mkdir(path)
-            elif command == "rm":
-                state.transport.fs_rmfile(path)
             elif command == "rmdir":
                 state.transport.fs_rmdir(path)
             elif command == "touch":
@@ -360,10 +533,22 @@ def do_filesystem(state, args):
             elif command == "cp":
                 if args.recursive:
                     do_filesystem_recursive_cp(
-                        state, path, cp_dest, len(paths) > 1, not args.force
+                        state, path, cp_dest, len(paths) > 1, not args.force, args.resume
                     )
                 else:
-                    do_filesystem_cp(state, path, cp_dest, len(paths) > 1, not args.force)
+                    do_filesystem_cp(
+                        state, path, cp_dest, len(paths) > 1, not args.force, args.resume
+                    )
+
+        if command == "cp" and args.compress and verbose:
+            # Report the bytes sent over the link, and the effective speed.
+            raw, wire = (b - a for a, b in zip(fs_bytes, state.transport.fs_bytes))
+            if wire:
+                print(
+                    "compressed {} bytes to {} ({:.2f}x), {:.1f} KB/s".format(
+                        raw, wire, raw / wire, raw / 1000 / (time.monotonic() - t0)
+                    )
+                )
     except FileNotFoundError as er:
         raise CommandError("{}: {}: No such file or directory.".format(command, er.args[0]))
     except IsADirectoryError as er:
@@ -372,6 +557,163 @@ def do_filesystem(state, args):
         raise CommandError("{}: {}: File exists.".format(command, er.args[0]))
     except TransportError as er:
         raise CommandError("Error with transport:\n{}".format(er.args[0]))
+    finally:
+        if command == "cp" and args.compress:
+            state.transport.fs_compress = False
+
+
+def _user_cache_dir(*subdirs):
+    # Return (creating if necessary) a directory in the user's cache dir.
+    path = os.getenv("XDG_CACHE_HOME")
+    if path is None:
+        path = os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(path, "mpremote", *subdirs)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _device_unique_id(state):
+    # Return a string identifying the connected device, for keying caches.
+    try:
+        state.transport.exec("import machine")
+        return state.transport.eval("machine.unique_id()").hex()
+    except TransportExecError:
+        # Fall back to the name of the port the device is on.
+        return "".join(c if c.isalnum() else "_" for c in state.transport.device_name)
+
+
+def do_sync(state, args):
+    state.ensure_raw_repl()
+    state.did_action()
+
+    src = args.src[0]
+    dest = args.dest or ":"
+    if not os.path.isdir(src):
+        raise CommandError("sync: {}: Not a directory.".format(src))
+    if not dest.startswith(":"):
+        raise CommandError("sync: destination must be a remote path")
+    dest = dest[1:]
+    if dest not in ("", "/"):
+        dest = dest.rstrip("/")
+
+    def remote_path(rel):
+        return _remote_path_join(dest, rel) if dest else rel
+
+    # Scan the local tree, hashing every file (cheap, compared to the device).
+    local_dirs = set()
+    local_files = {}
+    for dirpath, dirnames, filenames in os.walk(src):
+        rel_dir = os.path.relpath(dirpath, src).replace(os.path.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir + "/"
+        for name in dirnames:
+            local_dirs.add(rel_dir + name)
+        for name in filenames:
+            with open(os.path.join(dirpath, name), "rb") as f:
+                data = f.read()
+            local_files[rel_dir + name] = (len(data), hashlib.sha256(data).hexdigest())
+
+    try:
+        # Fetch the remote tree (path, is_dir, size, mtime) in one go.
+        if dest and not state.transport.fs_exists(dest):
+            remote = {}
+            if not args.dry_run:
+                state.transport.fs_mkdir(dest)
+        else:
+            remote = {r[0]: r[1:] for r in state.transport.fs_listtree(dest)}
+
+        # The cache remembers the hash of each remote file along with the size
+        # and mtime it had at the time, so unchanged files need not be hashed.
+        cache_file = os.path.join(_user_cache_dir("sync"), _device_unique_id(state) + ".json")
+        try:
+            with open(cache_file) as f:
+                cache_all = json.load(f)
+        except (OSError, ValueError):
+            cache_all = {}
+        cache = {} if args.force else cache_all.get(dest, {})
+
+        # Work out which files differ, hashing on the device only those files
+        # that have the right size but aren't in the cache.
+        to_copy = []
+        to_hash = []
+        remote_hashes = {}
+        for rel, (size, sha) in sorted(local_files.items()):
+            r = remote.get(rel)
+            if r is None or r[0] or r[1] != size:
+                to_copy.append(rel)
+            elif rel in cache and cache[rel][:2] == [size, r[2]]:
+                remote_hashes[rel] = cache[rel][2]
+            else:
+                to_hash.append(rel)
+        if to_hash:
+            digests = state.transport.fs_hashfiles([remote_path(rel) for rel in to_hash], "sha256")
+            for rel, digest in zip(to_hash, digests):
+                remote_hashes[rel] = digest.hex()
+        for rel, sha in remote_hashes.items():
+            if sha != local_files[rel][1]:
+                to_copy.append(rel)
+        to_copy.sort()
+
+        # Remove remote entries that don't exist locally (or changed type),
+        # files first and then directories, deepest first.
+        to_delete = []
+        if args.delete:
+            for rel, (is_dir, _, _) in remote.items():
+                if (rel not in local_dirs) if is_dir else (rel not in local_files):
+                    to_delete.append((is_dir, rel.count("/"), rel))
+            to_delete.sort(key=lambda x: (x[0], -x[1], x[2]))
+        for is_dir, _, rel in to_delete:
+            print("delete", ":" + remote_path(rel))
+        if to_delete and not args.dry_run:
+            # Removing the top-most entries recursively takes the rest with them.
+            deleted_dirs = [rel + "/" for is_dir, _, rel in to_delete if is_dir]
+            state.transport.fs_remove(
+                [
+                    remote_path(rel)
+                    for _, _, rel in to_delete
+                    if not any(rel.startswith(d) for d in deleted_dirs)
+                ],
+                recursive=True,
+            )
+            for _, _, rel in to_delete:
+                remote.pop(rel)
+
+        new_dirs = [rel for rel in sorted(local_dirs) if rel not in remote]
+        for rel in new_dirs:
+            print("mkdir", ":" + remote_path(rel))
+        if not args.dry_run:
+            state.transport.fs_mkdirs([remote_path(rel) for rel in new_dirs])
+
+        for rel in to_copy:
+            print("copy", os.path.join(src, rel), ":" + remote_path(rel))
+            if not args.dry_run:
+                with open(os.path.join(src, rel), "rb") as f:
+                    data = f.read()
+                state.transport.fs_writefile(
+                    remote_path(rel), data, progress_callback=show_progress_bar
+                )
+
+        if args.dry_run:
+            return
+
+        # Record the new state of the remote tree in the cache.
+        if to_copy or to_delete:
+            remote = {r[0]: r[1:] for r in state.transport.fs_listtree(dest)}
+        cache_all[dest] = {
+            rel: [size, remote[rel][2], sha] for rel, (size, sha) in local_files.items()
+        }
+        with open(cache_file + ".tmp", "w") as f:
+            json.dump(cache_all, f)
+        os.replace(cache_file + ".tmp", cache_file)
+    except FileNotFoundError as er:
+        raise CommandError("sync: {}: No such file or directory.".format(er.args[0]))
+    except TransportError as er:
+        raise CommandError("Error with transport:\n{}".format(er.args[0]))
+
+    print(
+        "sync: {} copied, {} deleted, {} up to date".format(
+            len(to_copy), len(to_delete), len(local_files) - len(to_copy)
+        )
+    )
 
 
 def do_edit(state, args):
@@ -434,13 +776,150 @@ def do_run(state, args):
     _do_execbuffer(state, buf, args.follow)
 
 
+# Names of the native architectures, indexed by the arch field of sys.implementation._mpy.
+_MPY_ARCH_NAMES = (
+    None,
+    "x86",
+    "x64",
+    "armv6",
+    "armv6m",
+    "armv7m",
+    "armv7em",
+    "armv7emsp",
+    "armv7emdp",
+    "xtensa",
+    "xtensawin",
+    "rv32imc",
+)
+
+
+def _mpy_cross_compiler(state):
+    # Return a function that compiles a .py file to a cached .mpy file, using
+    # an mpy-cross that produces .mpy files the device can load.
+    mpy_cross = os.getenv("MPY_CROSS") or shutil.which("mpy-cross")
+    if not mpy_cross:
+        raise CommandError("mount: mpy-cross not found (put it in PATH or set MPY_CROSS)")
+    try:
+        version = subprocess.run(
+            [mpy_cross, "--version"],
+            stdout=subprocess.PIPE,
+            check=True,
+            universal_newlines=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) as er:
+        raise CommandError("mount: cannot run {}: {}".format(mpy_cross, er))
+    m = re.search(r"mpy v(\d+)\.(\d+)", version)
+    if not m:
+        raise CommandError("mount: unknown mpy-cross version: {}".format(version))
+
+    state.transport.exec("import sys")
+    sys_mpy = state.transport.eval("getattr(sys.implementation, '_mpy', 0)")
+    if not sys_mpy & 0xFF:
+        raise CommandError("mount: device cannot load .mpy files")
+    if (int(m.group(1)), int(m.group(2))) != (sys_mpy & 0xFF, sys_mpy >> 8 & 3):
+        raise CommandError(
+            "mount: mpy-cross emits mpy v{}.{} but device needs v{}.{}".format(
+                m.group(1), m.group(2), sys_mpy & 0xFF, sys_mpy >> 8 & 3
+            )
+        )
+    args = []
+    arch = sys_mpy >> 10
+    if arch < len(_MPY_ARCH_NAMES) and _MPY_ARCH_NAMES[arch]:
+        args.append("-march=" + _MPY_ARCH_NAMES[arch])
+
+    cache_dir = _user_cache_dir("mpy")
+    failed = set()
+
+    def compile_mpy(path, name):
+        with open(path, "rb") as f:
+            source = f.read()
+        # The key covers everything that affects the output.
+        h = hashlib.sha256(source)
+        h.update(repr((version, args, name)).encode())
+        mpy = os.path.join(cache_dir, h.hexdigest() + ".mpy")
+        if mpy in failed:
+            return None
+        if not os.path.exists(mpy):
+            result = subprocess.run(
+                [mpy_cross, "-o", mpy + ".tmp", "-s", name] + args + [path],
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+            )
+            if result.returncode:
+                # Show the error on the console, the device will just not see the module.
+                sys.stdout.write(result.stderr.replace("\n", "\r\n"))
+                failed.add(mpy)
+                return None
+            os.replace(mpy + ".tmp", mpy)
+        return mpy
+
+    return compile_mpy
+
+
 def do_mount(state, args):
     state.ensure_raw_repl()
     path = args.path[0]
-    state.transport.mount_local(path, unsafe_links=args.unsafe_links)
+    mpy_compile = _mpy_cross_compiler(state) if args.mpy else None
+    try:
+        state.transport.mount_local(path, unsafe_links=args.unsafe_links, mpy_compile=mpy_compile)
+    except TransportError as er:
+        raise CommandError(er.args[0])
     print(f"Local directory {path} is mounted at /remote")
 
 
+def do_daemon(state, args):
+    state.did_action()
+    command = args.command[0]
+    state.ensure_connected()
+    transport = state.transport
+    running = isinstance(transport, DaemonTransport)
+
+    if command == "start":
+        if running:
+            print("Daemon already running for", transport.device_name)
+            return
+        if not hasattr(socket, "AF_UNIX"):
+            raise CommandError("daemon: not supported on this platform")
+        dev = transport.device_name
+        do_disconnect(state)
+        subprocess.Popen(
+            [sys.executable, "-m", "mpremote", "connect", dev, "daemon", "serve"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=_mpremote_env(),
+            start_new_session=True,
+        )
+        # Wait for the daemon to accept connections.
+        for _ in range(100):
+            try:
+                state.transport = DaemonTransport(dev)
+                print("Daemon started for", dev)
+                return
+            except TransportError:
+                time.sleep(0.1)
+        raise CommandError("daemon: could not start daemon for {}".format(dev))
+    elif command == "stop":
+        if not running:
+            raise CommandError("daemon: not running for {}".format(transport.device_name))
+        transport._call("__stop__")
+        do_disconnect(state)
+    elif command == "status":
+        print(
+            "Daemon {} for {}".format(
+                "running" if running else "not running", transport.device_name
+            )
+        )
+    elif command == "serve":
+        # Run the daemon itself, in this process.
+        if running:
+            raise CommandError("daemon: already running for {}".format(transport.device_name))
+        state.ensure_raw_repl()
+        serve(transport, socket_path(transport.device_name))
+    else:
+        raise CommandError(f"daemon: '{command}' is not a command")
+
+
 def do_umount(state, path):
     state.ensure_raw_repl()
     state.transport.umount_local()
@@ -478,3 +957,128 @@ def do_rtc(state, args):
         state.transport.exec("machine.RTC().datetime({})".format(timetuple))
     else:
         print(state.transport.eval("machine.RTC().datetime()"))
+
+
+def do_boottrace(state, args):
+    # Don't soft-reset by default, so the trace of the boot that brought up the
+    # currently-running firmware is reported (use `soft-reset boottrace` to
+    # trace a fresh soft boot).
+    state.ensure_raw_repl(soft_reset=False)
+    state.did_action()
+
+    try:
+        state.transport.exec("import esp32")
+        if args.enable is not None:
+            state.transport.exec("esp32.boottrace({})".format(args.enable))
+            print("Boot tracing", "enabled" if args.enable else "disabled")
+            return
+        entries = state.transport.eval("esp32.boottrace_read()")
+    except TransportExecError:
+        raise CommandError("boottrace: not supported by the device firmware")
+
+    if not entries:
+        print("No boot trace recorded")
+        return
+
+    t0 = entries[0][0]
+    print("{:>10} {:>10}  {:6}  {}".format("start_ms", "dur_ms", "kind", "name"))
+    for ticks_us, duration_us, kind, name in entries:
+        print(
+            "{:10.3f} {:>10}  {:6}  {}".format(
+                ((ticks_us - t0) & 0xFFFFFFFF) / 1000,
+                "-" if duration_us is None else "{:.3f}".format(duration_us / 1000),
+                kind,
+                name,
+            )
+        )
+
+
+def _link_type(device):
+    # Describe the kind of link used to reach the device.
+    if "://" in device:
+        return device.split("://", 1)[0]
+    for p in serial.tools.list_ports.comports():
+        if p.device == device and p.vid is not None:
+            return "usb {:04x}:{:04x} {}".format(p.vid, p.pid, p.product or "")
+    return "serial"
+
+
+def do_bench(state, args):
+    state.ensure_raw_repl()
+    state.did_action()
+
+    transport = state.transport
+    size = args.size * 1024
+    data = os.urandom(size)
+    path = "__mpremote_bench.bin"
+
+    # Text for the compressed mode, so that there is something to compress.
+    with open(__file__, "rb") as f:
+        text = f.read()
+    text = (text * (size // len(text) + 1))[:size]
+
+    # Each mode is (name, use binary transfers, window size, compress, data).
+    modes = [
+        ("text", False, 1, False, data),
+        ("binary", True, 1, False, data),
+        ("windowed", True, args.window, False, data),
+        ("deflate", True, args.window, True, text),
+    ]
+
+    print("link: {} ({})".format(transport.device_name, _link_type(transport.device_name)))
+    print("size: {} KiB".format(args.size))
+    saved = transport.use_binary_fs, transport.fs_binary_window, transport.fs_compress
+    try:
+        # Round-trip time of executing a trivial command.
+        t0 = time.monotonic()
+        for _ in range(args.count):
+            transport.exec("pass")
+        t1 = time.monotonic()
+        print("exec latency: {:.2f} ms".format((t1 - t0) * 1000 / args.count))
+
+        # Speed of sending source code, as a script made only of comments.
+        source = (b"#" * 63 + b"\n") * (size // 64)
+        t0 = time.monotonic()
+        transport.exec(source)
+        t1 = time.monotonic()
+        window = getattr(transport, "raw_paste_window", None) if transport.use_raw_paste else None
+        print(
+            "exec throughput: {:.1f} KB/s ({})".format(
+                len(source) / 1000 / (t1 - t0),
+                "raw-paste window {}".format(window) if window else "raw REPL",
+            )
+        )
+
+        print("{:12} {:>12} {:>12} {:>6}".format("mode", "write KB/s", "read KB/s", "ratio"))
+        for name, binary, window, compress, data in modes:
+            transport.use_binary_fs = binary
+            transport.fs_binary_window = window
+            transport.fs_compress = compress
+            fs_bytes = list(transport.fs_bytes)
+            t0 = time.monotonic()
+            transport.fs_writefile(path, data)
+            t1 = time.monotonic()
+            contents = transport.fs_readfile(path)
+            t2 = time.monotonic()
+            if contents != data:
+                raise CommandError("bench: data read back differs in {} mode".format(name))
+            if binary and not transport.use_binary_fs:
+                print("{:12} not supported by the device".format(name))
+                break
+            if window > 1:
+                name += " ({})".format(window)
+            # Ratio of the file bytes to the bytes sent over the link.
+            raw, wire = (b - a for a, b in zip(fs_bytes, transport.fs_bytes))
+            print(
+                "{:12} {:12.1f} {:12.1f} {:>6}".format(
+                    name,
+                    size / 1000 / (t1 - t0),
+                    size / 1000 / (t2 - t1),
+                    "{:.2f}".format(raw / wire) if wire else "-",
+                )
+            )
+        transport.fs_rmfile(path)
+    except TransportError as er:
+        raise CommandError("bench: {}".format(er))
+    finally:
+        transport.use_binary_fs, transport.fs_binary_window, transport.fs_compress = saved
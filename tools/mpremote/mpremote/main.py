@@ -9,12 +9,16 @@ MicroPython device over a serial connection.  Commands supported are:
     mpremote <device-shortcut>       -- connect to given device
     mpremote connect <device>        -- connect to given device
     mpremote disconnect              -- disconnect current device
+    mpremote daemon start            -- keep the device connected in a background daemon
     mpremote mount <local-dir>       -- mount local directory on device
     mpremote eval <string>           -- evaluate and print the string
     mpremote exec <string>           -- execute the string
     mpremote run <script>            -- run the given local script
     mpremote fs <command> <args...>  -- execute filesystem commands on the device
+    mpremote sync <local-dir> [<remote-dir>] -- update a device directory from a local one
     mpremote repl                    -- enter REPL
+    mpremote boottrace               -- show the device boot trace
+    mpremote bench                   -- measure link and file transfer speed
 """
 
 import argparse
@@ -24,7 +28,10 @@ from textwrap import dedent
 
 from .commands import (
     CommandError,
+    do_bench,
+    do_boottrace,
     do_connect,
+    do_daemon,
     do_disconnect,
     do_edit,
     do_filesystem,
@@ -36,9 +43,13 @@ from .commands import (
     do_resume,
     do_rtc,
     do_soft_reset,
+    do_sync,
+    expand_device_set,
+    run_on_devices,
 )
 from .mip import do_mip
 from .repl import do_repl
+from .transport_daemon import DaemonTransport
 
 _PROG = "mpremote"
 
@@ -98,7 +109,9 @@ def _bool_flag(cmd_parser, name, short_name, default, description):
 def argparse_connect():
     cmd_parser = argparse.ArgumentParser(description="connect to given device")
     cmd_parser.add_argument(
-        "device", nargs=1, help="Either list, auto, id:x, port:x, or any valid device name/path"
+        "device",
+        nargs=1,
+        help="Either list, auto, id:x, port:x, list:x,y,..., a glob pattern, or any valid device name/path",
     )
     return cmd_parser
 
@@ -124,6 +137,13 @@ def argparse_mount():
         False,
         "follow symbolic links pointing outside of local directory",
     )
+    _bool_flag(
+        cmd_parser,
+        "mpy",
+        "m",
+        False,
+        "compile .py files to .mpy on the host (with mpy-cross) when the device loads them",
+    )
     cmd_parser.add_argument("path", nargs=1, help="local path to mount")
     return cmd_parser
 
@@ -179,9 +199,46 @@ def argparse_rtc():
     return cmd_parser
 
 
+def argparse_boottrace():
+    cmd_parser = argparse.ArgumentParser(description="show or configure the device boot trace")
+    _bool_flag(
+        cmd_parser,
+        "enable",
+        "e",
+        None,
+        "enable (or disable with --no-enable) boot tracing instead of showing the trace",
+    )
+    return cmd_parser
+
+
+def argparse_bench():
+    cmd_parser = argparse.ArgumentParser(description="measure link and file transfer speed")
+    cmd_parser.add_argument(
+        "--size", type=int, default=32, help="size in KiB of the test file (default 32)"
+    )
+    cmd_parser.add_argument(
+        "--window",
+        type=int,
+        default=4,
+        help="number of chunks in flight for windowed transfers (default 4)",
+    )
+    cmd_parser.add_argument(
+        "--count", type=int, default=20, help="number of commands to time for exec latency"
+    )
+    return cmd_parser
+
+
 def argparse_filesystem():
     cmd_parser = argparse.ArgumentParser(description="execute filesystem commands on the device")
-    _bool_flag(cmd_parser, "recursive", "r", False, "recursive copy (for cp command only)")
+    _bool_flag(cmd_parser, "recursive", "r", False, "recursive copy or remove (for cp and rm)")
+    _bool_flag(
+        cmd_parser,
+        "parents",
+        "p",
+        False,
+        "make parent directories as needed (for mkdir command only)",
+    )
+    _bool_flag(cmd_parser, "long", "l", False, "show mode, size and time (for ls command only)")
     _bool_flag(
         cmd_parser,
         "force",
@@ -189,6 +246,20 @@ def argparse_filesystem():
         False,
         "force copy even if file is unchanged (for cp command only)",
     )
+    _bool_flag(
+        cmd_parser,
+        "resume",
+        "c",
+        False,
+        "continue an interrupted copy from the end of the destination (for cp command only)",
+    )
+    _bool_flag(
+        cmd_parser,
+        "compress",
+        "z",
+        False,
+        "compress data sent over the link, if the device has deflate (for cp command only)",
+    )
     _bool_flag(
         cmd_parser,
         "verbose",
@@ -205,6 +276,26 @@ def argparse_filesystem():
     return cmd_parser
 
 
+def argparse_sync():
+    cmd_parser = argparse.ArgumentParser(
+        description="copy changed files from a local directory to the device"
+    )
+    _bool_flag(
+        cmd_parser,
+        "delete",
+        "d",
+        True,
+        "delete remote files that don't exist locally (default)",
+    )
+    _bool_flag(cmd_parser, "force", "f", False, "ignore the cache and hash all remote files")
+    _bool_flag(cmd_parser, "dry-run", "n", False, "show what would be done without doing it")
+    cmd_parser.add_argument("src", nargs=1, help="local directory")
+    cmd_parser.add_argument(
+        "dest", nargs="?", help="remote directory (defaults to the current directory)"
+    )
+    return cmd_parser
+
+
 def argparse_mip():
     cmd_parser = argparse.ArgumentParser(
         description="install packages from micropython-lib or third-party sources"
@@ -228,6 +319,16 @@ def argparse_mip():
     return cmd_parser
 
 
+def argparse_daemon():
+    cmd_parser = argparse.ArgumentParser(
+        description="keep the device connected in a background daemon"
+    )
+    cmd_parser.add_argument(
+        "command", nargs=1, choices=("start", "stop", "status", "serve"), help="daemon command"
+    )
+    return cmd_parser
+
+
 def argparse_none(description):
     return lambda: argparse.ArgumentParser(description=description)
 
@@ -246,6 +347,10 @@ _COMMANDS = {
         do_disconnect,
         argparse_none("disconnect current device"),
     ),
+    "daemon": (
+        do_daemon,
+        argparse_daemon,
+    ),
     "edit": (
         do_edit,
         argparse_edit,
@@ -290,10 +395,22 @@ _COMMANDS = {
         do_filesystem,
         argparse_filesystem,
     ),
+    "sync": (
+        do_sync,
+        argparse_sync,
+    ),
     "mip": (
         do_mip,
         argparse_mip,
     ),
+    "boottrace": (
+        do_boottrace,
+        argparse_boottrace,
+    ),
+    "bench": (
+        do_bench,
+        argparse_bench,
+    ),
     "help": (
         do_help,
         argparse_none("print help and exit"),
@@ -482,6 +599,8 @@ class State:
 
     def ensure_friendly_repl(self):
         self.ensure_connected()
+        if isinstance(self.transport, DaemonTransport):
+            raise CommandError("the REPL is not available through the daemon")
         if self.transport.in_raw_repl:
             self.transport.exit_raw_repl()
 
@@ -522,7 +641,11 @@ def main():
                 extra_args = []
 
             # Special case: "fs ls" allowed have no path specified.
-            if cmd == "fs" and len(command_args) == 1 and command_args[0] == "ls":
+            if (
+                cmd == "fs"
+                and command_args[:1] == ["ls"]
+                and all(a.startswith("-") for a in command_args[1:])
+            ):
                 command_args.append("")
 
             # Use the command-specific argument parser.
@@ -534,6 +657,13 @@ def main():
             )
             args = cmd_parser.parse_args(command_args)
 
+            # Connecting to a set of devices runs the rest of the commands on
+            # each of them, instead of continuing here.
+            if cmd == "connect":
+                devices = expand_device_set(args.device[0])
+                if devices is not None:
+                    return run_on_devices(devices, args.next_command + extra_args)
+
             # Execute command.
             handler_func(state, args)
 
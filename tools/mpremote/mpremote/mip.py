@@ -2,6 +2,8 @@
 # Ported from micropython-lib/micropython/mip/mip.py.
 # MIT license; Copyright (c) 2022 Jim Mussared
 
+import concurrent.futures
+import hashlib
 import urllib.error
 import urllib.request
 import json
@@ -9,11 +11,14 @@ import tempfile
 import os
 import os.path
 
-from .commands import CommandError, show_progress_bar
+from .commands import CommandError, _user_cache_dir, show_progress_bar
 
 
 _PACKAGE_INDEX = "https://micropython.org/pi/v2"
 
+# Number of files to download at the same time.
+_DOWNLOAD_THREADS = 8
+
 allowed_mip_url_prefixes = ("http://", "https://", "github:", "gitlab:")
 
 
@@ -64,11 +69,11 @@ def _rewrite_url(url, branch=None):
     return url
 
 
-def _download_file(transport, url, dest):
+def _fetch_file(url):
     if url.startswith(allowed_mip_url_prefixes):
         try:
             with urllib.request.urlopen(url) as src:
-                data = src.read()
+                return src.read()
         except urllib.error.HTTPError as e:
             if e.status == 404:
                 raise CommandError(f"File not found: {url}")
@@ -81,28 +86,87 @@ def _download_file(transport, url, dest):
             raise CommandError(f'Use "/" instead of "\\" in file URLs: {url!r}\n')
         try:
             with open(url, "rb") as f:
-                data = f.read()
+                return f.read()
         except OSError as e:
             raise CommandError(f"{e.strerror} opening {url}")
 
-    print("Installing:", dest)
-    _ensure_path_exists(transport, dest)
-    transport.fs_writefile(dest, data, progress_callback=show_progress_bar)
+
+# Files from the index are named by (a prefix of) the SHA256 of their
+# contents, so they can be cached locally forever using the same layout.
+def _fetch_file_cached(url, short_hash):
+    if not short_hash:
+        return _fetch_file(url)
+    cache_path = os.path.join(_user_cache_dir("mip", "file", short_hash[:2]), short_hash)
+    try:
+        with open(cache_path, "rb") as f:
+            return f.read()
+    except OSError:
+        pass
+    data = _fetch_file(url)
+    if not hashlib.sha256(data).hexdigest().startswith(short_hash):
+        raise CommandError(f"Hash mismatch: {url}")
+    with open(cache_path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(cache_path + ".tmp", cache_path)
+    return data
+
+
+# Package JSON files can change (e.g. the one for "latest"), so they are cached
+# along with their ETag and revalidated each time they are used.  The cached
+# copy is also used if the index can't be reached.
+def _fetch_json_cached(url, name):
+    cache_path = os.path.join(
+        _user_cache_dir("mip", "json"), hashlib.sha256(url.encode()).hexdigest()
+    )
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = None
+    request = urllib.request.Request(url)
+    if cached and cached["etag"]:
+        request.add_header("If-None-Match", cached["etag"])
+    try:
+        with urllib.request.urlopen(request) as response:
+            package_json = json.load(response)
+            etag = response.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        if e.status == 304 and cached:
+            return cached["json"]
+        elif e.status == 404:
+            raise CommandError(f"Package not found: {name}")
+        else:
+            raise CommandError(f"Error {e.status} requesting {name}")
+    except urllib.error.URLError as e:
+        if cached:
+            print(f"Using cached {name} ({e.reason})")
+            return cached["json"]
+        raise CommandError(f"{e.reason} requesting {name}")
+    with open(cache_path + ".tmp", "w") as f:
+        json.dump({"etag": etag, "json": package_json}, f)
+    os.replace(cache_path + ".tmp", cache_path)
+    return package_json
+
+
+def _install_files(transport, files):
+    # Download all files in parallel (or get them from the cache), writing
+    # each one to the device as soon as it and all before it are available.
+    with concurrent.futures.ThreadPoolExecutor(_DOWNLOAD_THREADS) as pool:
+        data = [
+            pool.submit(_fetch_file_cached, url, short_hash) for url, short_hash in files.values()
+        ]
+        for dest, future in zip(files, data):
+            print("Installing:", dest)
+            _ensure_path_exists(transport, dest)
+            transport.fs_writefile(dest, future.result(), progress_callback=show_progress_bar)
 
 
-def _install_json(transport, package_json_url, index, target, version, mpy):
+def _resolve_json(transport, package_json_url, index, target, version, mpy, files, seen):
     base_url = ""
     if package_json_url.startswith(allowed_mip_url_prefixes):
-        try:
-            with urllib.request.urlopen(_rewrite_url(package_json_url, version)) as response:
-                package_json = json.load(response)
-        except urllib.error.HTTPError as e:
-            if e.status == 404:
-                raise CommandError(f"Package not found: {package_json_url}")
-            else:
-                raise CommandError(f"Error {e.status} requesting {package_json_url}")
-        except urllib.error.URLError as e:
-            raise CommandError(f"{e.reason} requesting {package_json_url}")
+        package_json = _fetch_json_cached(
+            _rewrite_url(package_json_url, version), package_json_url
+        )
         base_url = package_json_url.rpartition("/")[0]
     elif package_json_url.endswith(".json"):
         try:
@@ -116,23 +180,28 @@ def _install_json(transport, package_json_url, index, target, version, mpy):
     for target_path, short_hash in package_json.get("hashes", ()):
         fs_target_path = target + "/" + target_path
         file_url = f"{index}/file/{short_hash[:2]}/{short_hash}"
-        _download_file(transport, file_url, fs_target_path)
+        files[fs_target_path] = (file_url, short_hash)
     for target_path, url in package_json.get("urls", ()):
         fs_target_path = target + "/" + target_path
         if base_url and not url.startswith(allowed_mip_url_prefixes):
             url = f"{base_url}/{url}"  # Relative URLs
-        _download_file(transport, _rewrite_url(url, version), fs_target_path)
+        files[fs_target_path] = (_rewrite_url(url, version), None)
     for dep, dep_version in package_json.get("deps", ()):
-        _install_package(transport, dep, index, target, dep_version, mpy)
+        _resolve_package(transport, dep, index, target, dep_version, mpy, files, seen)
 
 
-def _install_package(transport, package, index, target, version, mpy):
+# Add the files that make up the package (and its dependencies) to files, a
+# dict of {device path: (url, short hash or None)}.
+def _resolve_package(transport, package, index, target, version, mpy, files, seen):
+    # Each package only needs to be resolved once, even if many depend on it.
+    if (package, version or "latest") in seen:
+        return
+    seen.add((package, version or "latest"))
+
     if package.startswith(allowed_mip_url_prefixes):
         if package.endswith(".py") or package.endswith(".mpy"):
             print(f"Downloading {package} to {target}")
-            _download_file(
-                transport, _rewrite_url(package, version), target + "/" + package.rsplit("/")[-1]
-            )
+            files[target + "/" + package.rsplit("/")[-1]] = (_rewrite_url(package, version), None)
             return
         else:
             if not package.endswith(".json"):
@@ -154,7 +223,14 @@ def _install_package(transport, package, index, target, version, mpy):
 
         package = f"{index}/package/{mpy_version}/{package}/{version}.json"
 
-    _install_json(transport, package, index, target, version, mpy)
+    _resolve_json(transport, package, index, target, version, mpy, files, seen)
+
+
+def _install_package(transport, package, index, target, version, mpy):
+    # Resolve the whole dependency graph first, then fetch and install the files.
+    files = {}
+    _resolve_package(transport, package, index, target, version, mpy, files, set())
+    _install_files(transport, files)
 
 
 def do_mip(state, args):
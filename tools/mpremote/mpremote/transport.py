@@ -121,40 +121,52 @@ class Transport:
             raise _convert_filesystem_error(e, src) from None
 
     def fs_readfile(self, src, chunk_size=256, progress_callback=None):
+        return bytearray(b"".join(self.fs_readfile_iter(src, chunk_size, 0, progress_callback)))
+
+    def fs_readfile_iter(self, src, chunk_size=256, offset=0, progress_callback=None):
+        # Generate the contents of the file in chunks, starting at offset (e.g.
+        # to resume an interrupted transfer).
         if progress_callback:
             src_size = self.fs_stat(src).st_size
 
-        contents = bytearray()
-
         try:
-            self.exec("f=open('%s','rb')\nr=f.read" % src)
+            self.exec("f=open('%s','rb')\nf.seek(%u)\nr=f.read" % (src, offset))
             while True:
                 chunk = self.eval("r({})".format(chunk_size))
                 if not chunk:
                     break
-                contents.extend(chunk)
+                offset += len(chunk)
                 if progress_callback:
-                    progress_callback(len(contents), src_size)
+                    progress_callback(offset, src_size)
+                yield chunk
             self.exec("f.close()")
         except TransportExecError as e:
             raise _convert_filesystem_error(e, src) from None
 
-        return contents
-
     def fs_writefile(self, dest, data, chunk_size=256, progress_callback=None):
-        if progress_callback:
-            src_size = len(data)
-            written = 0
+        chunks = (data[i : i + chunk_size] for i in range(0, len(data), chunk_size))
+        self.fs_writefile_iter(dest, chunks, len(data), chunk_size, 0, progress_callback)
+
+    def fs_writefile_iter(
+        self, dest, chunks, size, chunk_size=256, offset=0, progress_callback=None
+    ):
+        # Write the chunks to the file, which has a total size of size bytes.  A
+        # non-zero offset keeps the first offset bytes of an existing file (e.g.
+        # to resume an interrupted transfer).
+        written = offset
 
         try:
-            self.exec("f=open('%s','wb')\nw=f.write" % dest)
-            while data:
-                chunk = data[:chunk_size]
-                self.exec("w(" + repr(chunk) + ")")
-                data = data[len(chunk) :]
-                if progress_callback:
+            if offset:
+                self.exec("f=open('%s','r+b')\nf.seek(%u)\nw=f.write" % (dest, offset))
+            else:
+                self.exec("f=open('%s','wb')\nw=f.write" % dest)
+            for data in chunks:
+                for i in range(0, len(data), chunk_size):
+                    chunk = data[i : i + chunk_size]
+                    self.exec("w(" + repr(bytes(chunk)) + ")")
                     written += len(chunk)
-                    progress_callback(written, src_size)
+                    if progress_callback:
+                        progress_callback(written, size)
             self.exec("f.close()")
         except TransportExecError as e:
             raise _convert_filesystem_error(e, dest) from None
@@ -199,3 +211,151 @@ class Transport:
             return self.eval("h.digest()")
         except TransportExecError as e:
             raise _convert_filesystem_error(e, path) from None
+
+    def fs_listtree(self, src=""):
+        # Return (path, is_dir, size, mtime) for everything below src, with
+        # paths relative to src, using a single exec.
+        buf = bytearray()
+
+        def repr_consumer(b):
+            buf.extend(b.replace(b"\x04", b""))
+
+        cmd = (
+            "import os\n"
+            "def t(d,p):\n"
+            " for e in os.ilistdir(d or '.'):\n"
+            "  f=d.rstrip('/')+'/'+e[0] if d else e[0]\n"
+            "  if e[1]&0x4000:\n"
+            "   print(repr((p+e[0],1,0,0)),end=',')\n"
+            "   t(f,p+e[0]+'/')\n"
+            "  else:\n"
+            "   s=os.stat(f)\n"
+            "   print(repr((p+e[0],0,s[6],s[8])),end=',')\n"
+            "t('%s','')\n"
+            "del t" % src
+        )
+        try:
+            buf.extend(b"[")
+            self.exec(cmd, data_consumer=repr_consumer)
+            buf.extend(b"]")
+        except TransportExecError as e:
+            raise _convert_filesystem_error(e, src) from None
+
+        return ast.literal_eval(buf.decode())
+
+    def fs_hashfiles(self, paths, algo, chunk_size=256, batch_size=32):
+        # Hash many files, using one exec per batch of files.
+        try:
+            self.exec("import hashlib\nhashlib.{algo}".format(algo=algo))
+        except TransportExecError:
+            return [self.fs_hashfile(path, algo, chunk_size) for path in paths]
+
+        digests = []
+        for i in range(0, len(paths), batch_size):
+            buf = bytearray()
+
+            def repr_consumer(b):
+                buf.extend(b.replace(b"\x04", b""))
+
+            batch = paths[i : i + batch_size]
+            cmd = (
+                "b=memoryview(bytearray({chunk_size}))\n"
+                "for p in {batch!r}:\n"
+                " h=hashlib.{algo}()\n"
+                " with open(p,'rb') as f:\n"
+                "  while True:\n"
+                "   n=f.readinto(b)\n"
+                "   if n==0:break\n"
+                "   h.update(b[:n])\n"
+                " print(repr(h.digest()),end=',')\n"
+                "del b".format(chunk_size=chunk_size, batch=batch, algo=algo)
+            )
+            try:
+                buf.extend(b"[")
+                self.exec(cmd, data_consumer=repr_consumer)
+                buf.extend(b"]")
+            except TransportExecError as e:
+                raise _convert_filesystem_error(e, ", ".join(batch)) from None
+            digests.extend(ast.literal_eval(buf.decode()))
+        return digests
+
+    def _fs_batch(self, cmd, paths):
+        # Run cmd, which prints a "." after handling each of paths, and on
+        # error report the path that it failed on.
+        done = [0]
+
+        def count_consumer(b):
+            done[0] += b.count(b".")
+
+        try:
+            self.exec(cmd, data_consumer=count_consumer)
+        except TransportExecError as e:
+            raise _convert_filesystem_error(e, paths[min(done[0], len(paths) - 1)]) from None
+
+    def fs_remove(self, paths, recursive=False):
+        # Remove many files (and, if recursive, directories with everything in
+        # them) using a single exec.
+        if not paths:
+            return
+        cmd = (
+            "import os\n"
+            "def r(p,d):\n"
+            " if d:\n"
+            "  if not %r:raise OSError(21)\n"
+            "  for e in list(os.ilistdir(p)):\n"
+            "   r(p.rstrip('/')+'/'+e[0],e[1]&0x4000)\n"
+            "  os.rmdir(p)\n"
+            " else:\n"
+            "  os.remove(p)\n"
+            "for p in %r:\n"
+            " r(p,os.stat(p)[0]&0x4000)\n"
+            " print(end='.')\n"
+            "del r" % (recursive, list(paths))
+        )
+        self._fs_batch(cmd, paths)
+
+    def fs_mkdirs(self, paths, parents=False, exist_ok=False):
+        # Create many directories (and, if parents, any missing directories
+        # above them) using a single exec.  Directories that already exist are
+        # ignored if parents or exist_ok is set.  When creating parents, "."
+        # components are skipped because VfsFat can neither mkdir nor stat ".".
+        if not paths:
+            return
+        cmd = (
+            "import os\n"
+            "for p in %r:\n"
+            " q=''\n"
+            " for c in ([c for c in p.split('/') if c!='.'] if %r else [p]):\n"
+            "  q+=c\n"
+            "  if c:\n"
+            "   try:os.mkdir(q)\n"
+            "   except OSError as e:\n"
+            "    if e.errno!=17 or not %r or not os.stat(q)[0]&0x4000:raise\n"
+            "  q+='/'\n"
+            " print(end='.')" % (list(paths), parents, parents or exist_ok)
+        )
+        self._fs_batch(cmd, paths)
+
+    def fs_statdir(self, src=""):
+        # Return (name, mode, size, mtime) for each entry in src, using a
+        # single exec.
+        buf = bytearray()
+
+        def repr_consumer(b):
+            buf.extend(b.replace(b"\x04", b""))
+
+        cmd = (
+            "import os\n"
+            "d='%s'\n"
+            "for e in os.ilistdir(d or '.'):\n"
+            " s=os.stat(d.rstrip('/')+'/'+e[0] if d else e[0])\n"
+            " print(repr((e[0],s[0],s[6],s[8])),end=',')" % src
+        )
+        try:
+            buf.extend(b"[")
+            self.exec(cmd, data_consumer=repr_consumer)
+            buf.extend(b"]")
+        except TransportExecError as e:
+            raise _convert_filesystem_error(e, src) from None
+
+        return ast.literal_eval(buf.decode())
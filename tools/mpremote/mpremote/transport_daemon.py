@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+#
+# This file is part of the MicroPython project, http://micropython.org/
+#
+# The MIT License (MIT)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# A daemon holds the connection to a device (already in the raw REPL) and serves
+# mpremote processes over a Unix socket, so they don't have to open the port and
+# soft reset the device each time.  DaemonTransport forwards each method call on
+# the transport to the daemon, which calls it on its SerialTransport.
+#
+# Messages are Python literals, one per line.  A call is (name, args, kwargs,
+# callbacks), where callbacks lists the args that are functions on the client.
+# The daemon replies with any number of ("call", callback, args), followed by
+# ("return", value), ("stat", tuple), ("listdir", list of tuples) or ("raise",
+# exception name, args).
+
+import ast, builtins, os, re, socket, tempfile, types
+from .transport import TransportError, TransportExecError, listdir_result, stdout_write_bytes
+
+_EXCEPTIONS = {"TransportError": TransportError, "TransportExecError": TransportExecError}
+
+
+def socket_path(device):
+    # Sockets are kept in a directory that only the current user can access,
+    # which is created by serve() when a daemon is started.
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        path = os.path.join(os.environ["XDG_RUNTIME_DIR"], "mpremote")
+    else:
+        path = os.path.join(tempfile.gettempdir(), "mpremote-{}".format(os.getuid()))
+    return os.path.join(path, re.sub(r"[^A-Za-z0-9_.-]", "_", device) + ".sock")
+
+
+def _send(f, msg):
+    f.write(repr(msg).encode() + b"\n")
+    f.flush()
+
+
+def _recv(f):
+    line = f.readline()
+    if not line:
+        raise TransportError("connection to daemon closed")
+    return ast.literal_eval(line.decode())
+
+
+class DaemonTransport:
+    # State kept by this process, everything else is forwarded to the daemon.
+    _LOCAL = ("device_name", "in_raw_repl", "mounted", "_sock", "_file", "_methods")
+
+    def __init__(self, device):
+        if not hasattr(socket, "AF_UNIX"):
+            raise TransportError("the daemon is not supported on this platform")
+        path = socket_path(device)
+        if not os.path.exists(path):
+            raise TransportError("no daemon for " + device)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.connect(path)
+        except OSError:
+            self._sock.close()
+            raise TransportError("no daemon for " + device)
+        self._file = self._sock.makefile("rwb")
+        self._methods = {}
+        self.device_name = device
+        self.in_raw_repl = False
+        self.mounted = False
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def _call(self, name, args=(), kwargs={}):
+        args = list(args)
+        kwargs = dict(kwargs)
+        callbacks = {}
+        for key, value in list(enumerate(args)) + list(kwargs.items()):
+            if callable(value):
+                callbacks[key] = value
+                (args if isinstance(key, int) else kwargs)[key] = None
+        _send(self._file, (name, tuple(args), kwargs, tuple(callbacks)))
+        while True:
+            reply = _recv(self._file)
+            if reply[0] == "call":
+                callbacks[reply[1]](*reply[2])
+            elif reply[0] == "return":
+                return reply[1]
+            elif reply[0] == "stat":
+                return os.stat_result(reply[1])
+            elif reply[0] == "listdir":
+                return [listdir_result(*f) for f in reply[1]]
+            else:
+                exc = _EXCEPTIONS.get(reply[1]) or getattr(builtins, reply[1], None)
+                if not (isinstance(exc, type) and issubclass(exc, Exception)):
+                    exc = TransportError
+                raise exc(*reply[2])
+
+    def enter_raw_repl(self, soft_reset=True, timeout_overall=10):
+        self._call("enter_raw_repl", (soft_reset, timeout_overall))
+        self.in_raw_repl = True
+
+    def exit_raw_repl(self):
+        # The daemon keeps the device in the raw REPL for the next client.
+        self.in_raw_repl = False
+
+    def fs_printfile(self, src, chunk_size=256):
+        # Print here, rather than to the daemon's stdout.
+        stdout_write_bytes(self._call("fs_readfile", (src, chunk_size)))
+
+    # Generators can't be sent to or from the daemon, so streaming transfers
+    # through it are done in one piece.
+
+    def fs_readfile_iter(self, src, chunk_size=256, offset=0, progress_callback=None):
+        yield self._call("fs_readfile_iter", (src, chunk_size, offset, progress_callback))
+
+    def fs_writefile_iter(
+        self, dest, chunks, size, chunk_size=256, offset=0, progress_callback=None
+    ):
+        data = b"".join(chunks)
+        self._call(
+            "fs_writefile_iter", (dest, [data], size, chunk_size, offset, progress_callback)
+        )
+
+    def mount_local(self, *args, **kwargs):
+        raise TransportError("mount is not supported through the daemon")
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name in self._LOCAL:
+            raise AttributeError(name)
+        if name not in self._methods:
+            kind, value = self._call("__getattr__", (name,))
+            if kind == "value":
+                return value
+            self._methods[name] = lambda *args, **kwargs: self._call(name, args, kwargs)
+        return self._methods[name]
+
+    def __setattr__(self, name, value):
+        if name in self._LOCAL:
+            object.__setattr__(self, name, value)
+        else:
+            self._call("__setattr__", (name, value))
+
+
+def _encode(value):
+    # Only literals can be sent, so send a bytearray as bytes.
+    return bytes(value) if isinstance(value, bytearray) else value
+
+
+def _serve_client(transport, f):
+    while True:
+        try:
+            name, args, kwargs, callbacks = _recv(f)
+        except (OSError, TransportError):
+            return True
+        if name == "__stop__":
+            _send(f, ("return", None))
+            return False
+
+        def callback(key):
+            return lambda *args: _send(f, ("call", key, tuple(map(_encode, args))))
+
+        args = list(args)
+        for key in callbacks:
+            if isinstance(key, int):
+                args[key] = callback(key)
+            else:
+                kwargs[key] = callback(key)
+
+        try:
+            attr = args[0] if name in ("__getattr__", "__setattr__") else name
+            if attr.startswith("_") or attr in ("close", "mount_local", "serial"):
+                raise TransportError("'{}' is not supported through the daemon".format(attr))
+            if name == "__getattr__":
+                value = getattr(transport, attr)
+                result = ("method", None) if callable(value) else ("value", value)
+            elif name == "__setattr__":
+                result = setattr(transport, *args)
+            elif name == "enter_raw_repl":
+                # Only enter (and soft reset) if needed, this is the common case.
+                result = None
+                if args[0] or not transport.in_raw_repl:
+                    result = transport.enter_raw_repl(*args)
+            else:
+                result = getattr(transport, name)(*args, **kwargs)
+                if isinstance(result, types.GeneratorType):
+                    result = b"".join(result)
+        except (OSError, TransportError) as er:
+            if isinstance(er, (BrokenPipeError, ConnectionResetError)):
+                # The client went away in the middle of the call, get the device
+                # back to the raw REPL prompt for the next one.
+                transport.in_raw_repl = False
+                return True
+            if isinstance(er, TransportError) and not isinstance(er, TransportExecError):
+                # The device may be out of sync with the raw REPL, so the next
+                # client will enter it again.
+                transport.in_raw_repl = False
+            if isinstance(er, OSError) and er.filename is not None:
+                er.args = (er.errno, er.strerror, er.filename)
+            name = type(er).__name__
+            if name not in _EXCEPTIONS and not isinstance(er, OSError):
+                name = "TransportError"
+            msg = ("raise", name, er.args)
+        else:
+            if isinstance(result, os.stat_result):
+                msg = ("stat", tuple(result))
+            elif name == "fs_listdir":
+                msg = ("listdir", [tuple(f) for f in result])
+            else:
+                msg = ("return", _encode(result))
+        try:
+            _send(f, msg)
+        except OSError:
+            return True
+
+
+def serve(transport, path):
+    # Serve clients one at a time, until one of them asks the daemon to stop.
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, 0o600)
+    sock.listen(8)
+    try:
+        running = True
+        while running:
+            conn, _ = sock.accept()
+            f = conn.makefile("rwb")
+            try:
+                running = _serve_client(transport, f)
+                f.close()
+            except OSError:
+                # The client went away with a reply still buffered.
+                pass
+            conn.close()
+    finally:
+        sock.close()
+        os.unlink(path)
@@ -35,16 +35,24 @@
 # Once the API is stabilised, the idea is that mpremote can be used both
 # as a command line tool and a library for interacting with devices.
 
-import ast, io, os, re, struct, sys, time
-from errno import EPERM
+import ast, collections, io, os, re, struct, sys, time, zlib
+from errno import ENOENT, EPERM
 from .console import VT_ENABLED
-from .transport import TransportError, TransportExecError, Transport
+from .transport import TransportError, TransportExecError, Transport, _convert_filesystem_error
 
 
 class SerialTransport(Transport):
     def __init__(self, device, baudrate=115200, wait=0, exclusive=True, timeout=None):
         self.in_raw_repl = False
         self.use_raw_paste = True
+        self.raw_paste_window = None
+        self.use_binary_fs = True
+        self.fs_binary_chunk_size = 4096
+        self.fs_binary_window = 4
+        self.fs_binary_retries = 10
+        self.fs_compress = False
+        self.fs_bytes = [0, 0]
+        self._fs_binary_loaded = False
         self.device_name = device
         self.mounted = False
 
@@ -159,6 +167,7 @@ class SerialTransport(Transport):
                 raise TransportError("could not enter raw repl")
 
             self.serial.write(b"\x04")  # ctrl-D: soft reset
+            self._fs_binary_loaded = False
 
             # Waiting for "soft reboot" independently to "raw REPL" (done below)
             # allows boot.py to print, which will show up after "soft reboot"
@@ -200,6 +209,7 @@ class SerialTransport(Transport):
         data = self.serial.read(2)
         window_size = struct.unpack("<H", data)[0]
         window_remain = window_size
+        self.raw_paste_window = window_size
 
         # Write out the command_bytes data.
         i = 0
@@ -296,13 +306,15 @@ class SerialTransport(Transport):
             pyfile = f.read()
         return self.exec(pyfile)
 
-    def mount_local(self, path, unsafe_links=False):
+    def mount_local(self, path, unsafe_links=False, mpy_compile=None):
         fout = self.serial
         if not self.eval('"RemoteFS" in globals()'):
             self.exec(fs_hook_code)
         self.exec("__mount()")
         self.mounted = True
-        self.cmd = PyboardCommand(self.serial, fout, path, unsafe_links=unsafe_links)
+        self.cmd = PyboardCommand(
+            self.serial, fout, path, unsafe_links=unsafe_links, mpy_compile=mpy_compile
+        )
         self.serial = SerialIntercept(self.serial, self.cmd)
 
     def write_ctrl_d(self, out_callback):
@@ -396,11 +408,294 @@ class SerialTransport(Transport):
             self.mounted = False
             self.serial = self.serial.orig_serial
 
+    def fs_readfile_iter(self, src, chunk_size=256, offset=0, progress_callback=None):
+        try:
+            chunks = self._fs_readfile_binary(src, offset, progress_callback)
+            if chunks is None:
+                chunks = super().fs_readfile_iter(src, chunk_size, offset, progress_callback)
+            yield from chunks
+        except TransportExecError as e:
+            raise _convert_filesystem_error(e, src) from None
+
+    def fs_writefile_iter(
+        self, dest, chunks, size, chunk_size=256, offset=0, progress_callback=None
+    ):
+        try:
+            if self._fs_writefile_binary(dest, chunks, size, offset, progress_callback):
+                return
+        except TransportExecError as e:
+            raise _convert_filesystem_error(e, dest) from None
+        super().fs_writefile_iter(dest, chunks, size, chunk_size, offset, progress_callback)
+
+    # Binary file transfers.  These run a helper on the device (fs_binary_code)
+    # which reads or writes raw chunks directly on stdin/stdout, avoiding the
+    # cost of compiling each chunk as Python source.  Each chunk is sent as a
+    # frame with a header of (offset, length, crc32) so corrupted chunks can be
+    # detected and sent again.  Reads are streamed by the device without
+    # waiting; writes keep up to fs_binary_window chunks in flight, each one
+    # acknowledged (or rejected) by the device, to hide the link latency.
+    # If fs_compress is set, and the device has the deflate module, chunks are
+    # compressed (each on its own) when that makes them smaller.  fs_bytes
+    # counts the file bytes and the bytes sent over the link for all transfers.
+    # These methods return None/False if the device doesn't support binary
+    # transfers, in which case the generic Transport implementation is used.
+
+    def _fs_binary_start(self, call):
+        if not self.use_binary_fs or self.mounted:
+            # The mount intercept would interpret the binary data.
+            return None
+        for attempt in range(2):
+            if not self._fs_binary_loaded:
+                try:
+                    self.exec(fs_binary_code)
+                except TransportExecError:
+                    # Device lacks a feature the helper needs, don't try again.
+                    self.use_binary_fs = False
+                    return None
+                self._fs_binary_loaded = True
+            self.exec_raw_no_follow(call)
+            try:
+                self._fs_binary_ack()
+            except TransportExecError as e:
+                if attempt or "NameError" not in e.error_output:
+                    raise
+                # The helper was lost (e.g. by a soft reset), load it again.
+                self._fs_binary_loaded = False
+                continue
+            # The device replies with the chunk size it could allocate, and
+            # flags saying whether it can compute CRCs and (de)compress chunks.
+            chunk_size, flags = struct.unpack("<IB", self._fs_binary_read(5))
+            return chunk_size, flags
+
+    def _fs_binary_read(self, n):
+        data = self.serial.read(n)
+        if len(data) != n:
+            raise TransportError("timeout during binary transfer")
+        return data
+
+    def _fs_binary_ack(self):
+        data = self._fs_binary_read(1)
+        if data == b"\x06":
+            return
+        if data == b"\x04":
+            # The helper raised an exception, collect the error output.
+            data_err = self.read_until(1, b"\x04")
+            raise TransportExecError(b"", data_err[:-1].decode())
+        raise TransportError("unexpected response during binary transfer: {}".format(data))
+
+    def _fs_binary_end(self):
+        ret, ret_err = self.follow(timeout=10)
+        if ret_err:
+            raise TransportExecError(ret, ret_err.decode())
+
+    def _fs_binary_read_frames(self, chunk_size, flags):
+        # Generate (offset, data) for each good frame, ending with the empty
+        # terminating frame.  Frames that fail their CRC are dropped: their
+        # header can't be trusted, so the caller works out what is missing.
+        while True:
+            header = self._fs_binary_read(12)
+            offset, n, crc = struct.unpack("<III", header)
+            compressed = n & _FS_BINARY_COMPRESSED
+            n &= ~_FS_BINARY_COMPRESSED
+            if n > chunk_size:
+                raise TransportError("lost sync during binary transfer")
+            data = self._fs_binary_read(n)
+            if flags & _FS_BINARY_CRC and zlib.crc32(data, zlib.crc32(header[:8])) != crc:
+                if not n:
+                    raise TransportError("corrupt data during binary transfer")
+                continue
+            if not n:
+                yield offset, b""
+                break
+            self.fs_bytes[1] += 12 + n
+            if compressed:
+                data = zlib.decompressobj(-_FS_BINARY_WBITS).decompress(data)
+            self.fs_bytes[0] += len(data)
+            yield offset, data
+        self._fs_binary_end()
+
+    def _fs_readfile_binary(self, src, offset, progress_callback=None):
+        # Return a generator of the chunks of the file from offset, or None.
+        if progress_callback:
+            src_size = self.fs_stat(src).st_size
+
+        call = "__mpr_r('%s',%u" % (src, self.fs_binary_chunk_size)
+        timeout = self.serial.timeout
+        self.serial.timeout = 10
+        try:
+            start = self._fs_binary_start(call + ",None,%u,%u)" % (offset, self.fs_compress))
+        finally:
+            self.serial.timeout = timeout
+        if start is None:
+            return None
+
+        def missing(offset, kept, end, chunk_size):
+            # Return the offsets of the chunks not yet received, from the gaps
+            # between offset, the kept chunks and the end of the file.
+            offsets = []
+            for chunk_offset in sorted(kept) + [end]:
+                offsets.extend(range(offset, chunk_offset, chunk_size))
+                if chunk_offset < end:
+                    offset = max(offset, chunk_offset + len(kept[chunk_offset]))
+            return offsets
+
+        def chunks(offset, start):
+            # Chunks are passed on in order as they arrive.  After a bad chunk
+            # the following ones are kept until it has been received again.
+            timeout = self.serial.timeout
+            self.serial.timeout = 10
+            done = False
+            try:
+                kept = {}
+                end = None
+                chunk_size = start[0]
+                for attempt in range(self.fs_binary_retries + 1):
+                    if attempt:
+                        bad = missing(offset, kept, end, chunk_size)
+                        if not bad:
+                            break
+                        # Ask for just the chunks that failed.
+                        start = self._fs_binary_start(call + ",%r,0,%u)" % (bad, self.fs_compress))
+                    for chunk_offset, data in self._fs_binary_read_frames(*start):
+                        if not data:
+                            # The first pass ends at the end of the file.
+                            if end is None:
+                                end = chunk_offset
+                            continue
+                        if chunk_offset >= offset:
+                            kept[chunk_offset] = data
+                        while offset in kept:
+                            data = kept.pop(offset)
+                            offset += len(data)
+                            if progress_callback:
+                                progress_callback(offset, src_size)
+                            yield data
+                if kept or offset != end or (progress_callback and offset < src_size):
+                    raise TransportError("too many errors during binary transfer")
+                done = True
+            finally:
+                self.serial.timeout = timeout
+                if not done:
+                    # Stopped part way, the device may still be sending.
+                    self.in_raw_repl = False
+
+        return chunks(offset, start)
+
+    def _fs_binary_write_frames(self, frames, flags, written, size, progress_callback):
+        # Send the (offset, chunk) frames, keeping up to fs_binary_window of
+        # them in flight, until the device has acknowledged all of them.
+        # Return the number of bytes written, plus the initial written.
+        frames = iter(frames)
+        resend = collections.deque()
+        in_flight = {}
+        errors = 0
+        while True:
+            while len(in_flight) < self.fs_binary_window:
+                if resend:
+                    offset, chunk = resend.popleft()
+                else:
+                    offset, chunk = next(frames, (None, None))
+                    if chunk is None:
+                        break
+                data = chunk
+                n = len(chunk)
+                if chunk and self.fs_compress and flags & _FS_BINARY_INFLATE:
+                    c = zlib.compressobj(9, zlib.DEFLATED, -_FS_BINARY_WBITS)
+                    compressed = c.compress(chunk) + c.flush()
+                    if len(compressed) < n:
+                        data = compressed
+                        n = len(data) | _FS_BINARY_COMPRESSED
+                header = struct.pack("<II", offset, n)
+                crc = zlib.crc32(data, zlib.crc32(header)) if flags & _FS_BINARY_CRC else 0
+                self.serial.write(header + struct.pack("<I", crc) + data)
+                self.fs_bytes[1] += 12 + len(data)
+                in_flight[offset] = chunk
+            if not in_flight:
+                return written
+
+            data_resp = self.serial.read(5)
+            if data_resp[:1] == b"\x04":
+                # The helper raised an exception, collect the error output.
+                data_err = data_resp[1:] + self.read_until(1, b"\x04")
+                raise TransportExecError(b"", data_err[:-1].decode())
+            if len(data_resp) == 5:
+                (offset,) = struct.unpack("<I", data_resp[1:])
+                if data_resp[0] == 0x06:
+                    if offset in in_flight:
+                        n = len(in_flight.pop(offset))
+                        written += n
+                        self.fs_bytes[0] += n
+                        errors = 0
+                        if progress_callback:
+                            progress_callback(written, size)
+                    continue
+                if data_resp[0] != 0x15:
+                    raise TransportError(
+                        "unexpected response during binary transfer: {}".format(data_resp)
+                    )
+                if offset in in_flight:
+                    # The chunk was corrupted, send just that one again.
+                    bad = [offset]
+                else:
+                    # The device lost sync, send everything in flight again.
+                    bad = sorted(in_flight)
+            elif not data_resp:
+                # No response, assume the chunks in flight were lost.
+                bad = sorted(in_flight)
+            else:
+                raise TransportError("timeout during binary transfer")
+
+            errors += 1
+            if errors > self.fs_binary_retries:
+                raise TransportError("too many errors during binary transfer")
+            resend.extendleft((offset, in_flight.pop(offset)) for offset in reversed(bad))
+
+    def _fs_binary_frames(self, chunks, offset, chunk_size):
+        # Split the chunks from the caller into frames of chunk_size.
+        buf = b""
+        for data in chunks:
+            buf += data
+            while len(buf) >= chunk_size:
+                yield offset, buf[:chunk_size]
+                buf = buf[chunk_size:]
+                offset += chunk_size
+        if buf:
+            yield offset, buf
+
+    def _fs_writefile_binary(self, dest, chunks, size, offset, progress_callback=None):
+        timeout = self.serial.timeout
+        self.serial.timeout = 5
+        try:
+            call = "__mpr_w('%s',%u,%u)" % (dest, self.fs_binary_chunk_size, offset)
+            start = self._fs_binary_start(call)
+            if start is None:
+                return False
+            chunk_size, flags = start
+            frames = self._fs_binary_frames(chunks, offset, chunk_size)
+            end = self._fs_binary_write_frames(frames, flags, offset, size, progress_callback)
+            # The empty frame terminates the transfer, once all data is stored.
+            self._fs_binary_write_frames([(end, b"")], flags, end, size, None)
+            self._fs_binary_end()
+        finally:
+            self.serial.timeout = timeout
+
+        return True
+
+
+# Flags sent by the device when a binary transfer starts.
+_FS_BINARY_CRC = 1
+_FS_BINARY_INFLATE = 2
+_FS_BINARY_DEFLATE = 4
+
+# Set in the length of a frame if its data is compressed.
+_FS_BINARY_COMPRESSED = 0x80000000
+
+# Window size (as a power of 2) for compressed chunks, small to save device RAM.
+_FS_BINARY_WBITS = 10
 
 fs_hook_cmds = {
     "CMD_STAT": 1,
-    "CMD_ILISTDIR_START": 2,
-    "CMD_ILISTDIR_NEXT": 3,
+    "CMD_LISTDIR": 2,
     "CMD_OPEN": 4,
     "CMD_CLOSE": 5,
     "CMD_READ": 6,
@@ -413,10 +708,25 @@ fs_hook_cmds = {
     "CMD_RMDIR": 13,
 }
 
+# Must match CHUNK_SIZE in fs_hook_code.
+fs_hook_chunk_size = 256
+
 fs_hook_code = """\
-import os, io, struct, micropython
+import os, io, struct, micropython, time
 
 SEEK_SET = 0
+SEEK_CUR = 1
+
+# Size of the read-ahead and write-behind buffers of RemoteFile.
+BLOCK_SIZE = 4096
+
+# The host waits for an acknowledgement after sending this many bytes of a
+# command, so that they fit in the stdin ringbuffer on supported ports (which
+# can be as small as 260 bytes) however long the device takes to read them.
+CHUNK_SIZE = 256
+
+# How long (in ms) RemoteFS.stat may use a cached directory listing.
+DCACHE_MS = 1000
 
 class RemoteCommand:
     def __init__(self):
@@ -426,6 +736,12 @@ class RemoteCommand:
         self.fin = sys.stdin.buffer
         self.poller = select.poll()
         self.poller.register(self.fin, select.POLLIN)
+        self.nrx = 0
+        # Directory listings, shared by RemoteFS and RemoteFile so that any
+        # change made through the mount can invalidate them.
+        self.dcache = {}
+        # Files with data in their write-behind buffer, flushed on umount.
+        self.dirty = []
 
     def poll_in(self):
         for _ in self.poller.ipoll(1000):
@@ -440,15 +756,17 @@ class RemoteCommand:
 
     def rd_into(self, buf, n):
         # implement reading with a timeout in case other side disappears
-        if n == 0:
-            return
-        self.poll_in()
-        r = self.fin.readinto(buf, n)
-        if r < n:
-            mv = memoryview(buf)
-            while r < n:
-                self.poll_in()
-                r += self.fin.readinto(mv[r:], n - r)
+        mv = memoryview(buf)
+        r = 0
+        while r < n:
+            self.poll_in()
+            m = self.fin.readinto(mv[r:], min(n - r, CHUNK_SIZE - self.nrx))
+            r += m
+            self.nrx += m
+            if self.nrx == CHUNK_SIZE:
+                # Let the host send the next chunk.
+                self.fout.write(b'\\x06')
+                self.nrx = 0
 
     def begin(self, type):
         micropython.kbd_intr(-1)
@@ -462,6 +780,7 @@ class RemoteCommand:
             self.fin.readinto(buf4, 1)
             if buf4[0] == 0x18:
                 break
+        self.nrx = 0
 
     def end(self):
         micropython.kbd_intr(3)
@@ -487,7 +806,6 @@ class RemoteCommand:
         return buf4[0] | buf4[1] << 8 | buf4[2] << 16 | buf4[3] << 24
 
     def rd_bytes(self, buf):
-        # TODO if n is large (eg >256) then we may miss bytes on stdin
         n = self.rd_s32()
         if buf is None:
             ret = buf = bytearray(n)
@@ -520,10 +838,17 @@ class RemoteCommand:
 
 
 class RemoteFile(io.IOBase):
+    # Reads of binary files are served from a read-ahead buffer, and writes
+    # are collected in a write-behind buffer until it is full or the file is
+    # flushed, seeked, read or closed.  Text files are not read ahead because
+    # the host reads them in characters, not bytes.
     def __init__(self, cmd, fd, is_text):
         self.cmd = cmd
         self.fd = fd
         self.is_text = is_text
+        self.rbuf = b''
+        self.rpos = 0
+        self.wbuf = bytearray()
 
     def __enter__(self):
         return self
@@ -550,8 +875,7 @@ class RemoteFile(io.IOBase):
         elif request == 4:  # CLOSE
             self.close()
         elif request == 11:  # BUFFER_SIZE
-            # This is used as the vfs_reader buffer. n + 4 should be less than 255 to
-            # fit in stdin ringbuffer on supported ports. n + 7 should be multiple of 16
+            # This is used as the vfs_reader buffer. n + 7 should be multiple of 16
             # to efficiently use gc blocks in mp_reader_vfs_t.
             return 249
         else:
@@ -559,50 +883,99 @@ class RemoteFile(io.IOBase):
         return 0
 
     def flush(self):
-        pass
+        if self.wbuf:
+            self._write(self.wbuf)
+            self.wbuf = bytearray()
+            self.cmd.dirty.remove(self)
 
     def close(self):
         if self.fd is None:
             return
+        self.flush()
         c = self.cmd
         c.begin(CMD_CLOSE)
         c.wr_s8(self.fd)
         c.end()
         self.fd = None
 
-    def read(self, n=-1):
+    def _read(self, n):
         c = self.cmd
         c.begin(CMD_READ)
         c.wr_s8(self.fd)
         c.wr_s32(n)
         data = c.rd_bytes(None)
         c.end()
-        if self.is_text:
-            data = str(data, 'utf8')
-        else:
-            data = bytes(data)
         return data
 
-    def readinto(self, buf):
+    def _write(self, buf):
         c = self.cmd
-        c.begin(CMD_READ)
+        c.dcache.clear()
+        c.begin(CMD_WRITE)
         c.wr_s8(self.fd)
-        c.wr_s32(len(buf))
-        n = c.rd_bytes(buf)
+        c.wr_bytes(buf)
+        n = c.rd_s32()
         c.end()
         return n
 
+    def _unread(self):
+        # Discard the read-ahead data, moving the host file back to match.
+        n = len(self.rbuf) - self.rpos
+        self.rbuf = b''
+        self.rpos = 0
+        return n
+
+    def _read_bin(self, n):
+        self.flush()
+        data = bytearray()
+        while n < 0 or len(data) < n:
+            if self.rpos == len(self.rbuf):
+                if n < 0 or n - len(data) >= BLOCK_SIZE:
+                    # Large read, don't go through the buffer.
+                    data.extend(self._read(n if n < 0 else n - len(data)))
+                    break
+                self.rbuf = bytes(self._read(BLOCK_SIZE))
+                self.rpos = 0
+                if not self.rbuf:
+                    break
+            end = len(self.rbuf) if n < 0 else min(len(self.rbuf), self.rpos + n - len(data))
+            data.extend(self.rbuf[self.rpos : end])
+            self.rpos = end
+        return data
+
+    def read(self, n=-1):
+        if self.is_text:
+            self.flush()
+            return str(self._read(n), 'utf8')
+        return bytes(self._read_bin(n))
+
+    def readinto(self, buf):
+        data = self._read_bin(len(buf))
+        buf[: len(data)] = data
+        return len(data)
+
     def readline(self):
-        c = self.cmd
-        c.begin(CMD_READLINE)
-        c.wr_s8(self.fd)
-        data = c.rd_bytes(None)
-        c.end()
+        self.flush()
         if self.is_text:
-            data = str(data, 'utf8')
-        else:
-            data = bytes(data)
-        return data
+            c = self.cmd
+            c.begin(CMD_READLINE)
+            c.wr_s8(self.fd)
+            data = c.rd_bytes(None)
+            c.end()
+            return str(data, 'utf8')
+        data = bytearray()
+        while True:
+            if self.rpos == len(self.rbuf):
+                self.rbuf = bytes(self._read(BLOCK_SIZE))
+                self.rpos = 0
+                if not self.rbuf:
+                    break
+            i = self.rbuf.find(b'\\n', self.rpos) + 1
+            end = i or len(self.rbuf)
+            data.extend(self.rbuf[self.rpos : end])
+            self.rpos = end
+            if i:
+                break
+        return bytes(data)
 
     def readlines(self):
         ls = []
@@ -613,15 +986,23 @@ class RemoteFile(io.IOBase):
             ls.append(l)
 
     def write(self, buf):
-        c = self.cmd
-        c.begin(CMD_WRITE)
-        c.wr_s8(self.fd)
-        c.wr_bytes(buf)
-        n = c.rd_s32()
-        c.end()
+        n = self._unread()
+        if n:
+            self._seek(-n, SEEK_CUR)
+        n = len(buf)
+        if self.is_text:
+            buf = buf.encode()
+        if len(self.wbuf) + len(buf) > BLOCK_SIZE:
+            self.flush()
+        if len(buf) >= BLOCK_SIZE:
+            self._write(buf)
+        elif buf:
+            if not self.wbuf:
+                self.cmd.dirty.append(self)
+            self.wbuf.extend(buf)
         return n
 
-    def seek(self, n, whence=SEEK_SET):
+    def _seek(self, n, whence):
         c = self.cmd
         c.begin(CMD_SEEK)
         c.wr_s8(self.fd)
@@ -633,6 +1014,17 @@ class RemoteFile(io.IOBase):
             raise OSError(n)
         return n
 
+    def seek(self, n, whence=SEEK_SET):
+        self.flush()
+        unread = self._unread()
+        if whence == SEEK_CUR:
+            # The host file is ahead by the amount of data read ahead.
+            n -= unread
+        return self._seek(n, whence)
+
+    def tell(self):
+        return self.seek(0, SEEK_CUR)
+
 
 class RemoteFS:
     def __init__(self, cmd):
@@ -645,7 +1037,8 @@ class RemoteFS:
         pass
 
     def umount(self):
-        pass
+        for f in self.cmd.dirty[:]:
+            f.flush()
 
     def chdir(self, path):
         if not path.startswith("/"):
@@ -661,6 +1054,7 @@ class RemoteFS:
 
     def remove(self, path):
         c = self.cmd
+        c.dcache.clear()
         c.begin(CMD_REMOVE)
         c.wr_str(self._abspath(path))
         res = c.rd_s32()
@@ -670,6 +1064,7 @@ class RemoteFS:
 
     def rename(self, old, new):
         c = self.cmd
+        c.dcache.clear()
         c.begin(CMD_RENAME)
         c.wr_str(self._abspath(old))
         c.wr_str(self._abspath(new))
@@ -680,6 +1075,7 @@ class RemoteFS:
 
     def mkdir(self, path):
         c = self.cmd
+        c.dcache.clear()
         c.begin(CMD_MKDIR)
         c.wr_str(self._abspath(path))
         res = c.rd_s32()
@@ -689,6 +1085,7 @@ class RemoteFS:
 
     def rmdir(self, path):
         c = self.cmd
+        c.dcache.clear()
         c.begin(CMD_RMDIR)
         c.wr_str(self._abspath(path))
         res = c.rd_s32()
@@ -696,10 +1093,46 @@ class RemoteFS:
         if res < 0:
             raise OSError(-res)
 
+    def _listdir(self, path):
+        # Get a dict of name: (type, mode, size, mtime) for all entries in the
+        # directory, in one request.  The result is kept for a short time so
+        # that a sequence of stats (e.g. by import) needs only one request.
+        c = self.cmd
+        t = time.ticks_ms()
+        d = c.dcache.get(path)
+        if d and time.ticks_diff(t, d[0]) < DCACHE_MS:
+            return d[1]
+        c.begin(CMD_LISTDIR)
+        c.wr_str(path)
+        res = c.rd_s8()
+        if res < 0:
+            c.end()
+            raise OSError(-res)
+        entries = {}
+        while True:
+            name = c.rd_str()
+            if not name:
+                break
+            entries[name] = (c.rd_u32(), c.rd_u32(), c.rd_u32(), c.rd_u32())
+        c.end()
+        if len(c.dcache) >= 8:
+            c.dcache.clear()
+        c.dcache[path] = (t, entries)
+        return entries
+
     def stat(self, path):
+        path = self._abspath(path).rstrip('/')
+        if path:
+            i = path.rfind('/')
+            e = self._listdir(path[:i] or '/').get(path[i + 1 :])
+            if e is None:
+                raise OSError(2)  # ENOENT
+            if e[1]:
+                return e[1], 0, 0, 0, 0, 0, e[2], e[3], e[3], e[3]
+        # The root, or an entry that the host couldn't stat in the listing.
         c = self.cmd
         c.begin(CMD_STAT)
-        c.wr_str(self._abspath(path))
+        c.wr_str(path)
         res = c.rd_s8()
         if res < 0:
             c.end()
@@ -713,25 +1146,8 @@ class RemoteFS:
         return mode, 0, 0, 0, 0, 0, size, atime, mtime, ctime
 
     def ilistdir(self, path):
-        c = self.cmd
-        c.begin(CMD_ILISTDIR_START)
-        c.wr_str(self._abspath(path))
-        res = c.rd_s8()
-        c.end()
-        if res < 0:
-            raise OSError(-res)
-        def next():
-            while True:
-                c.begin(CMD_ILISTDIR_NEXT)
-                name = c.rd_str()
-                if name:
-                    type = c.rd_u32()
-                    c.end()
-                    yield (name, type, 0)
-                else:
-                    c.end()
-                    break
-        return next()
+        entries = self._listdir(self._abspath(path))
+        return iter([(name, e[0], 0) for name, e in entries.items()])
 
     def open(self, path, mode):
         c = self.cmd
@@ -742,6 +1158,8 @@ class RemoteFS:
         c.end()
         if fd < 0:
             raise OSError(-fd)
+        if mode.find('r') == -1:
+            c.dcache.clear()
         return RemoteFile(c, fd, mode.find('b') == -1)
 
 
@@ -760,14 +1178,178 @@ fs_hook_code = re.sub("wr_", "w", fs_hook_code)
 fs_hook_code = re.sub("buf4", "b4", fs_hook_code)
 
 
+fs_binary_code = """\
+import io, sys, select, struct, micropython
+try:
+    from binascii import crc32 as __mpr_crc
+except ImportError:
+    __mpr_crc = None
+try:
+    import deflate as __mpr_z
+except ImportError:
+    __mpr_z = None
+
+# Flags for the host: CRCs are used (1), chunks can be decompressed (2) and
+# compressed (4).
+__mpr_f = (__mpr_crc is not None) | (__mpr_z is not None) << 1
+if __mpr_z and hasattr(__mpr_z.DeflateIO, 'write'):
+    __mpr_f |= 4
+
+# Fail now (so the host falls back) if the device lacks a required feature.
+sys.stdin.buffer.readinto, sys.stdout.buffer.write, micropython.kbd_intr
+
+def __mpr_buf(n):
+    # Allocate the largest transfer buffer possible, up to n bytes.
+    while True:
+        try:
+            return memoryview(bytearray(n))
+        except MemoryError:
+            if n <= 256:
+                raise
+            n //= 2
+
+def __mpr_start(b):
+    # Acknowledge the call and tell the host the chunk size and flags.
+    sys.stdout.buffer.write(b'\\x06' + struct.pack('<IB', len(b), __mpr_f))
+
+def __mpr_hdr(h, o, b, n, z=0):
+    # Fill in a frame header: offset, length (top bit set if the data is
+    # compressed), CRC of offset+length+data.
+    struct.pack_into('<II', h, 0, o, n | z << 31)
+    struct.pack_into('<I', h, 8, __mpr_crc(b[:n], __mpr_crc(h[:8])) if __mpr_crc else 0)
+
+def __mpr_zip(b, n):
+    # Return b[:n] compressed, or None if that doesn't make it smaller.  The
+    # window size must match _FS_BINARY_WBITS on the host.
+    s = io.BytesIO()
+    w = __mpr_z.DeflateIO(s, __mpr_z.RAW, 10)
+    w.write(b[:n])
+    w.close()
+    c = s.getvalue()
+    return c if len(c) < n else None
+
+def __mpr_rd(fin, poller, b, n, t):
+    # Read exactly n bytes, returning False if the host goes quiet for t ms.
+    r = 0
+    while r < n:
+        if not poller.poll(t):
+            return False
+        r += fin.readinto(b[r:n])
+    return True
+
+def __mpr_r(path, n, offsets=None, o=0, z=0):
+    # Send the file from offset o (or just the chunks at the given offsets) as
+    # frames, terminated by an empty frame.  If z is set, and the device can,
+    # compress the chunks.
+    z = z and __mpr_f & 4
+    f = open(path, 'rb')
+    try:
+        b = __mpr_buf(n)
+        h = memoryview(bytearray(12))
+        fout = sys.stdout.buffer
+        __mpr_start(b)
+        f.seek(o)
+        i = 0
+        while True:
+            if offsets:
+                if i == len(offsets):
+                    break
+                o = offsets[i]
+                i += 1
+                f.seek(o)
+            n = f.readinto(b)
+            if not n:
+                if offsets:
+                    continue
+                break
+            c = z and __mpr_zip(b, n)
+            if c:
+                __mpr_hdr(h, o, c, len(c), 1)
+                fout.write(h)
+                fout.write(c)
+            else:
+                __mpr_hdr(h, o, b, n)
+                fout.write(h)
+                fout.write(b[:n])
+            o += n
+        __mpr_hdr(h, o, b, 0)
+        fout.write(h)
+    finally:
+        f.close()
+
+def __mpr_w(path, n, a=0):
+    # Receive frames and write them at their offset, acknowledging each one
+    # (or requesting a resend).  Frames may be repeated or arrive out of order.
+    # If a is non-zero the first a bytes of the existing file are kept.
+    b = __mpr_buf(n)
+    h = memoryview(bytearray(12))
+    fin = sys.stdin.buffer
+    fout = sys.stdout.buffer
+    poller = select.poll()
+    poller.register(fin, select.POLLIN)
+    f = open(path, 'r+b' if a else 'wb')
+    try:
+        micropython.kbd_intr(-1)
+        __mpr_start(b)
+        d = None
+        p = 0
+        while True:
+            if not poller.poll(10000):
+                raise OSError(110)
+            if __mpr_rd(fin, poller, h, 12, 200):
+                o, n, c = struct.unpack('<III', h)
+                z = n >> 31
+                n &= 0x7fffffff
+                if n <= len(b) and __mpr_rd(fin, poller, b, n, 200):
+                    if __mpr_crc and __mpr_crc(b[:n], __mpr_crc(h[:8])) != c:
+                        fout.write(b'\\x15' + h[:4])
+                        continue
+                    w = b
+                    if z:
+                        # Decompress the chunk into a second buffer.
+                        if d is None:
+                            d = memoryview(bytearray(len(b)))
+                        n = __mpr_z.DeflateIO(io.BytesIO(b[:n]), __mpr_z.RAW, 10).readinto(d)
+                        w = d
+                    if o != p:
+                        f.seek(o)
+                    p = o + f.write(w[:n])
+                    fout.write(b'\\x06' + h[:4])
+                    if not n:
+                        break
+                    continue
+            # Lost sync with the host: drop input until it pauses, then ask
+            # for all outstanding frames to be resent.
+            while poller.poll(50):
+                fin.readinto(b)
+            fout.write(b'\\x15\\xff\\xff\\xff\\xff')
+    except:
+        # Discard frames still in flight so the REPL doesn't see them.
+        while poller.poll(100):
+            fin.readinto(b)
+        raise
+    finally:
+        micropython.kbd_intr(3)
+        f.close()
+"""
+
+# Apply basic compression on the binary transfer code.
+fs_binary_code = re.sub(" *#.*$", "", fs_binary_code, flags=re.MULTILINE)
+fs_binary_code = re.sub("\n\n+", "\n", fs_binary_code)
+fs_binary_code = re.sub("    ", " ", fs_binary_code)
+
+
 class PyboardCommand:
-    def __init__(self, fin, fout, path, unsafe_links=False):
+    def __init__(self, fin, fout, path, unsafe_links=False, mpy_compile=None):
         self.fin = fin
         self.fout = fout
+        self.ntx = 0
         self.root = path + "/"
-        self.data_ilistdir = ["", []]
         self.data_files = []
         self.unsafe_links = unsafe_links
+        # If given, mpy_compile(path, name) compiles the .py file at path and
+        # returns the path of the resulting .mpy file (or None on error).
+        self.mpy_compile = mpy_compile
 
     def rd_s8(self):
         return struct.unpack("<b", self.fin.read(1))[0]
@@ -786,23 +1368,41 @@ class PyboardCommand:
         else:
             return str(self.fin.read(n), "utf8")
 
+    def begin(self):
+        # Called when the device starts a command.
+        self.ntx = 0
+
+    def write(self, b):
+        # Send b in chunks of CHUNK_SIZE (see fs_hook_code), waiting for the
+        # device to acknowledge each full chunk before sending any more.
+        b = memoryview(b)
+        while b:
+            n = min(len(b), fs_hook_chunk_size - self.ntx)
+            self.fout.write(b[:n])
+            b = b[n:]
+            self.ntx += n
+            if self.ntx == fs_hook_chunk_size:
+                if self.fin.read(1) != b"\x06":
+                    raise TransportError("mount: bad acknowledgement from device")
+                self.ntx = 0
+
     def wr_s8(self, i):
-        self.fout.write(struct.pack("<b", i))
+        self.write(struct.pack("<b", i))
 
     def wr_s32(self, i):
-        self.fout.write(struct.pack("<i", i))
+        self.write(struct.pack("<i", i))
 
     def wr_u32(self, i):
-        self.fout.write(struct.pack("<I", i))
+        self.write(struct.pack("<I", i))
 
     def wr_bytes(self, b):
         self.wr_s32(len(b))
-        self.fout.write(b)
+        self.write(b)
 
     def wr_str(self, s):
         b = bytes(s, "utf8")
         self.wr_s32(len(b))
-        self.fout.write(b)
+        self.write(b)
 
     def log_cmd(self, msg):
         print(f"[{msg}]", end="\r\n")
@@ -817,12 +1417,30 @@ class PyboardCommand:
         if parent != os.path.commonpath([parent, child]):
             raise OSError(EPERM, "")  # File is outside mounted dir
 
+    def mpy_path(self, path):
+        # When compiling to .mpy, .py files are presented to the device as
+        # .mpy files, so that import loads the compiled version.
+        if not self.mpy_compile:
+            return path
+        if path.endswith(".py") and os.path.isfile(path):
+            raise FileNotFoundError(ENOENT, "")
+        if (
+            path.endswith(".mpy")
+            and not os.path.exists(path)
+            and os.path.isfile(path[:-4] + ".py")
+        ):
+            mpy = self.mpy_compile(path[:-4] + ".py", path[len(self.root) : -4] + ".py")
+            if mpy is None:
+                raise FileNotFoundError(ENOENT, "")
+            return mpy
+        return path
+
     def do_stat(self):
         path = self.root + self.rd_str()
         # self.log_cmd(f"stat {path}")
         try:
             self.path_check(path)
-            stat = os.stat(path)
+            stat = os.stat(self.mpy_path(path))
         except OSError as er:
             self.wr_s8(-abs(er.errno))
         else:
@@ -834,28 +1452,46 @@ class PyboardCommand:
             self.wr_u32(int(stat.st_mtime))
             self.wr_u32(int(stat.st_ctime))
 
-    def do_ilistdir_start(self):
+    def do_listdir(self):
         path = self.root + self.rd_str()
         try:
             self.path_check(path)
-            self.data_ilistdir[0] = path
-            self.data_ilistdir[1] = os.listdir(path)
-            self.wr_s8(0)
+            entries = os.listdir(path)
         except OSError as er:
             self.wr_s8(-abs(er.errno))
-
-    def do_ilistdir_next(self):
-        if self.data_ilistdir[1]:
-            entry = self.data_ilistdir[1].pop(0)
+            return
+        self.wr_s8(0)
+        # Send all entries in one go, along with their stat information (if
+        # accessible) so the device can answer stat requests from it.
+        for entry in entries:
+            entry_path = path + "/" + entry
             try:
-                stat = os.lstat(self.data_ilistdir[0] + "/" + entry)
-                mode = stat.st_mode & 0xC000
+                mode = os.lstat(entry_path).st_mode & 0xC000
             except OSError:
                 mode = 0
+            try:
+                self.path_check(entry_path)
+                stat = os.stat(entry_path)
+            except OSError:
+                stat = None
+            if self.mpy_compile and entry.endswith(".py") and mode == 0x8000:
+                if entry[:-3] + ".mpy" in entries:
+                    continue
+                # Show it as .mpy, without stat information so the device
+                # asks for it (and it is compiled) only if it is needed.
+                entry = entry[:-3] + ".mpy"
+                stat = None
             self.wr_str(entry)
             self.wr_u32(mode)
-        else:
-            self.wr_str("")
+            if stat:
+                self.wr_u32(stat.st_mode)
+                self.wr_u32(stat.st_size)
+                self.wr_u32(int(stat.st_mtime))
+            else:
+                self.wr_u32(0)
+                self.wr_u32(0)
+                self.wr_u32(0)
+        self.wr_str("")
 
     def do_open(self):
         path = self.root + self.rd_str()
@@ -863,7 +1499,11 @@ class PyboardCommand:
         # self.log_cmd(f"open {path} {mode}")
         try:
             self.path_check(path)
-            f = open(path, mode)
+            if path.endswith(".mpy") and "r" in mode:
+                f = open(self.mpy_path(path), mode)
+            else:
+                # The .py file itself can still be opened by name.
+                f = open(path, mode)
         except OSError as er:
             self.wr_s8(-abs(er.errno))
         else:
@@ -967,8 +1607,7 @@ class PyboardCommand:
 
     cmd_table = {
         fs_hook_cmds["CMD_STAT"]: do_stat,
-        fs_hook_cmds["CMD_ILISTDIR_START"]: do_ilistdir_start,
-        fs_hook_cmds["CMD_ILISTDIR_NEXT"]: do_ilistdir_next,
+        fs_hook_cmds["CMD_LISTDIR"]: do_listdir,
         fs_hook_cmds["CMD_OPEN"]: do_open,
         fs_hook_cmds["CMD_CLOSE"]: do_close,
         fs_hook_cmds["CMD_READ"]: do_read,
@@ -996,6 +1635,7 @@ class SerialIntercept:
                 # a special command
                 c = self.orig_serial.read(1)[0]
                 self.orig_serial.write(b"\x18")  # Acknowledge command
+                self.cmd.begin()
                 PyboardCommand.cmd_table[c](self.cmd)
             elif not VT_ENABLED and c == b"\x1b":
                 # ESC code, ignore these on windows
@@ -170,3 +170,38 @@ EOF
 $MPREMOTE resume cp -r "${TMP}/package" :
 $MPREMOTE resume ls : :package :package/subpackage
 $MPREMOTE resume exec "import package; package.x(); package.y()"
+
+# Remove files and directories recursively, in one command.
+echo -----
+$MPREMOTE run "${TMP}/ramdisk.py"
+$MPREMOTE resume cp -r "${TMP}/package" :
+$MPREMOTE resume cp -r "${TMP}/package" :package2
+$MPREMOTE resume cp "${TMP}/a.py" :
+$MPREMOTE resume rm -r :package package2/subpackage :a.py
+$MPREMOTE resume ls : :package2
+$MPREMOTE resume rm :package2 || echo "expect error"
+
+# Create directories and their parents, some of which already exist.
+echo -----
+$MPREMOTE resume mkdir -p :x/y/z package2 :x
+$MPREMOTE resume ls : :x :x/y
+$MPREMOTE resume mkdir :x || echo "expect error"
+
+# Long listing, with the modification times masked.
+echo -----
+$MPREMOTE resume ls -l : :x :package2 | sed -E "s/[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9:]{8}/<mtime>/"
+
+# Copy binary files, with every byte value and more than one chunk, to the
+# device and back.
+echo -----
+$MPREMOTE run "${TMP}/ramdisk.py"
+python3 -c "import sys; sys.stdout.buffer.write(bytes(range(256)) * 20)" > "${TMP}/data.bin"
+: > "${TMP}/empty.bin"
+$MPREMOTE resume cp "${TMP}/data.bin" "${TMP}/empty.bin" :
+$MPREMOTE resume ls
+$MPREMOTE resume sha256sum :data.bin :empty.bin
+mkdir "${TMP}/back"
+$MPREMOTE resume cp :data.bin :empty.bin "${TMP}/back"
+cmp "${TMP}/data.bin" "${TMP}/back/data.bin"
+cmp "${TMP}/empty.bin" "${TMP}/back/empty.bin"
+cat "${TMP}/back/data.bin" | sha256sum
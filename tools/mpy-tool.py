@@ -56,6 +56,8 @@ elif sys.version_info[0] == 3:  # Also handles MicroPython
 
 # end compatibility code
 
+import os
+import re
 import sys
 import struct
 
@@ -555,6 +557,65 @@ class MPFunTable:
         return "mp_fun_table"
 
 
+def constant_key(obj):
+    # Constants that compare equal but are different objects (eg 1 and 1.0, or
+    # 0.0 and -0.0) must have different keys.
+    if type(obj) is tuple:
+        return (tuple, tuple(constant_key(o) for o in obj))
+    return (type(obj), repr(obj))
+
+
+class SharedConstants:
+    # Constant objects that are used more than once, by any of the modules, are
+    # frozen once (before the modules) and shared.
+    def __init__(self, compiled_modules=()):
+        self.uses = {}
+        self.refs = {}
+        self.saved = 0
+        for cm in compiled_modules:
+            for obj in cm.obj_table:
+                self.count(obj)
+
+    def count(self, obj):
+        if not (
+            is_str_type(obj)
+            or is_bytes_type(obj)
+            or is_int_type(obj)
+            or type(obj) in (float, complex, tuple)
+        ):
+            return
+        key = constant_key(obj)
+        self.uses[key] = self.uses.get(key, 0) + 1
+        if type(obj) is tuple and self.uses[key] == 1:
+            for sub_obj in obj:
+                self.count(sub_obj)
+
+    def freeze(self, compiled_modules, storage):
+        for cm in compiled_modules:
+            for obj in cm.obj_table:
+                if self.uses.get(constant_key(obj), 0) > 1:
+                    self.freeze_obj(cm, obj, storage)
+
+    def freeze_obj(self, cm, obj, storage):
+        key = constant_key(obj)
+        if key in self.refs:
+            return
+        if type(obj) is tuple:
+            # The items of a shared tuple are shared too, so the tuple is a
+            # single definition.
+            for sub_obj in obj:
+                self.freeze_obj(cm, sub_obj, storage)
+        content = const_str_content + const_int_content + const_obj_content
+        self.refs[key] = cm.freeze_constant_obj(
+            "shared_const_obj_%u" % len(self.refs), obj, storage
+        )
+        content = const_str_content + const_int_content + const_obj_content - content
+        self.saved += max(0, self.uses.get(key, 1) - 1) * content
+
+
+shared_constants = SharedConstants()
+
+
 class CompiledModule:
     def __init__(
         self,
@@ -656,7 +717,7 @@ class CompiledModule:
         print("obj_table:", self.obj_table)
         self.raw_code.disassemble()
 
-    def freeze(self, compiled_module_index):
+    def freeze(self, compiled_module_index, split=False):
         print()
         print("/" * 80)
         print("// frozen module %s" % self.escaped_name)
@@ -671,7 +732,11 @@ class CompiledModule:
         self.freeze_constants()
 
         print()
-        print("static const mp_frozen_module_t frozen_module_%s = {" % self.escaped_name)
+        # When split into its own C file the module is referenced from the index.
+        print(
+            "%sconst mp_frozen_module_t frozen_module_%s = {"
+            % ("" if split else "static ", self.escaped_name)
+        )
         print("    .constants = {")
         if len(self.qstr_table):
             print(
@@ -688,10 +753,12 @@ class CompiledModule:
         print("    .proto_fun = &proto_fun_%s," % self.raw_code.escaped_name)
         print("};")
 
-    def freeze_constant_obj(self, obj_name, obj):
+    def freeze_constant_obj(self, obj_name, obj, storage="static "):
         global const_str_content, const_int_content, const_obj_content
 
-        if isinstance(obj, MPFunTable):
+        if constant_key(obj) in shared_constants.refs:
+            return shared_constants.refs[constant_key(obj)]
+        elif isinstance(obj, MPFunTable):
             return "&mp_fun_table"
         elif obj is None:
             return "MP_ROM_NONE"
@@ -716,8 +783,9 @@ class CompiledModule:
             else:
                 obj_type = "mp_type_bytes"
             print(
-                'static const mp_obj_str_t %s = {{&%s}, %u, %u, (const byte*)"%s"};'
+                '%sconst mp_obj_str_t %s = {{&%s}, %u, %u, (const byte*)"%s"};'
                 % (
+                    storage,
                     obj_name,
                     obj_type,
                     qstrutil.compute_hash(obj, config.MICROPY_QSTR_BYTES_IN_HASH),
@@ -735,7 +803,7 @@ class CompiledModule:
             elif config.MICROPY_LONGINT_IMPL == config.MICROPY_LONGINT_IMPL_NONE:
                 raise FreezeError(self, "target does not support long int")
             elif config.MICROPY_LONGINT_IMPL == config.MICROPY_LONGINT_IMPL_LONGLONG:
-                print("static const mp_obj_int_t %s = {{&mp_type_int}, %d};" % (obj_name, obj))
+                print("%sconst mp_obj_int_t %s = {{&mp_type_int}, %d};" % (storage, obj_name, obj))
                 return "MP_ROM_PTR(&%s)" % obj_name
             elif config.MICROPY_LONGINT_IMPL == config.MICROPY_LONGINT_IMPL_MPZ:
                 neg = 0
@@ -751,9 +819,9 @@ class CompiledModule:
                 ndigs = len(digs)
                 digs = ",".join(("%#x" % d) for d in digs)
                 print(
-                    "static const mp_obj_int_t %s = {{&mp_type_int}, "
+                    "%sconst mp_obj_int_t %s = {{&mp_type_int}, "
                     "{.neg=%u, .fixed_dig=1, .alloc=%u, .len=%u, .dig=(uint%u_t*)(const uint%u_t[]){%s}}};"
-                    % (obj_name, neg, ndigs, ndigs, bits_per_dig, bits_per_dig, digs)
+                    % (storage, obj_name, neg, ndigs, ndigs, bits_per_dig, bits_per_dig, digs)
                 )
                 const_int_content += (digs.count(",") + 1) * bits_per_dig // 8
                 const_obj_content += 4 * 4
@@ -764,8 +832,8 @@ class CompiledModule:
                 "#if MICROPY_OBJ_REPR == MICROPY_OBJ_REPR_A || MICROPY_OBJ_REPR == MICROPY_OBJ_REPR_B"
             )
             print(
-                "static const mp_obj_float_t %s = {{&mp_type_float}, (mp_float_t)%.16g};"
-                % (obj_name, obj)
+                "%sconst mp_obj_float_t %s = {{&mp_type_float}, (mp_float_t)%.16g};"
+                % (storage, obj_name, obj)
             )
             print("#define %s MP_ROM_PTR(&%s)" % (macro_name, obj_name))
             print("#elif MICROPY_OBJ_REPR == MICROPY_OBJ_REPR_C")
@@ -781,8 +849,8 @@ class CompiledModule:
             return macro_name
         elif isinstance(obj, complex):
             print(
-                "static const mp_obj_complex_t %s = {{&mp_type_complex}, (mp_float_t)%.16g, (mp_float_t)%.16g};"
-                % (obj_name, obj.real, obj.imag)
+                "%sconst mp_obj_complex_t %s = {{&mp_type_complex}, (mp_float_t)%.16g, (mp_float_t)%.16g};"
+                % (storage, obj_name, obj.real, obj.imag)
             )
             return "MP_ROM_PTR(&%s)" % obj_name
         elif type(obj) is tuple:
@@ -794,12 +862,13 @@ class CompiledModule:
                     sub_obj_name = "%s_%u" % (obj_name, i)
                     obj_refs.append(self.freeze_constant_obj(sub_obj_name, sub_obj))
                 print(
-                    "static const mp_rom_obj_tuple_t %s = {{&mp_type_tuple}, %d, {"
-                    % (obj_name, len(obj))
+                    "%sconst mp_rom_obj_tuple_t %s = {{&mp_type_tuple}, %d, {"
+                    % (storage, obj_name, len(obj))
                 )
                 for ref in obj_refs:
                     print("    %s," % ref)
                 print("}};")
+                const_obj_content += 4 * (2 + len(obj))
                 return "MP_ROM_PTR(&%s)" % obj_name
         else:
             raise FreezeError(self, "freezing of object %r is not implemented" % (obj,))
@@ -859,18 +928,7 @@ class RawCode(object):
         self.code_kind = code_kind
 
         if code_kind in (MP_CODE_BYTECODE, MP_CODE_NATIVE_PY):
-            (
-                self.offset_prelude_size,
-                self.offset_source_info,
-                self.offset_line_info,
-                self.offset_closure_info,
-                self.offset_opcodes,
-                self.prelude_signature,
-                self.prelude_size,
-                self.names,
-            ) = extract_prelude(self.fun_data, prelude_offset)
-            self.scope_flags = self.prelude_signature[2]
-            self.n_pos_args = self.prelude_signature[3]
+            self.read_prelude()
             self.simple_name = self.qstr_table[self.names[0]]
         else:
             self.simple_name = self.qstr_table[0]
@@ -886,6 +944,26 @@ class RawCode(object):
         self.escaped_names.add(unique_escaped_name)
         self.escaped_name = unique_escaped_name
 
+    def read_prelude(self):
+        (
+            self.offset_prelude_size,
+            self.offset_source_info,
+            self.offset_line_info,
+            self.offset_closure_info,
+            self.offset_opcodes,
+            self.prelude_signature,
+            self.prelude_size,
+            self.names,
+        ) = extract_prelude(self.fun_data, self.prelude_offset)
+        self.scope_flags = self.prelude_signature[2]
+        self.n_pos_args = self.prelude_signature[3]
+
+    def all_raw_codes(self):
+        yield self
+        for rc in self.children:
+            for child in rc.all_raw_codes():
+                yield child
+
     def disassemble_children(self):
         print("  children:", [rc.simple_name.str for rc in self.children])
         for rc in self.children:
@@ -1008,6 +1086,26 @@ class RawCodeBytecode(RawCode):
             ip += sz
         self.disassemble_children()
 
+    def strip_line_info(self):
+        # Remove the line-number table, leaving the simple name and arg names.
+        bc = self.fun_data
+        source_info = bc[self.offset_source_info : self.offset_line_info]
+        self.fun_data = (
+            bc[: self.offset_prelude_size]
+            + encode_prelude_size(len(source_info), self.prelude_size[1])
+            + source_info
+            + bc[self.offset_closure_info :]
+        )
+        self.read_prelude()
+
+    def opcodes(self):
+        bc = self.fun_data
+        ip = self.offset_opcodes
+        while ip < len(bc):
+            fmt, sz, arg, _ = mp_opcode_decode(bc, ip)
+            yield bc[ip], arg
+            ip += sz
+
     def freeze(self):
         # generate bytecode data
         bc = self.fun_data
@@ -1416,17 +1514,246 @@ def disassemble_mpy(compiled_modules):
         cm.disassemble()
 
 
-def freeze_mpy(firmware_qstr_idents, compiled_modules):
-    # add to qstrs
-    new = {}
-    for q in global_qstrs.qstrs:
-        # don't add duplicates that are already in the firmware
-        if q is None or q.qstr_esc in firmware_qstr_idents or q.qstr_esc in new:
+def analyse_mpy(compiled_modules):
+    # Output the size and the opcodes of each function, as JSON.
+    import json
+
+    def opcode_name(opcode):
+        # Group opcodes like "LOAD_FAST 3" together, but keep the operator of
+        # "BINARY_OP 5 __add__".
+        return " ".join(w for w in Opcode.mapping[opcode].split() if not w.lstrip("-").isdigit())
+
+    call_opcodes = (
+        Opcode.MP_BC_CALL_FUNCTION,
+        Opcode.MP_BC_CALL_FUNCTION_VAR_KW,
+        Opcode.MP_BC_CALL_METHOD,
+        Opcode.MP_BC_CALL_METHOD_VAR_KW,
+    )
+
+    def analyse_raw_code(rc, parent_name, functions, histogram):
+        if parent_name in (None, "<module>"):
+            name = rc.simple_name.str
+        else:
+            name = parent_name + "." + rc.simple_name.str
+        function = {
+            "name": name,
+            "kind": RawCode.code_kind_str[rc.code_kind],
+            "size": len(rc.fun_data),
+        }
+        if rc.code_kind == MP_CODE_BYTECODE:
+            function["line_info_size"] = rc.offset_closure_info - rc.offset_line_info
+            function["opcodes_size"] = len(rc.fun_data) - rc.offset_opcodes
+            function["opcodes"] = 0
+            function["calls"] = 0
+            function["histogram"] = {}
+            for opcode, _ in rc.opcodes():
+                op_name = opcode_name(opcode)
+                function["opcodes"] += 1
+                function["calls"] += opcode in call_opcodes
+                function["histogram"][op_name] = function["histogram"].get(op_name, 0) + 1
+                histogram[op_name] = histogram.get(op_name, 0) + 1
+        function["children"] = len(rc.children)
+        functions.append(function)
+        for child in rc.children:
+            analyse_raw_code(child, name, functions, histogram)
+
+    modules = []
+    histogram = {}
+    for cm in compiled_modules:
+        functions = []
+        analyse_raw_code(cm.raw_code, None, functions, histogram)
+        modules.append(
+            {
+                "name": module_name(cm),
+                "file": cm.mpy_source_file,
+                "size": sum(f["size"] for f in functions),
+                "qstr_table": len(cm.qstr_table),
+                "obj_table": len(cm.obj_table),
+                "const_data_size": module_size(cm) - sum(f["size"] for f in functions),
+                "calls": sum(f.get("calls", 0) for f in functions),
+                "functions": functions,
+            }
+        )
+
+    json.dump(
+        {
+            "size": sum(m["size"] for m in modules),
+            "histogram": histogram,
+            "modules": modules,
+        },
+        sys.stdout,
+        indent=1,
+        sort_keys=True,
+    )
+    print()
+
+
+def module_name(cm):
+    name = cm.source_file.str[:-3].replace("/", ".")
+    if name.endswith(".__init__"):
+        name = name[: -len(".__init__")]
+    return name
+
+
+def module_strings(cm):
+    strings = [q.str for q in cm.qstr_table]
+    objs = list(cm.obj_table)
+    while objs:
+        obj = objs.pop()
+        if is_str_type(obj):
+            strings.append(obj)
+        elif type(obj) is tuple:
+            objs.extend(obj)
+    return strings
+
+
+def module_size(cm):
+    # The bytecode and the data of the str/bytes constants.
+    size = sum(len(rc.fun_data) for rc in cm.raw_code.all_raw_codes())
+    for obj in cm.obj_table:
+        if is_str_type(obj):
+            size += len(bytes_cons(obj, "utf8"))
+        elif is_bytes_type(obj):
+            size += len(obj)
+    return size
+
+
+def reachable_modules(compiled_modules, keep_modules):
+    # A module is reachable if it's kept, or if its name appears as a string in
+    # a reachable module, either in full or relative to the package of that
+    # module.  This covers all import statements, as well as modules that are
+    # imported dynamically by name (eg by __import__).
+    modules = dict((module_name(cm), cm) for cm in compiled_modules)
+    reached = set()
+    pending = []
+
+    def reach(name):
+        # Importing a module also imports its parent packages.
+        parts = name.split(".")
+        for i in range(1, len(parts) + 1):
+            name = ".".join(parts[:i])
+            if name in modules and name not in reached:
+                reached.add(name)
+                pending.append(modules[name])
+
+    for name in keep_modules:
+        reach(name)
+
+    while pending:
+        cm = pending.pop()
+        name = module_name(cm)
+        if not cm.source_file.str.endswith("/__init__.py"):
+            name = name.rpartition(".")[0]
+        packages = [""]
+        if name:
+            parts = name.split(".")
+            packages += [".".join(parts[: i + 1]) + "." for i in range(len(parts))]
+        for s in module_strings(cm):
+            for package in packages:
+                reach(package + s)
+
+    return [cm for cm in compiled_modules if module_name(cm) in reached]
+
+
+def optimise_mpy(compiled_modules, keep_modules, strip_line_info, strip_docstrings):
+    # Optimise the modules in place, and return a report of their sizes.
+    sizes = [(module_name(cm), module_size(cm)) for cm in compiled_modules]
+    if keep_modules:
+        compiled_modules[:] = reachable_modules(compiled_modules, keep_modules)
+
+        # Don't freeze the qstrs that are only used by the dropped modules.
+        strings = set()
+        for cm in compiled_modules:
+            strings.update(module_strings(cm))
+        n_static = len(qstrutil.static_qstr_list) + 1
+        global_qstrs.qstrs[n_static:] = [
+            q for q in global_qstrs.qstrs[n_static:] if q.str in strings
+        ]
+
+    for cm in compiled_modules:
+        raw_codes = list(cm.raw_code.all_raw_codes())
+        bytecode_only = all(rc.code_kind == MP_CODE_BYTECODE for rc in raw_codes)
+
+        if strip_line_info:
+            for rc in raw_codes:
+                if rc.code_kind == MP_CODE_BYTECODE:
+                    rc.strip_line_info()
+
+        # Native code refers to constants by index, so only constants of
+        # bytecode can be found.
+        if not bytecode_only:
             continue
-        new[q.qstr_esc] = (len(new), q.qstr_esc, q.str, bytes_cons(q.str, "utf8"))
-    # Sort by string value (because this is a sorted pool).
-    new = sorted(new.values(), key=lambda x: x[2])
 
+        # Find the constants that are used, excluding docstrings if they are
+        # stripped (which are stored to __doc__ in the module and classes).
+        used = set()
+        docstrings = set()
+        for rc in raw_codes:
+            opcodes = list(rc.opcodes())
+            for i, (opcode, arg) in enumerate(opcodes):
+                if opcode != Opcode.MP_BC_LOAD_CONST_OBJ:
+                    continue
+                next_opcode, next_arg = opcodes[i + 1]
+                if (
+                    strip_docstrings
+                    and next_opcode == Opcode.MP_BC_STORE_NAME
+                    and cm.qstr_table[next_arg].str == "__doc__"
+                ):
+                    docstrings.add(arg)
+                else:
+                    used.add(arg)
+
+        # Docstrings and unused constants become None, and unused constants at
+        # the end of the table are removed.
+        referenced = used | docstrings
+        for i in range(len(cm.obj_table)):
+            if i not in used:
+                cm.obj_table[i] = None
+        while cm.obj_table and len(cm.obj_table) - 1 not in referenced:
+            cm.obj_table.pop()
+
+    new_sizes = dict((module_name(cm), module_size(cm)) for cm in compiled_modules)
+    report = ["module size report (bytecode and str/bytes data):"]
+    total = [0, 0]
+    for name, size in sizes:
+        new_size = new_sizes.get(name, 0)
+        total[0] += size
+        total[1] += new_size
+        report.append(
+            "%-40s %7d -> %7d%s"
+            % (name, size, new_size, "" if name in new_sizes else " (not reachable, dropped)")
+        )
+    report.append("%-40s %7d -> %7d" % ("total", total[0], total[1]))
+    return report
+
+
+# Redirect print() to a string, to write some of the frozen output to a file.
+class CaptureOutput:
+    def __enter__(self):
+        import io
+
+        self.stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        return sys.stdout
+
+    def __exit__(self, *exc):
+        sys.stdout = self.stdout
+
+
+def write_if_changed(filename, content):
+    # Keep the file (and its timestamp) if it's the same, so it isn't rebuilt.
+    try:
+        with open(filename) as f:
+            if f.read() == content:
+                return
+    except OSError:
+        pass
+    with open(filename, "w") as f:
+        f.write(content)
+
+
+def freeze_mpy_header(new):
+    # Definitions used by the frozen modules, and the enum of the new qstrs.
     print('#include "py/mpconfig.h"')
     print('#include "py/objint.h"')
     print('#include "py/objstr.h"')
@@ -1471,6 +1798,26 @@ def freeze_mpy(firmware_qstr_idents, compiled_modules):
                 print("    MP_QSTR_%s," % new[i][1])
         print("};")
 
+
+def freeze_mpy(firmware_qstr_idents, compiled_modules, split_dir=None, split_compiled=()):
+    # If split_dir is given then each module is written to its own C file in
+    # that directory (along with frozen_mpy.h, the definitions they share), and
+    # the output is an index of the modules.  Module files whose name is in
+    # split_compiled are compiled separately by the build, the others are
+    # included by the index.
+
+    # add to qstrs
+    new = {}
+    for q in global_qstrs.qstrs:
+        # don't add duplicates that are already in the firmware
+        if q is None or q.qstr_esc in firmware_qstr_idents or q.qstr_esc in new:
+            continue
+        new[q.qstr_esc] = (len(new), q.qstr_esc, q.str, bytes_cons(q.str, "utf8"))
+    # Sort by string value (because this is a sorted pool).  Note that adding or
+    # removing a qstr renumbers those after it, which changes every module file
+    # when split_dir is used.
+    new = sorted(new.values(), key=lambda x: x[2])
+
     # As in qstr.c, set so that the first dynamically allocated pool is twice this size; must be <= the len
     qstr_pool_alloc = min(len(new), 10)
 
@@ -1493,6 +1840,43 @@ def freeze_mpy(firmware_qstr_idents, compiled_modules):
     raw_code_count = 0
     raw_code_content = 0
 
+    # Freeze the constants that are shared between modules.
+    global shared_constants
+    shared_constants = SharedConstants(compiled_modules)
+    with CaptureOutput() as output:
+        shared_constants.freeze(compiled_modules, "" if split_dir else "static ")
+    shared_content = output.getvalue()
+
+    if split_dir:
+        with CaptureOutput() as output:
+            print("#ifndef MICROPY_INCLUDED_FROZEN_MPY_H")
+            print("#define MICROPY_INCLUDED_FROZEN_MPY_H")
+            print()
+            freeze_mpy_header(new)
+            if shared_content:
+                # Declare the shared constants, which are defined in the index.
+                print()
+                for line in shared_content.splitlines():
+                    m = re.match(r"const (\w+) (\w+) = ", line)
+                    if m:
+                        print("extern const %s %s;" % m.groups())
+                    elif line.startswith("#"):
+                        print(line)
+            print()
+            print("#endif // MICROPY_INCLUDED_FROZEN_MPY_H")
+        if not os.path.isdir(split_dir):
+            os.makedirs(split_dir)
+        write_if_changed(os.path.join(split_dir, "frozen_mpy.h"), output.getvalue())
+        split_dir_include = os.path.abspath(split_dir).replace("\\", "/")
+        print('#include "%s/frozen_mpy.h"' % split_dir_include)
+    else:
+        freeze_mpy_header(new)
+
+    if shared_content:
+        print()
+        print("// constants shared between modules")
+        print(shared_content, end="")
+
     if config.MICROPY_QSTR_BYTES_IN_HASH:
         print()
         print("const qstr_hash_t mp_qstr_frozen_const_hashes[] = {")
@@ -1526,8 +1910,44 @@ def freeze_mpy(firmware_qstr_idents, compiled_modules):
     print("};")
 
     # Freeze all modules.
-    for idx, cm in enumerate(compiled_modules):
-        cm.freeze(idx)
+    if split_dir:
+        module_files = set()
+        for idx, cm in enumerate(compiled_modules):
+            module_file = cm.escaped_name + ".c"
+            module_files.add(module_file)
+            with CaptureOutput() as output:
+                print('#include "frozen_mpy.h"')
+                cm.freeze(idx, split=True)
+            write_if_changed(os.path.join(split_dir, module_file), output.getvalue())
+            if module_file not in split_compiled:
+                print()
+                print('#include "%s/%s"' % (split_dir_include, module_file))
+
+        # List the module files for the build, which compiles the ones listed
+        # when it started.  The file of a module that was removed is left empty
+        # while the build may still compile it (it's in split_compiled), and is
+        # deleted, along with its build outputs, once that is no longer so.
+        write_if_changed(
+            os.path.join(split_dir, "modules"), "".join(f + "\n" for f in sorted(module_files))
+        )
+        for filename in os.listdir(split_dir):
+            base, ext = os.path.splitext(filename)
+            module_file = base + ".c"
+            if module_file in module_files or ext not in (".c", ".o", ".d", ".P"):
+                continue
+            if module_file not in split_compiled:
+                os.remove(os.path.join(split_dir, filename))
+            elif ext == ".c":
+                write_if_changed(
+                    os.path.join(split_dir, filename), "// frozen module was removed\n"
+                )
+
+        print()
+        for cm in compiled_modules:
+            print("extern const mp_frozen_module_t frozen_module_%s;" % cm.escaped_name)
+    else:
+        for idx, cm in enumerate(compiled_modules):
+            cm.freeze(idx)
 
     # Print separator, separating individual modules from global data structures.
     print()
@@ -1577,6 +1997,10 @@ def freeze_mpy(firmware_qstr_idents, compiled_modules):
     print("const str content: %d" % const_str_content)
     print("const int content: %d" % const_int_content)
     print("const obj content: %d" % const_obj_content)
+    print(
+        "shared const content: %d entries, %d bytes saved"
+        % (len(shared_constants.refs), shared_constants.saved)
+    )
     print(
         "const table qstr content: %d entries, %d bytes"
         % (const_table_qstr_content, const_table_qstr_content * 4)
@@ -1778,10 +2202,44 @@ def main(args=None):
         "-d", "--disassemble", action="store_true", help="output disassembled contents of files"
     )
     cmd_parser.add_argument("-f", "--freeze", action="store_true", help="freeze files")
+    cmd_parser.add_argument(
+        "-a",
+        "--analyse",
+        action="store_true",
+        help="output the size, opcodes and calls of each function in files as JSON",
+    )
     cmd_parser.add_argument(
         "--merge", action="store_true", help="merge multiple .mpy files into one"
     )
     cmd_parser.add_argument("-q", "--qstr-header", help="qstr header file to freeze against")
+    cmd_parser.add_argument(
+        "--split-dir",
+        help="when freezing, write each module to a C file in this directory and output an index",
+    )
+    cmd_parser.add_argument(
+        "--split-compiled",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="a module C file in the split directory that is compiled separately",
+    )
+    cmd_parser.add_argument(
+        "--keep",
+        action="append",
+        default=[],
+        metavar="MODULE",
+        help="when freezing, only keep this module and the modules reachable from it",
+    )
+    cmd_parser.add_argument(
+        "--strip-line-info",
+        action="store_true",
+        help="when freezing, remove line-number tables from bytecode",
+    )
+    cmd_parser.add_argument(
+        "--strip-docstrings",
+        action="store_true",
+        help="when freezing, set __doc__ of modules and classes to None",
+    )
     cmd_parser.add_argument(
         "-mlongint-impl",
         choices=["none", "longlong", "mpz"],
@@ -1838,9 +2296,27 @@ def main(args=None):
             print()
         disassemble_mpy(compiled_modules)
 
+    if args.analyse:
+        analyse_mpy(compiled_modules)
+
     if args.freeze:
         try:
-            freeze_mpy(firmware_qstr_idents, compiled_modules)
+            modules = set(module_name(cm) for cm in compiled_modules)
+            for name in args.keep:
+                if name not in modules:
+                    print("module to keep is not frozen: %s" % name, file=sys.stderr)
+                    sys.exit(1)
+            if args.keep or args.strip_line_info or args.strip_docstrings:
+                report = optimise_mpy(
+                    compiled_modules, args.keep, args.strip_line_info, args.strip_docstrings
+                )
+                print("/*")
+                for line in report:
+                    print(line)
+                print("*/")
+            freeze_mpy(
+                firmware_qstr_idents, compiled_modules, args.split_dir, set(args.split_compiled)
+            )
         except FreezeError as er:
             print(er, file=sys.stderr)
             sys.exit(1)